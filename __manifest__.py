@@ -7,13 +7,18 @@
     'author': 'Md Mazharul Islam',
     'website': 'https://mazharul.odoo.com',
     'license': 'LGPL-3',
-    'depends': ['base', 'project'],
+    'depends': ['base', 'bus', 'project'],
     'data': [
         'security/ir.model.access.csv',
         'security/project_security.xml',
 
+        'data/ir_cron_data.xml',
+
+        'wizard/project_team_reassign_wizard_views.xml',
+
         'views/dashboard_views.xml',
         'views/project_team_views.xml',
+        'views/project_team_reassign_job_views.xml',
         'views/project_views.xml',
         'views/project_task_views.xml',
 
@@ -0,0 +1,115 @@
+import csv
+import io
+import tempfile
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.wsgi import wrap_file
+
+from odoo import api, http, registry, _
+from odoo.http import request, content_disposition
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+
+class TaskDashboardExport(http.Controller):
+
+    # Bytes buffered before a chunk of the CSV export is sent
+    CSV_CHUNK_SIZE = 64 * 1024
+    # Periods of project.task.dashboard._get_period_bounds
+    PERIODS = ('all', 'this_week', 'prev_week', 'this_month', 'prev_month')
+
+    @http.route('/project_team_rules/dashboard/export/<string:file_format>', type='http', auth='user')
+    def export_statistics(self, file_format, period='all', assignee_id=None, project_ids=None, team_ids=None, **kwargs):
+        """Export the task counts per assignee, project and stage as CSV or XLSX
+
+        ``project_ids`` and ``team_ids`` are comma-separated lists of ids.
+        Malformed parameters are answered with a 400 Bad Request.
+        """
+        if period not in self.PERIODS:
+            raise BadRequest(_("Unknown period: %s", period))
+        filters = {
+            'assignee_id': self._parse_id('assignee_id', assignee_id),
+            'project_ids': self._parse_ids('project_ids', project_ids),
+            'team_ids': self._parse_ids('team_ids', team_ids),
+        }
+        filename = 'task_dashboard_%s.%s' % (period, file_format)
+        if file_format == 'csv':
+            return request.make_response(
+                self._stream_csv(request.env, period, filters),
+                headers=[
+                    ('Content-Type', 'text/csv; charset=utf-8'),
+                    ('Content-Disposition', content_disposition(filename)),
+                ],
+            )
+        if file_format == 'xlsx' and xlsxwriter:
+            xlsx_file = self._write_xlsx(request.env, period, filters)
+            return request.make_response(
+                wrap_file(request.httprequest.environ, xlsx_file),
+                headers=[
+                    ('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+                    ('Content-Disposition', content_disposition(filename)),
+                ],
+            )
+        return request.not_found()
+
+    def _parse_id(self, name, value):
+        """Return the id of a parameter, 0 if empty, raise BadRequest if not a positive integer"""
+        value = (value or '').strip()
+        if not value:
+            return 0
+        if not (value.isascii() and value.isdigit()):
+            raise BadRequest(_("Invalid %s: %s", name, value))
+        return int(value)
+
+    def _parse_ids(self, name, value):
+        """Return the ids of a comma-separated parameter, see ``_parse_id``"""
+        return [self._parse_id(name, item) for item in (value or '').split(',') if item.strip()]
+
+    def _get_header(self):
+        return [_("Assignee"), _("Project"), _("Stage"), _("Tasks")]
+
+    def _stream_csv(self, env, period, filters):
+        """Generate the CSV export chunk by chunk.
+
+        The response body is consumed once the request cursor is closed, so
+        rows are read from a cursor of their own.
+        """
+        dbname, uid, context = env.cr.dbname, env.uid, dict(env.context)
+        header = self._get_header()
+
+        def generate():
+            with registry(dbname).cursor() as cr:
+                export_env = api.Environment(cr, uid, context)
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(header)
+                for row in export_env['project.task.dashboard']._iter_statistics_rows(period, **filters):
+                    writer.writerow(row)
+                    if buffer.tell() >= self.CSV_CHUNK_SIZE:
+                        yield buffer.getvalue().encode('utf-8')
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue().encode('utf-8')
+        return generate()
+
+    def _write_xlsx(self, env, period, filters):
+        """Write the XLSX export to a temporary file, one row at a time.
+
+        ``constant_memory`` flushes each row to disk once the next one is
+        written, the file is then streamed from disk.
+        """
+        xlsx_file = tempfile.TemporaryFile()
+        workbook = xlsxwriter.Workbook(xlsx_file, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(_("Task Statistics"))
+        bold = workbook.add_format({'bold': True})
+        worksheet.write_row(0, 0, self._get_header(), bold)
+        worksheet.set_column(0, 2, 30)
+        rows = env['project.task.dashboard']._iter_statistics_rows(period, **filters)
+        for index, row in enumerate(rows, 1):
+            worksheet.write_row(index, 0, row)
+        workbook.close()
+        xlsx_file.seek(0)
+        return xlsx_file
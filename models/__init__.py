@@ -1,4 +1,12 @@
 from . import project_team
+from . import project_team_member_load
+from . import project_team_task_metric
+from . import project_team_reassign_job
 from . import project_project
 from . import project_task
-from . import project_task_dashboard
\ No newline at end of file
+from . import project_task_type
+from . import project_task_dashboard
+from . import project_task_dashboard_stat
+from . import project_task_dashboard_snapshot
+
+from . import ir_websocket
\ No newline at end of file
@@ -0,0 +1,25 @@
+from odoo import models
+
+# Channel subscribed by the task dashboard to receive the count deltas of its scope
+DASHBOARD_CHANNEL = 'project_team_rules_dashboard'
+
+
+class IrWebsocket(models.AbstractModel):
+    _inherit = 'ir.websocket'
+
+    def _build_bus_channel_list(self, channels):
+        """Subscribe the task dashboard to the deltas of the user's team scope.
+
+        Project managers listen to the project manager group, other users to
+        each of their teams and of their sub-teams. Record channels cannot be requested by clients,
+        only the public dashboard channel name can.
+        """
+        if DASHBOARD_CHANNEL in channels and self.env.uid and not self.env.user._is_public():
+            channels = list(channels)
+            if self.env.user.has_group('project.group_project_manager'):
+                channels.append(self.env.ref('project.group_project_manager'))
+            else:
+                Team = self.env['project.team'].sudo()
+                team_ids, _project_ids, _member_ids = Team._get_user_team_scope(self.env.uid)
+                channels.extend(Team.browse(sorted(team_ids)))
+        return super(IrWebsocket, self)._build_bus_channel_list(channels)
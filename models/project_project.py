@@ -1,4 +1,6 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+
+from ..tools.perf import PerfRecorder
 
 
 class ProjectProject(models.Model):
@@ -8,24 +10,113 @@ class ProjectProject(models.Model):
     team_id = fields.Many2one(
         'project.team',
         string='Project Team',
+        index=True,
         help='The team assigned to this project'
     )
+    team_member_ids = fields.Many2many(
+        'res.users',
+        'project_team_member_access_rel',
+        'project_id',
+        'user_id',
+        string='Team Members Access',
+        compute='_compute_team_member_ids',
+        store=True,
+        compute_sudo=True,
+        help='Members of the project team and of its parent teams, stored so that '
+             'team record rules resolve with a single lookup on the (user, project) '
+             'relation, however deep the team hierarchy is'
+    )
+
+    @api.depends('team_id.effective_member_ids')
+    def _compute_team_member_ids(self):
+        for project in self:
+            project.team_member_ids = project.team_id.effective_member_ids
 
-    @api.model
-    def create(self, vals):
-        project = super(ProjectProject, self).create(vals)
-        if project.team_id:
-            project._update_project_visibility()
-        return project
+    @api.model_create_multi
+    def create(self, vals_list):
+        projects = super(ProjectProject, self).create(vals_list)
+        # Single follower pass over all the new team-backed projects
+        team_projects = projects.filtered('team_id')
+        if team_projects:
+            team_projects._update_project_visibility()
+            team_projects.team_id._refresh_metrics()
+            # Team scopes of the users (project.team._get_user_team_scope)
+            self.clear_caches()
+            self.env['project.task.dashboard']._invalidate_statistics_cache(
+                project_ids=team_projects.ids, user_ids=team_projects.team_member_ids.ids
+            )
+        return projects
 
     def write(self, vals):
-        res = super(ProjectProject, self).write(vals)
+        perf = PerfRecorder(self.env.cr, 'project.project.write')
+        update_scope = 'team_id' in vals or 'active' in vals
+        with perf.phase('previous_scope'):
+            if update_scope:
+                user_ids = set(self.team_member_ids.ids)
+                teams = self.team_id
+            if 'team_id' in vals:
+                previous_partner_ids = {
+                    project.id: set(project.team_id.member_ids.partner_id.ids) for project in self
+                }
+        with perf.phase('write') as phase:
+            res = super(ProjectProject, self).write(vals)
+            phase['rows'] = len(self)
         if 'team_id' in vals:
-            self._update_project_visibility()
+            with perf.phase('followers'):
+                self._update_project_visibility(previous_partner_ids)
+            with perf.phase('task_members'):
+                self.env['project.task']._sync_team_members(self.ids)
+            self.clear_caches()
+        if update_scope:
+            with perf.phase('metrics'):
+                (teams | self.team_id)._refresh_metrics()
+            with perf.phase('cache_invalidation'):
+                self.env['project.task.dashboard']._invalidate_statistics_cache(
+                    project_ids=self.ids, user_ids=user_ids | set(self.team_member_ids.ids)
+                )
+        perf.log()
         return res
 
-    def _update_project_visibility(self):
+    def unlink(self):
+        teams = self.team_id
+        self.env['project.task.dashboard']._invalidate_statistics_cache(
+            project_ids=self.ids, user_ids=self.team_member_ids.ids
+        )
+        res = super(ProjectProject, self).unlink()
+        teams._refresh_metrics()
+        if teams:
+            self.clear_caches()
+        return res
+
+    def _update_project_visibility(self, previous_partner_ids=None):
+        """Synchronize the followers of the projects with their team members.
+
+        Team members are subscribed with one batched insert per team instead
+        of one ``message_subscribe`` per project. Partners listed in
+        ``previous_partner_ids`` (project id -> partner ids of the former team
+        members) are unsubscribed in a single delete unless they are still in
+        the team or manage the project.
+        """
+        Followers = self.env['mail.followers'].sudo()
+        for team, projects in tools.groupby(self.filtered('team_id'), key=lambda p: p.team_id):
+            # Add team members to project followers
+            Followers._insert_followers(
+                self._name,
+                [project.id for project in projects],
+                team.member_ids.partner_id.ids,
+                check_existing=True,
+                existing_policy='skip',
+            )
+
+        if not previous_partner_ids:
+            return
+        stale = set()
         for project in self:
-            if project.team_id:
-                # Add team members to project followers
-                project.message_subscribe(partner_ids=project.team_id.member_ids.mapped('partner_id').ids)
+            kept = set(project.team_id.member_ids.partner_id.ids) | set(project.user_id.partner_id.ids)
+            stale.update((project.id, partner_id) for partner_id in previous_partner_ids.get(project.id, ()) - kept)
+        if stale:
+            Followers.search([
+                ('res_model', '=', self._name),
+                ('res_id', 'in', list({res_id for res_id, _partner_id in stale})),
+                ('partner_id', 'in', list({partner_id for _res_id, partner_id in stale})),
+            ]).filtered(lambda f: (f.res_id, f.partner_id.id) in stale).unlink()
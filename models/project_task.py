@@ -1,4 +1,14 @@
-from odoo import models, fields, api
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+from odoo.tools import split_every
+
+from ..tools.sql import create_index_unless_covered
+
+# Tasks whose assignee check is deferred by _defer_team_assignee_check()
+DEFERRED_ASSIGNEE_CHECK_KEY = 'project_team_rules.deferred_team_assignee_check'
 
 
 class ProjectTask(models.Model):
@@ -6,18 +16,344 @@ class ProjectTask(models.Model):
 
     project_team_member_ids = fields.Many2many(
         'res.users',
-        related='project_id.team_id.member_ids',
+        'project_task_team_member_rel',
+        'task_id',
+        'user_id',
         string='Project Team Members',
-        readonly=True, store=False
+        compute='_compute_project_team_member_ids',
+        store=True,
+        readonly=True,
+        compute_sudo=True,
+        help='Members of the project team, stored so that forms, lists and '
+             'searches do not resolve the project and team on every read'
     )
 
+    stage_category = fields.Selection(
+        related='stage_id.category', store=True, index=True, string='Stage Category'
+    )
+
+    # Only the task side is a dependency: team membership and project team
+    # changes are propagated to all the tasks of the projects at once by
+    # _sync_team_members(), instead of recomputing every task through the ORM.
+    @api.depends('project_id')
+    def _compute_project_team_member_ids(self):
+        for task in self:
+            task.project_team_member_ids = task.project_id.team_member_ids
+
+    def _auto_init(self):
+        # Fill the stored team members and stage categories of existing tasks
+        # with one statement each on install, before the ORM would recompute
+        # them task by task
+        cr = self.env.cr
+        if not tools.table_exists(cr, 'project_task_team_member_rel'):
+            cr.execute("""
+                CREATE TABLE project_task_team_member_rel (
+                    task_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    PRIMARY KEY (task_id, user_id)
+                );
+                CREATE INDEX ON project_task_team_member_rel (user_id, task_id);
+            """)
+            self._init_team_members()
+        if not tools.column_exists(cr, self._table, 'stage_category'):
+            tools.create_column(cr, self._table, 'stage_category', 'varchar')
+            cr.execute("""
+                UPDATE project_task t
+                SET stage_category = CASE WHEN st.fold THEN 'done' ELSE 'in_progress' END
+                FROM project_task_type st
+                WHERE st.id = t.stage_id
+            """)
+        return super(ProjectTask, self)._auto_init()
+
+    def _init_team_members(self):
+        """Fill the stored team members of all the tasks from the teams tables.
+
+        The members are read from the team hierarchy itself, since the stored
+        members of the projects and teams may not be initialized yet: nothing
+        orders the initialization of the models of the module.
+        """
+        cr = self.env.cr
+        if not tools.column_exists(cr, 'project_project', 'team_id') \
+                or not tools.column_exists(cr, 'project_team', 'parent_id') \
+                or not tools.table_exists(cr, 'project_team_users_rel'):
+            return
+        cr.execute("""
+            WITH RECURSIVE team_ancestor(team_id, ancestor_id) AS (
+                SELECT id, id FROM project_team
+                UNION
+                SELECT a.team_id, parent.parent_id
+                FROM team_ancestor a
+                JOIN project_team parent ON parent.id = a.ancestor_id
+                WHERE parent.parent_id IS NOT NULL
+            )
+            INSERT INTO project_task_team_member_rel (task_id, user_id)
+            SELECT DISTINCT t.id, member.user_id
+            FROM project_task t
+            JOIN project_project p ON p.id = t.project_id
+            JOIN team_ancestor a ON a.team_id = p.team_id
+            JOIN project_team_users_rel member ON member.team_id = a.ancestor_id
+        """)
+
+    @api.model
+    def _sync_team_members(self, project_ids):
+        """Resynchronize the stored team members of all the tasks of the projects.
+
+        The relation is updated with one delete and one insert per batch of
+        projects, from the stored team members of the projects.
+        """
+        if not project_ids:
+            return
+        self.env['project.project'].flush_model(['team_member_ids'])
+        self.flush_model(['project_id', 'project_team_member_ids'])
+        cr = self.env.cr
+        for ids in split_every(cr.IN_MAX, list(project_ids)):
+            cr.execute("""
+                DELETE FROM project_task_team_member_rel rel
+                USING project_task t
+                WHERE t.id = rel.task_id AND t.project_id IN %(project_ids)s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM project_team_member_access_rel member
+                      WHERE member.project_id = t.project_id AND member.user_id = rel.user_id
+                  )
+            """, {'project_ids': tuple(ids)})
+            cr.execute("""
+                INSERT INTO project_task_team_member_rel (task_id, user_id)
+                SELECT t.id, member.user_id
+                FROM project_task t
+                JOIN project_team_member_access_rel member ON member.project_id = t.project_id
+                WHERE t.project_id IN %(project_ids)s
+                ON CONFLICT DO NOTHING
+            """, {'project_ids': tuple(ids)})
+        self.invalidate_model(['project_team_member_ids'])
+
+    def init(self):
+        super(ProjectTask, self).init()
+        # Active tasks by project and stage within a creation date range
+        # (dashboard aggregation and team scoped statistics)
+        tools.create_index(
+            self.env.cr, 'project_task_active_project_stage_create_date_index', self._table,
+            ['project_id', 'stage_id', 'create_date'], where='active = true'
+        )
+        # Active tasks of all projects within a period (managers' dashboard)
+        tools.create_index(
+            self.env.cr, 'project_task_active_create_date_index', self._table,
+            ['create_date'], where='active = true'
+        )
+        # Assignee reverse lookups (assignee filter, reassignment, record rules)
+        create_index_unless_covered(
+            self.env.cr, 'project_task_user_rel_user_id_task_id_index', 'project_task_user_rel',
+            ['user_id', 'task_id']
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self._auto_assign_team_members(vals_list)
+        tasks = super(ProjectTask, self).create(vals_list)
+        self.env['project.task.dashboard.stat']._apply_tasks(tasks.ids, 1)
+        self.env['project.team.task.metric']._apply_tasks(tasks.ids, 1)
+        self.env['project.team.member.load']._apply_tasks(tasks.ids, 1)
+        Dashboard = self.env['project.task.dashboard']
+        Dashboard._invalidate_statistics_cache(project_ids=tasks.project_id.ids)
+        Dashboard._notify_statistics_deltas(tasks._get_dashboard_buckets())
+        return tasks
+
+    def write(self, vals):
+        Stat = self.env['project.task.dashboard.stat']
+        Metric = self.env['project.team.task.metric']
+        Load = self.env['project.team.member.load']
+        update_stats = bool(set(vals) & set(Stat._TASK_FIELDS))
+        update_metrics = bool(set(vals) & set(Metric._TASK_FIELDS))
+        update_loads = bool(set(vals) & set(Load._TASK_FIELDS))
+        if update_metrics:
+            Metric._apply_tasks(self.ids, -1)
+        if update_loads:
+            Load._apply_tasks(self.ids, -1)
+        if update_stats:
+            project_ids = set(self.project_id.ids)
+            buckets = self._get_dashboard_buckets()
+            Stat._apply_tasks(self.ids, -1)
+        res = super(ProjectTask, self).write(vals)
+        if update_metrics:
+            Metric._apply_tasks(self.ids, 1)
+        if update_loads:
+            Load._apply_tasks(self.ids, 1)
+        if update_stats:
+            Stat._apply_tasks(self.ids, 1)
+            Dashboard = self.env['project.task.dashboard']
+            Dashboard._invalidate_statistics_cache(
+                project_ids=project_ids | set(self.project_id.ids)
+            )
+            deltas = self._get_dashboard_buckets()
+            deltas.subtract(buckets)
+            Dashboard._notify_statistics_deltas(deltas)
+        return res
+
+    def unlink(self):
+        self.env['project.task.dashboard.stat']._apply_tasks(self.ids, -1)
+        self.env['project.team.task.metric']._apply_tasks(self.ids, -1)
+        self.env['project.team.member.load']._apply_tasks(self.ids, -1)
+        Dashboard = self.env['project.task.dashboard']
+        Dashboard._invalidate_statistics_cache(project_ids=self.project_id.ids)
+        deltas = Counter()
+        deltas.subtract(self._get_dashboard_buckets())
+        Dashboard._notify_statistics_deltas(deltas)
+        return super(ProjectTask, self).unlink()
+
+    @api.model
+    def _auto_assign_team_members(self, vals_list):
+        """Assign the new tasks without assignee to a member of their project team.
+
+        The open task counts of the members are read once for all the teams
+        of the batch and kept up to date in memory while the tasks are
+        assigned, so each assignment is a pass over the team members.
+        """
+        if self.env.context.get('project_team_no_auto_assign'):
+            return
+        default_project_id = self.env.context.get('default_project_id')
+        pending = [
+            (vals, vals.get('project_id', default_project_id)) for vals in vals_list
+            if not vals.get('user_ids') and vals.get('project_id', default_project_id)
+        ]
+        if not pending:
+            return
+        projects = self.env['project.project'].sudo().browse({project_id for _vals, project_id in pending})
+        teams = projects.team_id.filtered(lambda team: team.assignment_strategy != 'none')
+        if not teams:
+            return
+        loads = self.env['project.team.member.load'].sudo()._get_member_loads(teams)
+        metrics = self.env['project.team.task.metric'].sudo().search([('team_id', 'in', teams.ids)])
+        last_user_ids = dict.fromkeys(teams.ids, False)
+        last_user_ids.update({metric.team_id.id: metric.last_assigned_user_id.id for metric in metrics})
+        for vals, project_id in pending:
+            team = projects.browse(project_id).team_id
+            if team not in teams:
+                continue
+            user_id = team._select_assignee(loads[team.id], last_user_ids[team.id])
+            if not user_id:
+                continue
+            vals['user_ids'] = [(6, 0, [user_id])]
+            loads[team.id][user_id][0] += 1
+            last_user_ids[team.id] = user_id
+        # The round robin position is kept on the team counters, not on the team
+        for metric in metrics.filtered(lambda metric: metric.team_id.assignment_strategy == 'round_robin'):
+            if last_user_ids[metric.team_id.id] != metric.last_assigned_user_id.id:
+                metric.last_assigned_user_id = last_user_ids[metric.team_id.id]
+
+    def _get_dashboard_buckets(self):
+        """Count the tasks per dashboard bucket.
+
+        :return: ``Counter`` mapping ``(project_id, stage_id, assignee_id, bucket)``
+            to a number of tasks, ``bucket`` being the creation date bucket of
+            ``project.task.dashboard._get_delta_bucket``; each task is counted
+            once per assignee and once with ``assignee_id`` False, for the
+            distinct totals
+        """
+        Dashboard = self.env['project.task.dashboard']
+        cutoff = Dashboard._get_delta_cutoff()
+        buckets = Counter()
+        for task in self.sudo().with_context(active_test=False):
+            if not task.active or not task.project_id:
+                continue
+            bucket = Dashboard._get_delta_bucket(task.create_date, cutoff)
+            for assignee_id in [False] + task.user_ids.ids:
+                buckets[(task.project_id.id, task.stage_id.id, assignee_id, bucket)] += 1
+        return buckets
+
+    @api.constrains('user_ids', 'project_id')
+    def _check_user_ids_team_membership(self):
+        # Bulk reassignments validate all their tasks once at the end
+        deferred_ids = self.env.cr.precommit.data.get(DEFERRED_ASSIGNEE_CHECK_KEY)
+        if deferred_ids is not None:
+            deferred_ids.update(self.ids)
+            return
+        self._validate_team_assignees()
+
+    @contextmanager
+    def _defer_team_assignee_check(self):
+        """Check the assignees of all the tasks written within the block at once, when it exits.
+
+        The deferral is kept on the cursor, so that only server code can use
+        it, and the pending tasks are checked before any commit within the
+        block.
+        """
+        data = self.env.cr.precommit.data
+        if DEFERRED_ASSIGNEE_CHECK_KEY in data:
+            yield
+            return
+        data[DEFERRED_ASSIGNEE_CHECK_KEY] = set()
+
+        @self.env.cr.precommit.add
+        def check_deferred():
+            self.browse(data.pop(DEFERRED_ASSIGNEE_CHECK_KEY, ())).exists()._validate_team_assignees()
+
+        try:
+            yield
+        except Exception:
+            data.pop(DEFERRED_ASSIGNEE_CHECK_KEY, None)
+            raise
+        self.browse(data.pop(DEFERRED_ASSIGNEE_CHECK_KEY, ())).exists()._validate_team_assignees()
+
+    def _validate_team_assignees(self):
+        """Raise a single ValidationError listing every invalid assignee of the tasks"""
+        violations = self._get_team_assignee_violations()
+        if not violations:
+            return
+        tasks = self.browse(violations).sudo()
+        users = self.env['res.users'].browse(
+            {user_id for user_ids in violations.values() for user_id in user_ids}
+        ).sudo()
+        user_names = {user.id: user.name for user in users}
+        lines = [
+            '- %s: %s' % (task.display_name, ', '.join(user_names[user_id] for user_id in violations[task.id]))
+            for task in tasks[:20]
+        ]
+        if len(tasks) > 20:
+            lines.append(_('... and %s more tasks', len(tasks) - 20))
+        raise ValidationError(_(
+            "Only members of the project team can be assigned to tasks of projects "
+            "visible to the assigned team only:\n%s", '\n'.join(lines)
+        ))
+
+    def _get_team_assignee_violations(self):
+        """Return the assignees of the tasks who are not members of the project team.
+
+        Only projects with the 'team' privacy and a team restrict their
+        assignees. Membership is checked with one query per batch of tasks.
+
+        :return: dict mapping task ids to the ids of their invalid assignees
+        """
+        self.flush_model(['user_ids', 'project_id'])
+        self.env['project.project'].flush_model(['privacy_visibility', 'team_id', 'team_member_ids'])
+        violations = defaultdict(list)
+        for ids in split_every(self.env.cr.IN_MAX, self.ids):
+            self.env.cr.execute("""
+                SELECT rel.task_id, rel.user_id
+                FROM project_task_user_rel rel
+                JOIN project_task t ON t.id = rel.task_id
+                JOIN project_project p ON p.id = t.project_id
+                WHERE rel.task_id IN %s
+                  AND p.privacy_visibility = 'team'
+                  AND p.team_id IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM project_team_member_access_rel member
+                      WHERE member.project_id = p.id AND member.user_id = rel.user_id
+                  )
+                ORDER BY rel.task_id, rel.user_id
+            """, [tuple(ids)])
+            for task_id, user_id in self.env.cr.fetchall():
+                violations[task_id].append(user_id)
+        return dict(violations)
+
     @api.onchange('project_id')
     def _onchange_project_id_team_filter(self):
         """Clear assignees when project changes to ensure only team members are assigned"""
         if self.project_id and self.user_ids:
             # Filter out users who are not in the new project's team
-            team_member_ids = self.project_id.team_id.member_ids.ids
-            invalid_assignees = self.user_ids.filtered(lambda u: u.id not in team_member_ids)
+            Team = self.env['project.team']
+            project_id = self.project_id._origin.id
+            invalid_assignees = self.user_ids.filtered(
+                lambda u: project_id not in Team._get_user_team_scope(u._origin.id)[1]
+            )
             self.user_ids -= invalid_assignees
         else:
             self.user_ids = False
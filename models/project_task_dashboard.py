@@ -1,7 +1,34 @@
-from odoo import models, fields, api, tools
-from datetime import datetime, timedelta
+import logging
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+import psycopg2
+import pytz
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import AccessError, UserError
+from datetime import datetime, time, timedelta
 from dateutil.relativedelta import relativedelta
 
+from odoo.http import request
+
+from ..tools.dashboard_cache import get_dashboard_cache
+from ..tools.perf import PerfRecorder
+from ..tools.replica import replica_cursor
+
+_logger = logging.getLogger(__name__)
+
+STATISTICS_INVALIDATION_KEY = 'project_team_rules.statistics_invalidation'
+STATISTICS_DELTAS_KEY = 'project_team_rules.statistics_deltas'
+STATISTICS_DELTA_NOTIFICATION = 'project_team_rules/dashboard_delta'
+# Above this number of changes, dashboards are told to reload their statistics
+STATISTICS_DELTA_RELOAD_THRESHOLD = 500
+# Precision in minutes of the creation dates of the deltas: every timezone
+# offset is a multiple of it, so a bucket is never across a period bound
+STATISTICS_DELTA_BUCKET_MINUTES = 15
+# Invalidations of the statistics cache, read by every worker on lookup
+STATISTICS_INVALIDATION_LOG = 'project_task_dashboard_invalidation'
+
 
 class ProjectTaskDashboard(models.Model):
     _name = 'project.task.dashboard'
@@ -18,160 +45,958 @@ class ProjectTaskDashboard(models.Model):
     project_id = fields.Many2one('project.project', string='Project')
     
     def init(self):
+        # Aggregates the incrementally maintained project.task.dashboard.stat
+        # buckets instead of scanning project_task on every read, by the
+        # stage category copied on the buckets. Open tasks are to do when
+        # their stage is a to do one or when nobody is assigned yet, and in
+        # progress otherwise.
         tools.drop_view_if_exists(self.env.cr, self._table)
         self.env.cr.execute("""
             CREATE OR REPLACE VIEW %s AS (
                 SELECT
                     row_number() OVER () as id,
-                    rel.user_id as assignee_id,
-                    t.project_id as project_id,
-                    COUNT(DISTINCT t.id) as task_count,
-                    SUM(CASE WHEN t.stage_id IN (
-                        SELECT id FROM project_task_type WHERE fold = true
-                    ) THEN 1 ELSE 0 END) as done_count,
-                    SUM(CASE WHEN t.stage_id IN (
-                        SELECT id FROM project_task_type WHERE fold = false
-                    ) AND rel.user_id IS NOT NULL THEN 1 ELSE 0 END) as in_progress_count,
-                    SUM(CASE WHEN t.stage_id IN (
-                        SELECT id FROM project_task_type WHERE fold = false
-                    ) AND rel.user_id IS NULL THEN 1 ELSE 0 END) as todo_count,
+                    s.assignee_id as assignee_id,
+                    s.project_id as project_id,
+                    SUM(s.task_count) as task_count,
+                    SUM(CASE WHEN s.stage_category = 'done' THEN s.task_count ELSE 0 END) as done_count,
+                    SUM(CASE WHEN s.stage_category = 'in_progress' AND s.assignee_id IS NOT NULL
+                        THEN s.task_count ELSE 0 END) as in_progress_count,
+                    SUM(CASE WHEN COALESCE(s.stage_category, 'todo') = 'todo'
+                          OR (s.stage_category = 'in_progress' AND s.assignee_id IS NULL)
+                        THEN s.task_count ELSE 0 END) as todo_count,
                     'All' as name
-                FROM project_task t
-                LEFT JOIN project_task_user_rel rel ON rel.task_id = t.id
-                JOIN project_project p ON t.project_id = p.id
-                WHERE t.active = true
-                GROUP BY rel.user_id, t.project_id
+                FROM project_task_dashboard_stat s
+                GROUP BY s.assignee_id, s.project_id
             )
         """ % self._table)
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS {log} (
+                id SERIAL PRIMARY KEY,
+                txid BIGINT NOT NULL,
+                project_ids INTEGER[] NOT NULL,
+                user_ids INTEGER[] NOT NULL,
+                clear BOOLEAN NOT NULL DEFAULT false,
+                create_date TIMESTAMP NOT NULL DEFAULT (now() at time zone 'UTC')
+            );
+            CREATE INDEX IF NOT EXISTS {log}_txid_index ON {log} (txid);
+        """.format(log=STATISTICS_INVALIDATION_LOG))
 
     @api.model
-    def get_task_statistics(self, period='all', assignee_id=False):
-        """Get task statistics based on period and assignee filters"""
-        domain = []
-        
-        # Apply period filter
-        today = fields.Date.today()
-        if period == 'this_week':
-            week_start = today - timedelta(days=today.weekday())
-            domain.append(('create_date', '>=', week_start))
-        elif period == 'prev_week':
-            week_start = today - timedelta(days=today.weekday() + 7)
-            week_end = today - timedelta(days=today.weekday())
-            domain.extend([('create_date', '>=', week_start), ('create_date', '<', week_end)])
-        elif period == 'this_month':
-            month_start = today.replace(day=1)
-            domain.append(('create_date', '>=', month_start))
-        elif period == 'prev_month':
-            month_start = (today - relativedelta(months=1)).replace(day=1)
-            month_end = today.replace(day=1)
-            domain.extend([('create_date', '>=', month_start), ('create_date', '<', month_end)])
-        
+    def get_task_statistics(self, period='all', assignee_id=False, include_assignees=True,
+                            project_ids=None, team_ids=None):
+        """Get task statistics based on period and assignee filters
+
+        In debug mode, the payload also holds the timings and query counts of
+        each phase under ``_perf``.
+
+        :param include_assignees: list every user in scope under ``assignees``;
+            the dashboard pages them with ``get_assignee_statistics`` instead
+        :param project_ids: only count the tasks of these projects
+        :param team_ids: only count the tasks of the projects of these teams and their sub-teams
+        """
+        filters = self._get_statistics_filters(project_ids, team_ids)
+        perf = PerfRecorder(self.env.cr, 'project.task.dashboard.get_task_statistics')
+        with perf.phase('cache_lookup') as phase:
+            cache = self._get_statistics_cache()
+            xmin = self._sync_statistics_cache(cache)
+            key = self._get_statistics_cache_key(period, assignee_id, filters) + (bool(include_assignees),)
+            stats = cache.get(key)
+            phase['hit'] = stats is not None
+        if stats is None:
+            stats, project_ids = self._compute_task_statistics(
+                period, assignee_id, perf=perf, include_assignees=include_assignees, filters=filters
+            )
+            self._cache_statistics(cache, key, stats, project_ids, xmin)
+        perf.log()
+        if self._is_perf_debug():
+            stats['_perf'] = perf.as_dict()
+        return stats
+
+    @api.model
+    def get_assignee_statistics(self, period='all', assignee_id=False, search=None,
+                                offset=0, limit=50, only_with_tasks=False, project_ids=None, team_ids=None):
+        """Return one page of the per-assignee stage breakdown, sorted by name.
+
+        The assignee x stage counts are aggregated once per period and
+        filters and cached; pages only search their users and slice them.
+
+        :param search: only list the users whose name contains this string
+        :param only_with_tasks: skip the users without tasks in the period
+        :return: ``{'assignees': [...], 'total': int}`` where ``total`` counts
+            the users of all the pages
+        """
+        filters = self._get_statistics_filters(project_ids, team_ids)
+        perf = PerfRecorder(self.env.cr, 'project.task.dashboard.get_assignee_statistics')
+
+        def compute(perf):
+            domain, team_projects = self._get_statistics_domain(period, assignee_id, filters, perf=perf)
+            with perf.phase('query') as phase:
+                user_stage_counts = self._read_user_stage_counts(domain, assignee_id)
+                phase['rows'] = len(user_stage_counts)
+            return user_stage_counts, team_projects
+
+        user_stage_counts = self._get_cached_section(
+            ('user_stage_counts',), period, assignee_id, filters, compute, perf=perf
+        )
+        stage_records = self._get_ordered_stages({stage_id: 1 for _user_id, stage_id in user_stage_counts})
+        with perf.phase('users') as phase:
+            user_domain = self._get_assignee_domain(self._get_team_projects(), search)
+            if only_with_tasks:
+                user_domain.append(('id', 'in', list({user_id for user_id, _stage_id in user_stage_counts})))
+            Users = self.env['res.users']
+            users = Users.search(user_domain, offset=offset, limit=limit)
+            phase['rows'] = len(users)
+        page = {
+            'assignees': self._get_assignee_breakdown(users, stage_records, user_stage_counts),
+            'total': Users.search_count(user_domain),
+        }
+        perf.log()
+        if self._is_perf_debug():
+            page['_perf'] = perf.as_dict()
+        return page
+
+    @api.model
+    def get_statistics_totals(self, period='all', assignee_id=False, project_ids=None, team_ids=None):
+        """Return the period bounds and the number of tasks, the dashboard summary card
+
+        :return: ``{'period': {...}, 'total_tasks': int}``
+        """
+        filters = self._get_statistics_filters(project_ids, team_ids)
+
+        def compute(perf):
+            domain, team_projects = self._get_statistics_domain(period, assignee_id, filters, perf=perf)
+            with perf.phase('query') as phase:
+                total_tasks = self._read_task_counts(domain, []).get((), 0)
+                phase['rows'] = 1
+            return {
+                'period': self._get_period_info(period),
+                'total_tasks': total_tasks,
+            }, team_projects
+
+        return self._get_cached_section(('totals',), period, assignee_id, filters, compute)
+
+    @api.model
+    def get_stage_statistics(self, period='all', assignee_id=False, project_ids=None, team_ids=None):
+        """Return the number of tasks per stage, without the assignee breakdown
+
+        :return: ``{'stages': [{'name', 'count', 'category'}]}``
+        """
+        filters = self._get_statistics_filters(project_ids, team_ids)
+
+        def compute(perf):
+            domain, team_projects = self._get_statistics_domain(period, assignee_id, filters, perf=perf)
+            with perf.phase('query') as phase:
+                stage_counts = {
+                    stage_id: count for (stage_id,), count in self._read_task_counts(domain, ['stage_id']).items()
+                }
+                phase['rows'] = len(stage_counts)
+            return {
+                'stages': self._merge_stage_counts(self._get_ordered_stages(stage_counts), stage_counts),
+            }, team_projects
+
+        return self._get_cached_section(('stages',), period, assignee_id, filters, compute)
+
+    @api.model
+    def get_project_statistics(self, period='all', assignee_id=False, project_ids=None, team_ids=None):
+        """Return the number of tasks per project and stage, sorted by project name
+
+        :return: ``{'projects': [{'id', 'name', 'total_tasks', 'stages'}]}``
+        """
+        filters = self._get_statistics_filters(project_ids, team_ids)
+
+        def compute(perf):
+            domain, team_projects = self._get_statistics_domain(period, assignee_id, filters, perf=perf)
+            with perf.phase('query') as phase:
+                counts = self._read_task_counts(domain, ['project_id', 'stage_id'])
+                phase['rows'] = len(counts)
+            stage_records = self._get_ordered_stages({stage_id: 1 for _project_id, stage_id in counts})
+            return {
+                'projects': self._get_project_breakdown(stage_records, counts),
+            }, team_projects
+
+        return self._get_cached_section(('projects',), period, assignee_id, filters, compute)
+
+    @api.model
+    def _get_project_breakdown(self, stage_records, project_stage_counts):
+        """Return the per-stage task counts of each project, sorted by project name
+
+        :param project_stage_counts: dict mapping ``(project_id, stage_id)``
+            to a number of tasks
+        """
+        counts = defaultdict(dict)
+        for (project_id, stage_id), count in project_stage_counts.items():
+            if project_id:
+                counts[project_id][stage_id] = count
+        projects = self.env['project.project'].sudo().with_context(active_test=False).browse(counts)
+        return sorted([{
+            'id': project.id,
+            'name': project.name,
+            'total_tasks': sum(counts[project.id].values()),
+            'stages': self._merge_stage_counts(stage_records, counts[project.id]),
+        } for project in projects], key=lambda p: p['name'])
+
+    @api.model
+    def _get_cached_section(self, section_key, period, assignee_id, filters, compute, perf=None):
+        """Return a section of the statistics from the cache, or ``compute(perf)`` it.
+
+        Without a ``perf`` recorder, the section records and logs its own
+        phases, and returns them under ``_perf`` in debug mode.
+
+        :param section_key: tuple identifying the section and its own arguments
+        :param filters: project and team filters, see ``_get_statistics_filters``
+        :param compute: function of a ``PerfRecorder`` returning
+            ``(value, team_projects)``, as returned by ``_get_statistics_domain``
+        :param perf: ``PerfRecorder`` of the caller, which logs it
+        """
+        own_perf = perf is None
+        if own_perf:
+            perf = PerfRecorder(self.env.cr, 'project.task.dashboard.%s' % section_key[0])
+        with perf.phase('cache_lookup') as phase:
+            cache = self._get_statistics_cache()
+            xmin = self._sync_statistics_cache(cache)
+            key = self._get_statistics_cache_key(period, assignee_id, filters) + section_key
+            value = cache.get(key)
+            phase['hit'] = value is not None
+        if value is None:
+            value, team_projects = compute(perf)
+            self._cache_statistics(cache, key, value, None if team_projects is None else team_projects.ids, xmin)
+        if own_perf:
+            perf.log()
+            if self._is_perf_debug():
+                value['_perf'] = perf.as_dict()
+        return value
+
+    @api.model
+    def search_dashboard_assignees(self, search=None, offset=0, limit=20):
+        """Return one page of the users the dashboard can be filtered on, sorted by name
+
+        :return: ``{'records': [{'id', 'name'}], 'total': int}``
+        """
+        team_projects = self._get_team_projects()
+        user_domain = self._get_assignee_domain(team_projects, search)
+        Users = self.env['res.users']
+        return {
+            'records': [{'id': u.id, 'name': u.name} for u in Users.search(user_domain, offset=offset, limit=limit)],
+            'total': Users.search_count(user_domain),
+        }
+
+    @api.model
+    def search_dashboard_projects(self, search=None, offset=0, limit=20):
+        """Return one page of the projects the dashboard can be filtered on, sorted by name
+
+        :return: ``{'records': [{'id', 'name'}], 'total': int}``
+        """
+        domain = [('name', 'ilike', search)] if search else []
+        team_projects = self._get_team_projects()
+        if team_projects is not None:
+            domain.append(('id', 'in', team_projects.ids))
+        return self._search_filter_options('project.project', domain, offset, limit)
+
+    @api.model
+    def search_dashboard_teams(self, search=None, offset=0, limit=20):
+        """Return one page of the teams the dashboard can be filtered on, sorted by name
+
+        :return: ``{'records': [{'id', 'name'}], 'total': int}``
+        """
+        domain = [('name', 'ilike', search)] if search else []
+        if not self.env.user.has_group('project.group_project_manager'):
+            team_ids, _project_ids, _member_ids = self.env['project.team']._get_user_team_scope(self.env.uid)
+            domain.append(('id', 'in', list(team_ids)))
+        return self._search_filter_options('project.team', domain, offset, limit)
+
+    @api.model
+    def _search_filter_options(self, model, domain, offset, limit):
+        Model = self.env[model]
+        return {
+            'records': [
+                {'id': record.id, 'name': record.display_name}
+                for record in Model.search(domain, offset=offset, limit=limit, order='name, id')
+            ],
+            'total': Model.search_count(domain),
+        }
+
+    @api.model
+    def _cache_statistics(self, cache, key, value, project_ids, xmin=None):
+        # Results computed after a write of the current transaction may
+        # include uncommitted data: only cache them once committed data
+        # is read again.
+        if STATISTICS_INVALIDATION_KEY not in self.env.cr.postcommit.data:
+            cache.set(key, value, self.env.uid, project_ids, xmin)
+
+    @api.model
+    def _is_perf_debug(self):
+        """Whether instrumentation data is returned to the client"""
+        if self.env.context.get('project_team_rules_perf'):
+            return True
+        try:
+            return bool(request and request.session.debug)
+        except RuntimeError:
+            # request proxy used outside of an HTTP request
+            return False
+
+    @api.model
+    def _compute_task_statistics(self, period, assignee_id, perf=None, include_assignees=True, filters=None):
+        """Compute the payload of ``get_task_statistics``.
+
+        :param perf: ``PerfRecorder`` collecting the phases of the computation
+        :param filters: project and team filters, see ``_get_statistics_filters``
+        :return: ``(stats, project_ids)`` where ``project_ids`` lists the
+            projects the statistics are restricted to, or ``None`` when they
+            cover every project
+        """
+        perf = perf or PerfRecorder(self.env.cr, 'project.task.dashboard._compute_task_statistics')
+        domain, team_projects = self._get_statistics_domain(period, assignee_id, filters, perf=perf)
+
+        # Flush and record rule expansion are measured apart from the query
+        with perf.phase('record_rules'):
+            query = self._get_stage_matrix_query(domain, assignee_id)
+
+        # Per-stage totals, the assignee x stage and the project x stage
+        # matrices in one query
+        with perf.phase('stage_matrix') as phase:
+            stage_counts, user_stage_counts, project_stage_counts = self._read_stage_matrix(domain, query=query)
+            phase['rows'] = len(stage_counts) + len(user_stage_counts) + len(project_stage_counts)
+
+        with perf.phase('stages') as phase:
+            stage_records = self._get_ordered_stages(stage_counts)
+            phase['rows'] = len(stage_records)
+        stats = {
+            'period': self._get_period_info(period),
+            'total_tasks': sum(stage_counts.values()),
+            'stages': self._merge_stage_counts(stage_records, stage_counts),
+            'projects': self._get_project_breakdown(stage_records, project_stage_counts),
+            'assignees': []
+        }
+
+        if include_assignees:
+            with perf.phase('users') as phase:
+                all_users = self.env['res.users'].search(self._get_assignee_domain(team_projects))
+                phase['rows'] = len(all_users)
+
+            with perf.phase('assignees') as phase:
+                stats['assignees'] = self._get_assignee_breakdown(all_users, stage_records, user_stage_counts)
+                stats['assignees'].sort(key=lambda x: x['name'])
+                phase['rows'] = len(stats['assignees'])
+
+        return stats, None if team_projects is None else team_projects.ids
+
+    @api.model
+    def _get_team_projects(self):
+        """Return the projects of the user's teams, or ``None`` for project managers"""
+        if self.env.user.has_group('project.group_project_manager'):
+            return None
+        _team_ids, project_ids, _member_ids = self.env['project.team']._get_user_team_scope(self.env.uid)
+        return self.env['project.project'].browse(sorted(project_ids))
+
+    @api.model
+    def _get_statistics_domain(self, period, assignee_id, filters=None, perf=None):
+        """Return the task domain of the statistics and the team projects they are restricted to.
+
+        :param filters: project and team filters, see ``_get_statistics_filters``
+        :return: ``(domain, team_projects)``, ``team_projects`` being ``None``
+            for project managers
+        """
+        domain = self._get_period_domain(period)
+
         # Apply assignee filter
         if assignee_id:
             domain.append(('user_ids', 'in', assignee_id))
-        
+
+        # Apply project and team filters
+        filters = filters or {}
+        if filters.get('project_ids'):
+            domain.append(('project_id', 'in', list(filters['project_ids'])))
+        if filters.get('team_ids'):
+            domain.append(('project_id.team_id', 'child_of', list(filters['team_ids'])))
+
         # Apply team security
-        user = self.env.user
-        if not user.has_group('project.group_project_manager'):
-            team_projects = self.env['project.project'].search([
-                ('team_id.member_ids', 'in', user.id)
-            ]).ids
-            domain.append(('project_id', 'in', team_projects))
-        
-        # Group tasks by stage name
-        stage_groups = self.env['project.task'].read_group(
-            domain,
-            ['stage_id'],
-            ['stage_id']
-        )
-        
-        # Calculate statistics dynamically based on stage names
-        total_tasks = sum(group['stage_id_count'] for group in stage_groups)
-        stages = {}
-        
-        for group in stage_groups:
-            if group['stage_id']:
-                stage_name = group['stage_id'][1]  # stage_id returns (id, name)
-                if stage_name not in stages:
-                    stages[stage_name] = {
-                        'name': stage_name,
-                        'count': 0
-                    }
-                stages[stage_name]['count'] += group['stage_id_count']
-
-        # Convert stages dict to list
-        stages = list(stages.values())
+        team_projects = None
+        if not self.env.user.has_group('project.group_project_manager'):
+            with perf.phase('team_scope') if perf else nullcontext({}) as phase:
+                team_projects = self._get_team_projects()
+                phase['rows'] = len(team_projects)
+            domain.append(('project_id', 'in', team_projects.ids))
+        return domain, team_projects
 
-        stats = {
-            'total_tasks': total_tasks,
-            'stages': stages,
-            'assignees': []
+    @api.model
+    def _get_statistics_filters(self, project_ids=None, team_ids=None):
+        """Normalize the project and team filters of the statistics, for cache keys
+
+        :return: ``{'project_ids': tuple, 'team_ids': tuple}`` of sorted ids
+        """
+        return {
+            'project_ids': tuple(sorted(set(project_ids or ()))),
+            'team_ids': tuple(sorted(set(team_ids or ()))),
         }
-        
-        # Get all active users who have access to projects
-        all_users = self.env['res.users'].search([
-            ('active', '=', True),
-            ('share', '=', False)
-        ])
-        
-        # Filter users based on team membership if not a project manager
-        if not user.has_group('project.group_project_manager'):
-            team_user_ids = self.env['project.project'].search([
-                ('team_id.member_ids', 'in', user.id)
-            ]).mapped('team_id.member_ids').ids
-            all_users = all_users.filtered(lambda u: u.id in team_user_ids)
-        
-        # Initialize assignee data for all users
-        assignee_data = {}
-        for u in all_users:
-            assignee_data[u.id] = {
+
+    @api.model
+    def _get_assignee_domain(self, team_projects, search=None):
+        """Return the domain of the users listed by the dashboard.
+
+        Active internal users, restricted to the members of the user's teams
+        if not a project manager.
+        """
+        user_domain = [('active', '=', True), ('share', '=', False)]
+        if team_projects is not None:
+            _team_ids, _project_ids, member_ids = self.env['project.team']._get_user_team_scope(self.env.uid)
+            user_domain.append(('id', 'in', list(member_ids)))
+        if search:
+            user_domain.append(('name', 'ilike', search))
+        return user_domain
+
+    @api.model
+    def _get_assignee_breakdown(self, users, stage_records, user_stage_counts):
+        """Return the per-stage task counts of each user, in the order of ``users``"""
+        assignees = []
+        for u in users:
+            assignee_stages = self._merge_stage_counts(stage_records, {
+                stage_id: user_stage_counts.get((u.id, stage_id), 0) for stage_id in stage_records.ids
+            })
+            assignees.append({
                 'id': u.id,
                 'name': u.name,
-                'total_tasks': 0,
-                'stages': []
+                'total_tasks': sum(s['count'] for s in assignee_stages),
+                'stages': assignee_stages
+            })
+        return assignees
+
+    @api.model
+    def _get_period_domain(self, period):
+        """Return the task domain of a dashboard period"""
+        start, end = self._get_period_bounds(period)
+        domain = []
+        if start:
+            domain.append(('create_date', '>=', start))
+        if end:
+            domain.append(('create_date', '<', end))
+        return domain
+
+    @api.model
+    def _get_period_bounds(self, period, now=None):
+        """Return the UTC ``(start, end)`` datetimes of a dashboard period.
+
+        Periods are resolved in the timezone of the user: weeks start on
+        Monday and days at midnight local time. Both bounds are ``None`` for
+        ``'all'`` and unknown periods.
+
+        :param now: naive UTC datetime the period is relative to, defaults to now
+        """
+        if period not in ('this_week', 'prev_week', 'this_month', 'prev_month'):
+            return None, None
+        tz = pytz.timezone(self._get_user_tz())
+        today = pytz.utc.localize(now or fields.Datetime.now()).astimezone(tz).date()
+        week_start = today - timedelta(days=today.weekday())
+        month_start = today.replace(day=1)
+        start, end = {
+            'this_week': (week_start, week_start + timedelta(weeks=1)),
+            'prev_week': (week_start - timedelta(weeks=1), week_start),
+            'this_month': (month_start, month_start + relativedelta(months=1)),
+            'prev_month': (month_start - relativedelta(months=1), month_start),
+        }[period]
+        return tuple(
+            tz.localize(datetime.combine(day, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+            for day in (start, end)
+        )
+
+    @api.model
+    def _get_user_tz(self):
+        """Return the name of the timezone the periods of the user are resolved in"""
+        return self.env.context.get('tz') or self.env.user.tz or 'UTC'
+
+    @api.model
+    def _get_period_info(self, period):
+        """Return the period of the statistics with its bounds, for the client"""
+        start, end = self._get_period_bounds(period)
+        return {
+            'name': period,
+            'start': fields.Datetime.to_string(start),
+            'end': fields.Datetime.to_string(end),
+        }
+
+    @api.model
+    def _get_statistics_cache(self):
+        cache = get_dashboard_cache(self.env.cr.dbname)
+        ICP = self.env['ir.config_parameter'].sudo()
+        cache.max_size = int(ICP.get_param('project_team_rules.dashboard_cache_size', 256))
+        cache.ttl = int(ICP.get_param('project_team_rules.dashboard_cache_ttl', 300))
+        return cache
+
+    @api.model
+    def _get_statistics_cache_key(self, period, assignee_id, filters=None):
+        # Project managers see every task: they share their entries
+        if self.env.su:
+            scope = 'superuser'
+        elif self.env.user.has_group('project.group_project_manager'):
+            scope = 'manager'
+        else:
+            scope = self.env.uid
+        return (
+            scope,
+            period,
+            assignee_id or False,
+            tuple(self.env.companies.ids),
+            self.env.lang,
+            self._get_period_bounds(period),
+            tuple(sorted((filters or {}).items())),
+        )
+
+    @api.model
+    def _sync_statistics_cache(self, cache):
+        """Apply to the cache of this worker the invalidations committed since its last lookup.
+
+        Invalidations are read from the log by transaction id: every
+        transaction still running at the previous lookup is read again, so
+        that changes committed in between by any worker are not missed.
+
+        :return: oldest transaction running in the snapshot of the current
+            transaction, to pass to ``_cache_statistics``
+        """
+        self.env.cr.execute("""
+            SELECT snapshot.xmin, log.id, log.txid, log.project_ids, log.user_ids, log.clear
+            FROM (SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin) snapshot
+            LEFT JOIN {log} log ON log.txid >= COALESCE(%s, snapshot.xmin)
+        """.format(log=STATISTICS_INVALIDATION_LOG), [cache.log_xmin])
+        rows = self.env.cr.fetchall()
+        cache.sync(rows[0][0], [row[1:] for row in rows if row[1]])
+        return rows[0][0]
+
+    @api.model
+    def _gc_statistics_invalidations(self):
+        """Delete the logged invalidations older than the cache time-to-live,
+        the entries they may apply to having expired"""
+        self.env.cr.execute("""
+            DELETE FROM {log} WHERE create_date < (now() at time zone 'UTC') - %s * interval '1 second'
+        """.format(log=STATISTICS_INVALIDATION_LOG), [self._get_statistics_cache().ttl])
+
+    @api.model
+    def _invalidate_statistics_cache(self, project_ids=(), user_ids=(), clear=False):
+        """Drop the cached statistics affected by a change.
+
+        Entries of this worker are dropped right away. The change is logged
+        with the transaction, so that every worker, this one included, drops
+        the entries once it is committed: concurrent requests may have cached
+        the previous state in between.
+
+        :param project_ids: projects whose tasks or team changed
+        :param user_ids: users whose team scope changed
+        :param clear: drop every entry (e.g. stages were renamed)
+        """
+        cache = self._get_statistics_cache()
+        if clear:
+            cache.clear()
+        else:
+            cache.invalidate(project_ids, user_ids)
+
+        # Marks the transaction as changing the statistics until it is committed
+        self.env.cr.postcommit.data[STATISTICS_INVALIDATION_KEY] = True
+        data = self.env.cr.precommit.data
+        if STATISTICS_INVALIDATION_KEY not in data:
+            pending = data[STATISTICS_INVALIDATION_KEY] = {
+                'project_ids': set(),
+                'user_ids': set(),
+                'clear': False,
             }
-        
-        # Count tasks for users by stage using read_group
-        user_stage_groups = self.env['project.task'].read_group(
-            domain + [('user_ids', '!=', False)],
-            ['user_ids', 'stage_id'],
-            ['user_ids', 'stage_id'],
-            lazy=False
+
+            @self.env.cr.precommit.add
+            def log_invalidation():
+                changes = data.pop(STATISTICS_INVALIDATION_KEY, pending)
+                self.env.cr.execute("""
+                    INSERT INTO {log} (txid, project_ids, user_ids, clear)
+                    VALUES (txid_current(), %s, %s, %s)
+                """.format(log=STATISTICS_INVALIDATION_LOG), [
+                    sorted(changes['project_ids']), sorted(changes['user_ids']), changes['clear'],
+                ])
+
+        pending = data[STATISTICS_INVALIDATION_KEY]
+        pending['project_ids'].update(project_ids)
+        pending['user_ids'].update(user_ids)
+        pending['clear'] = pending['clear'] or clear
+
+    @api.model
+    def _get_delta_cutoff(self):
+        """Return the UTC datetime before which tasks are in no dashboard period but 'all'.
+
+        The previous month starts after it in every timezone.
+        """
+        day = (self.env.cr.now() - timedelta(days=1)).date()
+        return datetime.combine(day.replace(day=1) - relativedelta(months=1) - timedelta(days=1), time.min)
+
+    @api.model
+    def _get_delta_bucket(self, create_date, cutoff):
+        """Return the creation date bucket a task is counted in by the deltas.
+
+        :return: the UTC datetime string of the creation date rounded down to
+            ``STATISTICS_DELTA_BUCKET_MINUTES``, False before ``cutoff``
+        """
+        if create_date < cutoff:
+            return False
+        return fields.Datetime.to_string(create_date.replace(
+            minute=create_date.minute - create_date.minute % STATISTICS_DELTA_BUCKET_MINUTES,
+            second=0, microsecond=0,
+        ))
+
+    @api.model
+    def _notify_statistics_deltas(self, deltas):
+        """Queue task count changes to be pushed to the open dashboards.
+
+        Deltas of a transaction are summed and published once, right before
+        the commit, with one message per project. Tasks are keyed by a bucket
+        of their creation datetime (see ``_get_delta_bucket``) that clients
+        match with the exact bounds of their period.
+
+        :param deltas: mapping of ``(project_id, stage_id, assignee_id, bucket)``
+            to a change of the number of tasks, as returned by
+            ``project.task._get_dashboard_buckets``
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        data = self.env.cr.precommit.data
+        if STATISTICS_DELTAS_KEY not in data:
+            pending = data[STATISTICS_DELTAS_KEY] = Counter()
+
+            @self.env.cr.precommit.add
+            def publish():
+                self._publish_statistics_deltas(data.pop(STATISTICS_DELTAS_KEY, pending))
+
+        data[STATISTICS_DELTAS_KEY].update(deltas)
+
+    @api.model
+    def _publish_statistics_deltas(self, deltas):
+        """Send the deltas of each project to its team and to the project managers.
+
+        Messages hold the names of the stages and the changes as compact
+        ``[assignee_id, stage_id, bucket, delta]`` lists, ``assignee_id`` being
+        False for the distinct task totals. ``team_ids`` lists the project team and
+        its parent teams, whose members are subscribed to the project team.
+        ``stage_categories`` gives the category of the stages of the changes.
+
+        Above ``STATISTICS_DELTA_RELOAD_THRESHOLD`` changes (e.g. a bulk stage
+        change), a single ``{'reload': True}`` message is sent to the managers
+        and to each project team instead, with the ``team_ids`` of the team.
+        """
+        changes = defaultdict(list)
+        for (project_id, stage_id, assignee_id, bucket), delta in deltas.items():
+            if delta:
+                changes[project_id].append([assignee_id, stage_id, bucket, delta])
+        if not changes:
+            return
+        projects = self.env['project.project'].sudo().with_context(active_test=False).browse(changes).exists()
+        managers = self.env.ref('project.group_project_manager')
+        if sum(len(project_changes) for project_changes in changes.values()) > STATISTICS_DELTA_RELOAD_THRESHOLD:
+            notifications = [(managers, STATISTICS_DELTA_NOTIFICATION, {'reload': True, 'team_ids': []})]
+            for team in projects.team_id:
+                notifications.append((team, STATISTICS_DELTA_NOTIFICATION, {
+                    'reload': True,
+                    'team_ids': [int(team_id) for team_id in (team.parent_path or '').split('/') if team_id],
+                }))
+            self.env['bus.bus'].sudo()._sendmany(notifications)
+            return
+        stages = self.env['project.task.type'].sudo().with_context(active_test=False).browse(
+            {stage_id for project_changes in changes.values() for _uid, stage_id, _date, _delta in project_changes if stage_id}
         )
-        
-        # Process the grouped data
+        stage_names = {stage.id: stage.name for stage in stages}
+        stage_categories = {stage.id: stage.category for stage in stages}
+        notifications = []
+        for project in projects:
+            message = {
+                'project_id': project.id,
+                'team_id': project.team_id.id,
+                'team_ids': [int(team_id) for team_id in (project.team_id.parent_path or '').split('/') if team_id],
+                'stages': {
+                    stage_id: stage_names[stage_id]
+                    for _uid, stage_id, _date, _delta in changes[project.id] if stage_id
+                },
+                'stage_categories': {
+                    stage_id: stage_categories[stage_id]
+                    for _uid, stage_id, _date, _delta in changes[project.id] if stage_id
+                },
+                'changes': changes[project.id],
+            }
+            notifications.append((managers, STATISTICS_DELTA_NOTIFICATION, message))
+            if project.team_id:
+                notifications.append((project.team_id, STATISTICS_DELTA_NOTIFICATION, message))
+        self.env['bus.bus'].sudo()._sendmany(notifications)
+
+    @api.model
+    def get_statistics_cache_info(self):
+        """Return the size and hit/miss counters of the statistics cache"""
+        if not self.env.user.has_group('base.group_system'):
+            raise AccessError(_("Only administrators can read the dashboard cache statistics."))
+        return self._get_statistics_cache().info()
+
+    @api.model
+    def get_task_history(self, granularity='week', periods=12, assignee_id=False):
+        """Get the task counts of the last weeks or months, the current one included.
+
+        Periods are those of the user's timezone, like the dashboard periods.
+        Closed periods come from the snapshots recorded by the scheduled
+        action; the current period and the closed ones not recorded yet are
+        counted from the tasks, with the access rules of the statistics.
+        Nothing is written: missing snapshots are left to the scheduled action.
+        """
+        if granularity not in ('week', 'month'):
+            raise UserError(_("Unknown history granularity: %s", granularity))
+        Snapshot = self.env['project.task.dashboard.snapshot'].sudo()
+        domain, team_projects = self._get_statistics_domain('all', assignee_id)
+        domain.append(('project_id', '!=', False))
+        project_ids = None if team_projects is None else team_projects.ids
+        tz = self._get_user_tz()
+
+        current_start = Snapshot._get_period_start(granularity, Snapshot._get_today(tz))
+        step = Snapshot._get_period_step(granularity)
+        starts = [current_start - step * index for index in reversed(range(max(periods, 1)))]
+        last_start = Snapshot._get_last_period_start(granularity, tz)
+        recorded_end = min(max(last_start + step if last_start else starts[0], starts[0]), current_start)
+        series = Snapshot._read_series(granularity, starts[0], recorded_end, project_ids, assignee_id, tz=tz)
+        for start in starts:
+            if start < recorded_end:
+                continue
+            period_domain = domain + [
+                ('create_date', '>=', Snapshot._to_utc(start, tz)),
+                ('create_date', '<', Snapshot._to_utc(start + step, tz)),
+            ]
+            for (stage_id,), count in self._read_task_counts(period_domain, ['stage_id']).items():
+                series[(start, stage_id)] = count
+
+        stage_records = self._get_ordered_stages({stage_id: 1 for _start, stage_id in series})
+        history = []
+        for start in starts:
+            counts = {stage_id: count for (period_start, stage_id), count in series.items() if period_start == start}
+            history.append({
+                'start': fields.Date.to_string(start),
+                'total_tasks': sum(counts.values()),
+                'stages': self._merge_stage_counts(stage_records, counts),
+            })
+        return {
+            'granularity': granularity,
+            'periods': history,
+        }
+
+    @api.model
+    def _get_ordered_stages(self, stage_counts):
+        """Return the stages of ``stage_counts`` in their configured order"""
+        return self.env['project.task.type'].sudo().with_context(active_test=False).search([
+            ('id', 'in', [stage_id for stage_id in stage_counts if stage_id])
+        ])
+
+    @api.model
+    def _merge_stage_counts(self, stage_records, stage_counts):
+        """Sum the non-zero counts of ``stage_counts`` per stage name and category, in stage order"""
+        stages = {}
+        for stage in stage_records:
+            count = stage_counts.get(stage.id)
+            if not count:
+                continue
+            key = (stage.name, stage.category)
+            if key not in stages:
+                stages[key] = {
+                    'name': stage.name,
+                    'count': 0,
+                    'category': stage.category,
+                }
+            stages[key]['count'] += count
+        return list(stages.values())
+
+    @api.model
+    def _get_stage_matrix_query(self, domain, assignee_id=False):
+        """Return the ``(query, params)`` aggregating the tasks matching ``domain``
+
+        :param assignee_id: only count this assignee in the assignee x stage matrix
+        """
+        Task = self.env['project.task']
+        rel_alias, from_clause, where_clause, params = self._get_task_query(domain, assignee_id=assignee_id)
+        return """
+            SELECT "{task}".stage_id, "{rel}".user_id, "{task}".project_id,
+                   GROUPING("{rel}".user_id), GROUPING("{task}".project_id), COUNT(DISTINCT "{task}".id)
+            FROM {from_clause}
+            WHERE {where_clause}
+            GROUP BY GROUPING SETS (
+                ("{task}".stage_id),
+                ("{rel}".user_id, "{task}".stage_id),
+                ("{task}".project_id, "{task}".stage_id)
+            )
+        """.format(
+            task=Task._table,
+            rel=rel_alias,
+            from_clause=from_clause,
+            where_clause=where_clause,
+        ), params
+
+    @api.model
+    def _get_task_query(self, domain, with_assignees=True, assignee_id=False):
+        """Return the FROM and WHERE clauses of the tasks matching ``domain``.
+
+        The record rules of the current user are applied. With
+        ``with_assignees``, the assignees are left joined, so that tasks are
+        repeated once per assignee; only ``assignee_id`` is joined if given,
+        the other assignees of the tasks being left out.
+
+        :return: ``(rel_alias, from_clause, where_clause, params)``,
+            ``rel_alias`` being ``None`` without assignees
+        """
+        Task = self.env['project.task']
+        Task.check_access_rights('read')
+        Task._flush_search(domain, fields=['project_id', 'stage_id', 'user_ids'])
+        query = Task._where_calc(domain)
+        Task._apply_ir_rules(query, 'read')
+        rel_alias = None
+        if with_assignees:
+            extra, extra_params = (None, ()) if not assignee_id else ('{rhs}.user_id = %s', (assignee_id,))
+            rel_alias = query.left_join(
+                Task._table, 'id', 'project_task_user_rel', 'task_id', 'user_ids', extra=extra, extra_params=extra_params
+            )
+        from_clause, where_clause, params = query.get_sql()
+        return rel_alias, from_clause, where_clause or 'TRUE', params
+
+    @api.model
+    def _iter_statistics_rows(self, period='all', assignee_id=False, batch_size=2000, project_ids=None, team_ids=None):
+        """Yield ``(assignee, project, stage, task_count)`` rows of the statistics.
+
+        Rows come from a named (server-side) cursor fetched ``batch_size`` at
+        a time, and names are resolved per batch, so that memory stays flat
+        whatever the number of rows. The period, assignee filter and team
+        scope are those of ``get_task_statistics``.
+        """
+        domain, _team_projects = self._get_statistics_domain(
+            period, assignee_id, self._get_statistics_filters(project_ids, team_ids)
+        )
+        Task = self.env['project.task']
+        rel_alias, from_clause, where_clause, params = self._get_task_query(domain, assignee_id=assignee_id)
+        names = {
+            'res.users': {False: _("Unassigned")},
+            'project.project': {False: ''},
+            'project.task.type': {False: ''},
+        }
+
+        def resolve(model, ids):
+            missing = [record_id for record_id in set(ids) if record_id not in names[model]]
+            for record in self.env[model].sudo().with_context(active_test=False).browse(missing):
+                names[model][record.id] = record.display_name
+
+        # The export reads the replica too when it can, the named cursor
+        # living in its read-only transaction
+        with replica_cursor(self.env) if self._can_use_replica() else nullcontext() as replica_cr:
+            cr = self.env.cr if replica_cr is None else replica_cr
+            with cr._cnx.cursor('project_task_dashboard_export') as named_cr:
+                named_cr.itersize = batch_size
+                named_cr.execute("""
+                    SELECT "{rel}".user_id, "{task}".project_id, "{task}".stage_id, COUNT(*)
+                    FROM {from_clause}
+                    WHERE {where_clause}
+                    GROUP BY "{rel}".user_id, "{task}".project_id, "{task}".stage_id
+                    ORDER BY "{rel}".user_id NULLS FIRST, "{task}".project_id, "{task}".stage_id
+                """.format(task=Task._table, rel=rel_alias, from_clause=from_clause, where_clause=where_clause), params)
+                while True:
+                    rows = named_cr.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    resolve('res.users', [row[0] or False for row in rows])
+                    resolve('project.project', [row[1] or False for row in rows])
+                    resolve('project.task.type', [row[2] or False for row in rows])
+                    for user_id, project_id, stage_id, count in rows:
+                        yield (
+                            names['res.users'][user_id or False],
+                            names['project.project'][project_id or False],
+                            names['project.task.type'][stage_id or False],
+                            count,
+                        )
+
+    @api.model
+    def _can_use_replica(self):
+        # A replica only holds committed data: the statistics of a transaction
+        # that changed tasks, projects or teams are read on the primary
+        return STATISTICS_INVALIDATION_KEY not in self.env.cr.postcommit.data
+
+    @api.model
+    def _fetch_statistics_rows(self, query, params):
+        """Run an aggregation query and return its rows.
+
+        The query runs on the read replica when one is configured and fresh
+        enough (see ``tools.replica``), and on the primary otherwise or if it
+        fails on the replica.
+        """
+        if self._can_use_replica():
+            with replica_cursor(self.env) as replica_cr:
+                if replica_cr is not None:
+                    try:
+                        replica_cr.execute(query, params)
+                        return replica_cr.fetchall()
+                    except psycopg2.Error as e:
+                        _logger.warning("Dashboard query failed on the read replica, using the primary database: %s", e)
+        self.env.cr.execute(query, params)
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _read_task_counts(self, domain, groupby):
+        """Count the tasks matching ``domain`` per value of the ``groupby`` columns.
+
+        :param groupby: names of many2one columns of ``project_task``, empty
+            for the total number of tasks, keyed by ``()``
+        :return: dict mapping tuples of ids (``False`` for empty values) to a
+            number of tasks
+        """
+        Task = self.env['project.task']
+        _rel_alias, from_clause, where_clause, params = self._get_task_query(domain, with_assignees=False)
+        columns = ''.join('"%s".%s, ' % (Task._table, fname) for fname in groupby)
+        rows = self._fetch_statistics_rows("""
+            SELECT {columns}COUNT(*)
+            FROM {from_clause}
+            WHERE {where_clause}
+            {groupby}
+        """.format(
+            columns=columns, from_clause=from_clause, where_clause=where_clause,
+            groupby="GROUP BY %s" % columns[:-2] if groupby else "",
+        ), params)
+        return {
+            tuple(value or False for value in row[:-1]): row[-1]
+            for row in rows
+        }
+
+    @api.model
+    def _read_user_stage_counts(self, domain, assignee_id=False):
+        """Count the tasks matching ``domain`` per (assignee, stage), with a single grouping.
+
+        :param assignee_id: only count this assignee
+        :return: dict mapping ``(user_id, stage_id)`` to a number of tasks,
+            tasks without stage being counted under ``False``
+        """
+        Task = self.env['project.task']
+        rel_alias, from_clause, where_clause, params = self._get_task_query(domain, assignee_id=assignee_id)
+        rows = self._fetch_statistics_rows("""
+            SELECT "{rel}".user_id, "{task}".stage_id, COUNT(*)
+            FROM {from_clause}
+            WHERE ({where_clause}) AND "{rel}".user_id IS NOT NULL
+            GROUP BY "{rel}".user_id, "{task}".stage_id
+        """.format(task=Task._table, rel=rel_alias, from_clause=from_clause, where_clause=where_clause), params)
+        return {(user_id, stage_id or False): count for user_id, stage_id, count in rows}
+
+    @api.model
+    def _read_stage_matrix(self, domain, query=None, assignee_id=False):
+        """Count the tasks matching ``domain`` per stage, per (assignee, stage)
+        and per (project, stage).
+
+        All aggregates come from a single GROUPING SETS query on which the
+        record rules of the current user are applied, like ``read_group``.
+
+        :param query: ``(query, params)`` already built by ``_get_stage_matrix_query``
+        :param assignee_id: only count this assignee in ``user_stage_counts``
+        :return: ``(stage_counts, user_stage_counts, project_stage_counts)``
+            mapping respectively ``stage_id``, ``(user_id, stage_id)`` and
+            ``(project_id, stage_id)`` to a number of tasks; tasks without
+            stage or project are counted under ``False``
+        """
+        rows = self._fetch_statistics_rows(*(query or self._get_stage_matrix_query(domain, assignee_id)))
+
+        stage_counts = {}
         user_stage_counts = {}
-        for group in user_stage_groups:
-            if group['user_ids'] and group['stage_id']:
-                stage_name = group['stage_id'][1]
-                count = group['__count']
-                
-                for user_id in group['user_ids']:
-                    if user_id not in user_stage_counts:
-                        user_stage_counts[user_id] = {}
-                    if stage_name not in user_stage_counts[user_id]:
-                        user_stage_counts[user_id][stage_name] = 0
-                    user_stage_counts[user_id][stage_name] += count
-        
-        # Build assignee data with stage counts
-        for user_id, stage_counts in user_stage_counts.items():
-            if user_id in assignee_data:
-                # assignee_data[user_id]['stages'] = [
-                #     {'name': stage_name, 'count': count}
-                #     for stage_name, count in stage_counts.items()
-                # ]
-                assignee_stages = {}
-                for stage_name, count in stage_counts.items():
-                    if stage_name not in assignee_stages:
-                        assignee_stages[stage_name] = {
-                            'name': stage_name,
-                            'count': 0
-                        }
-                    assignee_stages[stage_name]['count'] += count
-
-                assignee_data[user_id]['stages'] = list(assignee_stages.values())
-                assignee_data[user_id]['total_tasks'] = sum(stage_counts.values())
-        
-        stats['assignees'] = sorted(list(assignee_data.values()), key=lambda x: x['name'])
-        
-        return stats
\ No newline at end of file
+        project_stage_counts = {}
+        for stage_id, user_id, project_id, no_user, no_project, count in rows:
+            if no_user and no_project:
+                stage_counts[stage_id or False] = count
+            elif not no_user:
+                if user_id:
+                    user_stage_counts[(user_id, stage_id or False)] = count
+            else:
+                project_stage_counts[(project_id or False, stage_id or False)] = count
+        return stage_counts, user_stage_counts, project_stage_counts
@@ -0,0 +1,150 @@
+import logging
+from datetime import datetime, time
+
+import pytz
+
+from odoo import models, fields, api, tools
+from dateutil.relativedelta import relativedelta
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectTaskDashboardSnapshot(models.Model):
+    """Task counts frozen at the end of each closed week and month.
+
+    Tasks are bucketed by creation date in a timezone and counted per
+    project, stage and assignee, with the stage they had when the period was
+    closed. Rows without assignee hold the number of distinct tasks of the
+    project and stage, whoever they are assigned to. Periods are recorded
+    for the timezone of every internal user, so that they match the periods
+    of the dashboard.
+    """
+    _name = 'project.task.dashboard.snapshot'
+    _description = 'Project Task Dashboard Snapshot'
+    _log_access = False
+    _order = 'granularity, period_start desc'
+
+    granularity = fields.Selection([
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ], string='Granularity', required=True, readonly=True)
+    tz = fields.Char(string='Timezone', required=True, readonly=True, default='UTC')
+    period_start = fields.Date(string='Period Start', required=True, readonly=True)
+    project_id = fields.Many2one('project.project', string='Project', required=True, readonly=True, ondelete='cascade')
+    stage_id = fields.Many2one('project.task.type', string='Stage', readonly=True, ondelete='cascade')
+    assignee_id = fields.Many2one('res.users', string='Assignee', readonly=True, ondelete='cascade')
+    task_count = fields.Integer(string='Tasks', readonly=True)
+
+    def init(self):
+        tools.drop_index(self.env.cr, 'project_task_dashboard_snapshot_bucket_uniq', self._table)
+        tools.create_unique_index(
+            self.env.cr, 'project_task_dashboard_snapshot_tz_bucket_uniq', self._table,
+            ['granularity', 'tz', 'period_start', 'project_id', 'COALESCE(stage_id, 0)', 'COALESCE(assignee_id, 0)'],
+        )
+
+    @api.model
+    def _get_period_start(self, granularity, day):
+        if granularity == 'week':
+            return day - relativedelta(days=day.weekday())
+        return day.replace(day=1)
+
+    @api.model
+    def _get_period_step(self, granularity):
+        return relativedelta(weeks=1) if granularity == 'week' else relativedelta(months=1)
+
+    @api.model
+    def _get_today(self, tz):
+        """Return the current date in the timezone named ``tz``"""
+        return pytz.utc.localize(fields.Datetime.now()).astimezone(pytz.timezone(tz)).date()
+
+    @api.model
+    def _to_utc(self, day, tz):
+        """Return the naive UTC datetime of the local midnight starting ``day`` in ``tz``"""
+        return pytz.timezone(tz).localize(datetime.combine(day, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+
+    @api.model
+    def _get_last_period_start(self, granularity, tz='UTC'):
+        """Return the start of the last period of ``tz`` recorded, or None"""
+        self.flush_model()
+        self.env.cr.execute(
+            "SELECT MAX(period_start) FROM %s WHERE granularity = %%s AND tz = %%s" % self._table, [granularity, tz]
+        )
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _snapshot_closed_periods(self, granularity, tz='UTC'):
+        """Record every period of ``tz`` closed since the last snapshot, in one statement"""
+        cr = self.env.cr
+        last_start = self._get_last_period_start(granularity, tz)
+        date_from = last_start and last_start + self._get_period_step(granularity)
+        date_to = self._get_period_start(granularity, self._get_today(tz))
+        if date_from and date_from >= date_to:
+            return
+
+        self.env['project.task'].flush_model(['project_id', 'stage_id', 'user_ids', 'active', 'create_date'])
+        cr.execute("""
+            INSERT INTO {table} (granularity, tz, period_start, project_id, stage_id, assignee_id, task_count)
+            SELECT %(granularity)s, %(tz)s, date_trunc(%(granularity)s, t.create_date AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s)::date,
+                   t.project_id, t.stage_id, rel.user_id, COUNT(DISTINCT t.id)
+            FROM project_task t
+            LEFT JOIN project_task_user_rel rel ON rel.task_id = t.id
+            WHERE t.active = true AND t.project_id IS NOT NULL
+              AND (%(date_from)s IS NULL OR t.create_date >= %(date_from)s) AND t.create_date < %(date_to)s
+            GROUP BY GROUPING SETS (
+                (date_trunc(%(granularity)s, t.create_date AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s), t.project_id, t.stage_id),
+                (date_trunc(%(granularity)s, t.create_date AT TIME ZONE 'UTC' AT TIME ZONE %(tz)s), t.project_id, t.stage_id, rel.user_id)
+            )
+            HAVING GROUPING(rel.user_id) = 1 OR rel.user_id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """.format(table=self._table), {
+            'granularity': granularity,
+            'tz': tz,
+            'date_from': date_from and self._to_utc(date_from, tz),
+            'date_to': self._to_utc(date_to, tz),
+        })
+        _logger.info("Recorded %s %s %s task dashboard snapshot rows up to %s", cr.rowcount, tz, granularity, date_to)
+        self.invalidate_model()
+
+    @api.model
+    def _get_snapshot_timezones(self):
+        """Return the timezones of the active internal users, UTC included"""
+        self.env.cr.execute("""
+            SELECT DISTINCT p.tz
+            FROM res_users u
+            JOIN res_partner p ON p.id = u.partner_id
+            WHERE u.active = true AND u.share = false AND p.tz IS NOT NULL
+        """)
+        return ['UTC'] + sorted({tz for tz, in self.env.cr.fetchall() if tz in pytz.all_timezones_set} - {'UTC'})
+
+    @api.model
+    def _cron_snapshot_closed_periods(self):
+        for tz in self._get_snapshot_timezones():
+            for granularity in ('week', 'month'):
+                self._snapshot_closed_periods(granularity, tz)
+
+    @api.model
+    def _read_series(self, granularity, date_from, date_to, project_ids=None, assignee_id=False, tz='UTC'):
+        """Return ``{(period_start, stage_id): count}`` of the periods of ``tz`` recorded from ``date_from`` to ``date_to``.
+
+        :param project_ids: projects to restrict the counts to, ``None`` for all
+        :param assignee_id: count the tasks of this assignee only
+        """
+        project_clause = "" if project_ids is None else "AND project_id IN %(project_ids)s"
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT period_start, stage_id, SUM(task_count)
+            FROM {table}
+            WHERE granularity = %(granularity)s AND tz = %(tz)s
+              AND period_start >= %(date_from)s AND period_start < %(date_to)s
+              AND COALESCE(assignee_id, 0) = COALESCE(%(assignee_id)s, 0)
+              {project_clause}
+            GROUP BY period_start, stage_id
+        """.format(table=self._table, project_clause=project_clause), {
+            'granularity': granularity,
+            'tz': tz,
+            'date_from': date_from,
+            'date_to': date_to,
+            'assignee_id': assignee_id or None,
+            'project_ids': tuple(project_ids or [0]),
+        })
+        return {(period_start, stage_id or False): count for period_start, stage_id, count in self.env.cr.fetchall()}
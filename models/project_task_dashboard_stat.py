@@ -0,0 +1,116 @@
+import logging
+
+from odoo import models, fields, api, tools
+from odoo.tools import split_every
+
+from .project_task_type import STAGE_CATEGORIES
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectTaskDashboardStat(models.Model):
+    """Materialized task counts per (assignee, project, stage, day).
+
+    Rows hold a copy of the category of their stage, so that the dashboard
+    view aggregates them by category without reading the stages. Rows are
+    maintained incrementally from the ``project.task`` create, write
+    and unlink hooks: the contribution of the touched tasks is subtracted
+    before the change and added back afterwards. ``_cron_rebuild`` recomputes
+    the whole table from ``project_task`` as a fallback.
+    """
+    _name = 'project.task.dashboard.stat'
+    _description = 'Project Task Dashboard Statistics'
+    _log_access = False
+    _order = 'day desc'
+
+    assignee_id = fields.Many2one('res.users', string='Assignee', readonly=True, ondelete='cascade')
+    project_id = fields.Many2one('project.project', string='Project', readonly=True, required=True, ondelete='cascade')
+    stage_id = fields.Many2one('project.task.type', string='Stage', readonly=True, ondelete='cascade')
+    stage_category = fields.Selection(STAGE_CATEGORIES, string='Stage Category', readonly=True)
+    day = fields.Date(string='Day', readonly=True, required=True)
+    task_count = fields.Integer(string='Tasks', readonly=True)
+
+    # Task fields whose value decides which bucket a task is counted in
+    _TASK_FIELDS = ['project_id', 'stage_id', 'stage_category', 'user_ids', 'active', 'create_date']
+
+    _BUCKET_QUERY = """
+        SELECT rel.user_id, t.project_id, t.stage_id, t.stage_category, t.create_date::date, COUNT(*)
+        FROM project_task t
+        LEFT JOIN project_task_user_rel rel ON rel.task_id = t.id
+        WHERE t.active = true AND t.project_id IS NOT NULL {where}
+        GROUP BY rel.user_id, t.project_id, t.stage_id, t.stage_category, t.create_date::date
+    """
+
+    def _auto_init(self):
+        # Copy the stage categories to the existing rows in one statement
+        cr = self.env.cr
+        if tools.table_exists(cr, self._table) and not tools.column_exists(cr, self._table, 'stage_category'):
+            tools.create_column(cr, self._table, 'stage_category', 'varchar')
+            cr.execute("""
+                UPDATE {table} s
+                SET stage_category = st.category
+                FROM project_task_type st
+                WHERE st.id = s.stage_id
+            """.format(table=self._table))
+        return super(ProjectTaskDashboardStat, self)._auto_init()
+
+    def init(self):
+        tools.create_unique_index(
+            self.env.cr, 'project_task_dashboard_stat_bucket_uniq', self._table,
+            ['COALESCE(assignee_id, 0)', 'project_id', 'COALESCE(stage_id, 0)', 'day'],
+        )
+        self.env.cr.execute("SELECT 1 FROM %s LIMIT 1" % self._table)
+        if not self.env.cr.rowcount:
+            self._rebuild()
+
+    @api.model
+    def _apply_tasks(self, task_ids, sign):
+        """Add (sign=1) or subtract (sign=-1) the current contribution of the given tasks."""
+        if not task_ids:
+            return
+        self.env['project.task'].flush_model(self._TASK_FIELDS)
+        cr = self.env.cr
+        for ids in split_every(cr.IN_MAX, task_ids):
+            cr.execute("""
+                INSERT INTO {table} (assignee_id, project_id, stage_id, stage_category, day, task_count)
+                SELECT user_id, project_id, stage_id, stage_category, day, %s * count
+                FROM ({buckets}) AS b (user_id, project_id, stage_id, stage_category, day, count)
+                ON CONFLICT (COALESCE(assignee_id, 0), project_id, COALESCE(stage_id, 0), day)
+                DO UPDATE SET task_count = {table}.task_count + EXCLUDED.task_count,
+                              stage_category = EXCLUDED.stage_category
+                RETURNING id, task_count
+            """.format(table=self._table, buckets=self._BUCKET_QUERY.format(where="AND t.id IN %s")),
+                [sign, tuple(ids)])
+            empty_ids = [row_id for row_id, count in cr.fetchall() if count <= 0]
+            if empty_ids:
+                cr.execute("DELETE FROM %s WHERE id IN %%s" % self._table, [tuple(empty_ids)])
+        self.invalidate_model()
+
+    @api.model
+    def _update_stage_categories(self, stages):
+        """Copy the current category of the stages to their rows"""
+        stages.flush_recordset(['category'])
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE {table} s
+            SET stage_category = st.category
+            FROM project_task_type st
+            WHERE st.id = s.stage_id AND st.id IN %s
+              AND s.stage_category IS DISTINCT FROM st.category
+        """.format(table=self._table), [tuple(stages.ids)])
+        self.invalidate_model(['stage_category'])
+
+    @api.model
+    def _rebuild(self):
+        self.env['project.task'].flush_model(self._TASK_FIELDS)
+        self.env.cr.execute("DELETE FROM %s" % self._table)
+        self.env.cr.execute("""
+            INSERT INTO {table} (assignee_id, project_id, stage_id, stage_category, day, task_count)
+            {buckets}
+        """.format(table=self._table, buckets=self._BUCKET_QUERY.format(where="")))
+        _logger.info("Rebuilt %s task dashboard statistic rows", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def _cron_rebuild(self):
+        self._rebuild()
@@ -0,0 +1,57 @@
+from odoo import models, fields, api, tools
+
+STAGE_CATEGORIES = [
+    ('todo', 'To Do'),
+    ('in_progress', 'In Progress'),
+    ('done', 'Done'),
+    ('cancelled', 'Cancelled'),
+]
+# Categories of the stages whose tasks are still open
+OPEN_STAGE_CATEGORIES = ('todo', 'in_progress')
+
+
+class ProjectTaskType(models.Model):
+    _inherit = 'project.task.type'
+
+    category = fields.Selection(
+        STAGE_CATEGORIES,
+        string='Category',
+        compute='_compute_category', store=True, readonly=False, index=True,
+        help='Classifies the tasks of the stage in the dashboards and team metrics. '
+             'Folded stages default to Done, the other ones to In Progress.'
+    )
+
+    @api.depends('fold')
+    def _compute_category(self):
+        for stage in self:
+            if stage.fold and stage.category not in ('done', 'cancelled'):
+                stage.category = 'done'
+            elif not stage.fold and stage.category not in OPEN_STAGE_CATEGORIES:
+                stage.category = 'in_progress'
+
+    def _auto_init(self):
+        # Classify the existing stages in one statement on install, with the
+        # same rule as _compute_category
+        cr = self.env.cr
+        if not tools.column_exists(cr, self._table, 'category'):
+            tools.create_column(cr, self._table, 'category', 'varchar')
+            cr.execute(
+                "UPDATE %s SET category = CASE WHEN fold THEN 'done' ELSE 'in_progress' END" % self._table
+            )
+        return super(ProjectTaskType, self)._auto_init()
+
+    def write(self, vals):
+        categories = {stage.id: stage.category for stage in self}
+        res = super(ProjectTaskType, self).write(vals)
+        if {'name', 'sequence', 'fold', 'active', 'category'} & set(vals):
+            self.env['project.task.dashboard']._invalidate_statistics_cache(clear=True)
+        changed = self.filtered(lambda stage: stage.category != categories[stage.id])
+        if changed:
+            # Changing a category opens or closes its tasks in every team
+            self.env['project.team'].browse()._refresh_metrics()
+            self.env['project.task.dashboard.stat']._update_stage_categories(changed)
+        return res
+
+    def unlink(self):
+        self.env['project.task.dashboard']._invalidate_statistics_cache(clear=True)
+        return super(ProjectTaskType, self).unlink()
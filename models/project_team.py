@@ -1,4 +1,13 @@
-from odoo import models, fields, api
+import logging
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+from ..tools.perf import PerfRecorder
+from ..tools.sql import create_index_unless_covered
+
+_logger = logging.getLogger(__name__)
 
 
 class ProjectTeam(models.Model):
@@ -6,9 +15,19 @@ class ProjectTeam(models.Model):
     _description = 'Project Team'
     _rec_name = 'name'
     _order = 'name'
+    _parent_store = True
 
     name = fields.Char(string='Team Name', required=True)
     active = fields.Boolean(string='Active', default=True)
+    parent_id = fields.Many2one(
+        'project.team',
+        string='Parent Team',
+        index=True,
+        ondelete='restrict',
+        help='Members of the parent team can see the projects of this team'
+    )
+    child_ids = fields.One2many('project.team', 'parent_id', string='Sub-teams')
+    parent_path = fields.Char(index=True, unaccent=False)
     member_ids = fields.Many2many(
         'res.users',
         'project_team_users_rel',
@@ -17,19 +36,320 @@ class ProjectTeam(models.Model):
         string='Team Members',
         required=True
     )
+    effective_member_ids = fields.Many2many(
+        'res.users',
+        'project_team_effective_member_rel',
+        'team_id',
+        'user_id',
+        string='Effective Members',
+        compute='_compute_effective_member_ids',
+        store=True,
+        recursive=True,
+        compute_sudo=True,
+        help='Members of the team and of all its parent teams'
+    )
     project_ids = fields.One2many(
         'project.project',
         'team_id',
         string='Projects'
     )
-    
-    @api.depends('member_ids')
-    def _compute_member_count(self):
+
+    # Team metrics, maintained by _refresh_metrics()
+    member_count = fields.Integer(string='Member Count', readonly=True)
+    project_count = fields.Integer(string='Projects Count', readonly=True)
+    # Task metrics, read from the counters of project.team.task.metric
+    task_metric_ids = fields.One2many('project.team.task.metric', 'team_id', string='Task Metrics')
+    open_task_count = fields.Integer(string='Open Tasks', compute='_compute_task_metrics')
+    overdue_task_count = fields.Integer(string='Overdue Tasks', compute='_compute_task_metrics')
+    load_per_member = fields.Float(
+        string='Load per Member', digits=(16, 2), compute='_compute_task_metrics',
+        help='Open tasks of the team projects per team member'
+    )
+
+    assignment_strategy = fields.Selection([
+        ('none', 'Manual'),
+        ('least_loaded', 'Least Loaded'),
+        ('round_robin', 'Round Robin'),
+        ('weighted', 'Weighted'),
+    ], string='Auto-assignment', default='none', required=True,
+        help='How new tasks created without assignee in the team projects are assigned to the team members:\n'
+             '- Least Loaded: to the member with the fewest open tasks\n'
+             '- Round Robin: to each member in turn\n'
+             '- Weighted: in proportion to the weight of each member, considering their open tasks')
+    member_load_ids = fields.One2many('project.team.member.load', 'team_id', string='Member Loads')
+
+    _METRIC_FIELDS = ['member_count', 'project_count']
+    _TASK_METRIC_FIELDS = ['open_task_count', 'overdue_task_count', 'load_per_member']
+
+    def init(self):
+        # Teams of a user, used by the team scope resolution
+        create_index_unless_covered(
+            self.env.cr, 'project_team_users_rel_user_id_team_id_index', 'project_team_users_rel',
+            ['user_id', 'team_id']
+        )
+        # Fill the metrics once the project and task columns exist
+        self.pool.post_init(self.browse()._refresh_metrics)
+
+    @api.depends('member_ids', 'parent_id.effective_member_ids')
+    def _compute_effective_member_ids(self):
         for team in self:
-            team.member_count = len(team.member_ids)
-    
-    member_count = fields.Integer(
-        string='Member Count',
-        compute='_compute_member_count',
-        store=True
-    )
\ No newline at end of file
+            team.effective_member_ids = team.member_ids | team.parent_id.effective_member_ids
+
+    @api.depends('member_count', 'task_metric_ids.open_task_count', 'task_metric_ids.overdue_task_count')
+    def _compute_task_metrics(self):
+        for team in self:
+            metric = team.task_metric_ids[:1]
+            team.open_task_count = metric.open_task_count
+            team.overdue_task_count = metric.overdue_task_count
+            team.load_per_member = metric.open_task_count / team.member_count if team.member_count else 0.0
+
+    @api.constrains('parent_id')
+    def _check_parent_id(self):
+        if not self._check_recursion():
+            raise ValidationError(_("A team cannot be one of its own parent teams."))
+
+    @api.model
+    @tools.ormcache('user_id')
+    def _get_user_team_scope(self, user_id):
+        """Return the team scope of a user as ``(team_ids, project_ids, member_ids)`` frozensets.
+
+        ``team_ids`` are the teams the user is an effective member of (their
+        own teams and the sub-teams), ``project_ids`` the projects of these
+        teams, archived ones included, and ``member_ids`` the team members of
+        these projects. The scope is read from the stored memberships without
+        record rules and cached per user until a team or a project team
+        changes.
+        """
+        self.flush_model(['effective_member_ids'])
+        self.env['project.project'].flush_model(['team_member_ids'])
+        cr = self.env.cr
+        cr.execute("SELECT team_id FROM project_team_effective_member_rel WHERE user_id = %s", [user_id])
+        team_ids = frozenset(team_id for team_id, in cr.fetchall())
+        cr.execute("SELECT DISTINCT project_id FROM project_team_member_access_rel WHERE user_id = %s", [user_id])
+        project_ids = [project_id for project_id, in cr.fetchall()]
+        cr.execute(
+            "SELECT DISTINCT user_id FROM project_team_member_access_rel WHERE project_id = ANY(%s)", [project_ids]
+        )
+        return team_ids, frozenset(project_ids), frozenset(member_id for member_id, in cr.fetchall())
+
+    def _get_descendant_teams(self):
+        """Return the teams and all their sub-teams, archived ones included"""
+        return self.with_context(active_test=False).search([('id', 'child_of', self.ids)])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        teams = super(ProjectTeam, self).create(vals_list)
+        teams._refresh_metrics()
+        self.clear_caches()
+        self.env['project.task.dashboard']._invalidate_statistics_cache(user_ids=teams.effective_member_ids.ids)
+        return teams
+
+    def write(self, vals):
+        perf = PerfRecorder(self.env.cr, 'project.team.write')
+        # Members and parents change the effective members of the sub-teams
+        update_members = 'member_ids' in vals or 'parent_id' in vals
+        update_scope = update_members or 'active' in vals
+        with perf.phase('previous_scope'):
+            if update_scope:
+                user_ids = set(self._get_descendant_teams().effective_member_ids.ids)
+            if 'member_ids' in vals:
+                previous_partner_ids = {team.id: set(team.member_ids.partner_id.ids) for team in self}
+        with perf.phase('write') as phase:
+            res = super(ProjectTeam, self).write(vals)
+            phase['rows'] = len(self)
+        if 'member_ids' in vals:
+            # Resync the followers of all the teams' projects at once
+            with perf.phase('followers') as phase:
+                projects = self.with_context(active_test=False).project_ids
+                projects._update_project_visibility({
+                    project.id: previous_partner_ids[project.team_id.id] for project in projects
+                })
+                phase['rows'] = len(projects)
+        if update_scope:
+            descendants = self._get_descendant_teams()
+            projects = descendants.with_context(active_test=False).project_ids
+        if 'member_ids' in vals:
+            with perf.phase('metrics'):
+                self._refresh_metrics()
+        if update_members:
+            with perf.phase('task_members') as phase:
+                self.env['project.task']._sync_team_members(projects.ids)
+                phase['rows'] = len(projects)
+            # Team scopes of the users (_get_user_team_scope)
+            self.clear_caches()
+        if update_scope:
+            with perf.phase('cache_invalidation'):
+                self.env['project.task.dashboard']._invalidate_statistics_cache(
+                    project_ids=projects.ids,
+                    user_ids=user_ids | set(descendants.effective_member_ids.ids)
+                )
+        perf.log()
+        return res
+
+    def unlink(self):
+        project_ids = self.with_context(active_test=False).project_ids.ids
+        self.env['project.task.dashboard']._invalidate_statistics_cache(
+            project_ids=project_ids, user_ids=self.effective_member_ids.ids
+        )
+        res = super(ProjectTeam, self).unlink()
+        self.env['project.task']._sync_team_members(project_ids)
+        self.clear_caches()
+        return res
+
+    def _refresh_metrics(self):
+        """Recompute the metrics of the teams, or of all teams if called on an empty recordset.
+
+        Members and projects are counted for every team in a single grouped
+        statement; the open tasks are recounted in the side counters of
+        ``project.team.task.metric``.
+        """
+        self.flush_model(['member_ids'])
+        self.env['project.project'].flush_model(['team_id', 'active'])
+        where = "AND {column} IN %(team_ids)s" if self else ""
+        self.env.cr.execute("""
+            UPDATE project_team team
+            SET member_count = COALESCE(members.count, 0),
+                project_count = COALESCE(projects.count, 0)
+            FROM project_team target
+            LEFT JOIN (
+                SELECT team_id, COUNT(*) AS count FROM project_team_users_rel
+                WHERE true {member_where} GROUP BY team_id
+            ) members ON members.team_id = target.id
+            LEFT JOIN (
+                SELECT team_id, COUNT(*) AS count FROM project_project
+                WHERE active = true {project_where} GROUP BY team_id
+            ) projects ON projects.team_id = target.id
+            WHERE team.id = target.id {team_where}
+              AND (team.member_count, team.project_count)
+                  IS DISTINCT FROM (COALESCE(members.count, 0), COALESCE(projects.count, 0))
+        """.format(
+            member_where=where.format(column='team_id'),
+            project_where=where.format(column='team_id'),
+            team_where=where.format(column='target.id'),
+        ), {'team_ids': tuple(self.ids)})
+        self.invalidate_model(self._METRIC_FIELDS + self._TASK_METRIC_FIELDS)
+        self.env['project.team.task.metric']._refresh(self)
+        self.env['project.team.member.load']._refresh(self)
+
+    @api.model
+    def _cron_refresh_metrics(self):
+        # Also catches up the overdue counts of the tasks whose deadline passed
+        self.browse()._refresh_metrics()
+
+    def _select_assignee(self, member_loads, last_user_id=False):
+        """Return the id of the member to assign the next new task to, following the team strategy.
+
+        :param member_loads: ``{user_id: [open task count, weight]}`` of the active members
+        :param last_user_id: member who got the previous task, for the round robin
+        :return: a user id, or None if no member can be assigned
+        """
+        self.ensure_one()
+        if self.assignment_strategy == 'round_robin':
+            user_ids = sorted(member_loads)
+            return next((user_id for user_id in user_ids if user_id > (last_user_id or 0)), user_ids[0] if user_ids else None)
+        if self.assignment_strategy == 'weighted':
+            candidates = {user_id: load for user_id, load in member_loads.items() if load[1] > 0}
+            return min(candidates, key=lambda user_id: ((candidates[user_id][0] + 1) / candidates[user_id][1], user_id), default=None)
+        return min(member_loads, key=lambda user_id: (member_loads[user_id][0], user_id), default=None)
+
+    def _get_member_open_task_ids(self, user_id):
+        """Return the ids of the active, open tasks of the team's projects assigned to the user"""
+        self.ensure_one()
+        self.env['project.task'].flush_model(['user_ids', 'project_id', 'stage_category', 'active'])
+        self.env['project.project'].flush_model(['team_id'])
+        self.env.cr.execute("""
+            SELECT t.id
+            FROM project_task t
+            JOIN project_task_user_rel rel ON rel.task_id = t.id AND rel.user_id = %s
+            JOIN project_project p ON p.id = t.project_id
+            WHERE p.team_id = %s AND t.active = true
+              AND COALESCE(t.stage_category, 'todo') IN ('todo', 'in_progress')
+            ORDER BY t.id
+        """, [user_id, self.id])
+        return [task_id for task_id, in self.env.cr.fetchall()]
+
+    def _check_reassignment_replacements(self, user_id, replacement_ids):
+        """Return the members taking over the tasks of ``user_id``, raise if there are none or not all in the team"""
+        self.ensure_one()
+        replacement_ids = [uid for uid in replacement_ids if uid != user_id]
+        if not replacement_ids:
+            raise UserError(_("Select at least one other member of the team to take over the tasks."))
+        if set(replacement_ids) - set(self.effective_member_ids.ids):
+            raise UserError(_("Tasks can only be reassigned to members of the team %s.", self.name))
+        return replacement_ids
+
+    def _reassign_member_tasks(self, user_id, replacement_ids, batch_size=1000, commit=False, progress=None):
+        """Move the open tasks of a member of the team to other members.
+
+        ``project_task_user_rel`` is rewritten with set-based statements, one
+        batch of ``batch_size`` tasks at a time; tasks are distributed over
+        ``replacement_ids`` in round-robin. Each batch keeps up what an ORM
+        assignment maintains: assignment date, personal stages, followers,
+        dashboard statistics and deltas, and member loads. With ``commit``,
+        each batch is committed in its own transaction.
+
+        :param progress: function called with the number of reassigned tasks
+            after each batch, before it is committed
+        :return: number of reassigned tasks
+        """
+        self.ensure_one()
+        replacement_ids = self._check_reassignment_replacements(user_id, replacement_ids)
+
+        Task = self.env['project.task']
+        Stat = self.env['project.task.dashboard.stat']
+        Load = self.env['project.team.member.load']
+        Dashboard = self.env['project.task.dashboard']
+        partner_ids = {user.id: user.partner_id.id for user in self.env['res.users'].browse(replacement_ids)}
+        task_ids = self._get_member_open_task_ids(user_id)
+        done = 0
+        for batch in split_every(batch_size, task_ids):
+            assignments = [
+                (task_id, replacement_ids[(done + index) % len(replacement_ids)])
+                for index, task_id in enumerate(batch)
+            ]
+            tasks = Task.browse(batch)
+            buckets = tasks._get_dashboard_buckets()
+            Stat._apply_tasks(batch, -1)
+            Load._apply_tasks(batch, -1)
+            self.env.cr.execute("""
+                INSERT INTO project_task_user_rel (task_id, user_id)
+                SELECT * FROM unnest(%s::int[], %s::int[])
+                ON CONFLICT DO NOTHING
+            """, [[task_id for task_id, _uid in assignments], [uid for _task_id, uid in assignments]])
+            self.env.cr.execute(
+                "DELETE FROM project_task_user_rel WHERE user_id = %s AND task_id IN %s",
+                [user_id, tuple(batch)]
+            )
+            # Same assignment date as an ORM write of the assignees
+            self.env.cr.execute(
+                "UPDATE project_task SET date_assign = %s WHERE id IN %s", [fields.Datetime.now(), tuple(batch)]
+            )
+            Task.invalidate_model(['user_ids', 'date_assign'])
+            Stat._apply_tasks(batch, 1)
+            Load._apply_tasks(batch, 1)
+            tasks._populate_missing_personal_stages()
+
+            # New assignees follow their tasks, as with an ORM assignment
+            for replacement_id in replacement_ids:
+                replacement_task_ids = [task_id for task_id, uid in assignments if uid == replacement_id]
+                if replacement_task_ids:
+                    self.env['mail.followers'].sudo()._insert_followers(
+                        'project.task', replacement_task_ids, [partner_ids[replacement_id]],
+                        check_existing=True, existing_policy='skip',
+                    )
+
+            done += len(batch)
+            Dashboard._invalidate_statistics_cache(
+                project_ids=self.with_context(active_test=False).project_ids.ids
+            )
+            deltas = tasks._get_dashboard_buckets()
+            deltas.subtract(buckets)
+            Dashboard._notify_statistics_deltas(deltas)
+            if progress:
+                progress(done)
+            if commit:
+                self.env.cr.commit()
+            _logger.info(
+                "Team %s: reassigned %s/%s open tasks of user #%s", self.name, done, len(task_ids), user_id
+            )
+        return done
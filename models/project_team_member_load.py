@@ -0,0 +1,115 @@
+from odoo import models, fields, api
+from odoo.tools import split_every
+
+
+class ProjectTeamMemberLoad(models.Model):
+    """Open task counter of each member of a team, used by the task auto-assignment.
+
+    There is one row per direct team member. Counts are the member's active
+    tasks in a to do or in progress stage of the team's active projects. They are
+    recomputed together with the team metrics and changed incrementally by
+    task create, write and unlink.
+    """
+    _name = 'project.team.member.load'
+    _description = 'Project Team Member Load'
+    _log_access = False
+    _order = 'team_id, user_id'
+
+    team_id = fields.Many2one('project.team', string='Team', required=True, readonly=True, ondelete='cascade')
+    user_id = fields.Many2one('res.users', string='Member', required=True, readonly=True, ondelete='cascade')
+    open_task_count = fields.Integer(string='Open Tasks', readonly=True)
+    weight = fields.Float(
+        string='Weight', default=1.0, digits=(16, 2),
+        help='Share of the new tasks given to the member by the weighted assignment; '
+             'a member with a zero weight gets no task'
+    )
+
+    _sql_constraints = [
+        ('team_user_uniq', 'unique(team_id, user_id)', 'A member has a single load per team.'),
+    ]
+
+    # Task fields whose value decides which member loads a task is counted in
+    _TASK_FIELDS = ['project_id', 'stage_id', 'stage_category', 'active', 'user_ids']
+
+    _OPEN_TASKS_QUERY = """
+        SELECT p.team_id, rel.user_id, COUNT(*) AS count
+        FROM project_task t
+        JOIN project_task_user_rel rel ON rel.task_id = t.id
+        JOIN project_project p ON p.id = t.project_id
+        WHERE t.active = true AND p.active = true AND p.team_id IS NOT NULL
+          AND COALESCE(t.stage_category, 'todo') IN ('todo', 'in_progress') {where}
+        GROUP BY p.team_id, rel.user_id
+    """
+
+    @api.model
+    def _refresh(self, teams):
+        """Sync the rows with the team members and recount their open tasks.
+
+        :param teams: teams to refresh, all teams if empty
+        """
+        self.env['project.team'].flush_model(['member_ids'])
+        self.env['project.project'].flush_model(['team_id', 'active'])
+        self.env['project.task'].flush_model(self._TASK_FIELDS)
+        self.flush_model()
+        cr = self.env.cr
+        where = "AND {column} IN %(team_ids)s" if teams else ""
+        params = {'team_ids': tuple(teams.ids)}
+        cr.execute("""
+            DELETE FROM {table} load
+            WHERE NOT EXISTS (
+                SELECT 1 FROM project_team_users_rel member
+                WHERE member.team_id = load.team_id AND member.user_id = load.user_id
+            ) {team_where}
+        """.format(table=self._table, team_where=where.format(column='load.team_id')), params)
+        cr.execute("""
+            INSERT INTO {table} (team_id, user_id, open_task_count, weight)
+            SELECT team_id, user_id, 0, 1.0 FROM project_team_users_rel
+            WHERE true {team_where}
+            ON CONFLICT (team_id, user_id) DO NOTHING
+        """.format(table=self._table, team_where=where.format(column='team_id')), params)
+        cr.execute("""
+            UPDATE {table} load
+            SET open_task_count = COALESCE(tasks.count, 0)
+            FROM {table} target
+            LEFT JOIN ({open_tasks}) tasks ON tasks.team_id = target.team_id AND tasks.user_id = target.user_id
+            WHERE load.id = target.id {team_where}
+        """.format(
+            table=self._table,
+            open_tasks=self._OPEN_TASKS_QUERY.format(where=where.format(column='p.team_id')),
+            team_where=where.format(column='target.team_id'),
+        ), params)
+        self.invalidate_model()
+
+    @api.model
+    def _apply_tasks(self, task_ids, sign):
+        """Add (sign=1) or subtract (sign=-1) the current contribution of the tasks to their assignees' loads"""
+        if not task_ids:
+            return
+        self.env['project.task'].flush_model(self._TASK_FIELDS)
+        cr = self.env.cr
+        for ids in split_every(cr.IN_MAX, task_ids):
+            cr.execute("""
+                UPDATE {table} load
+                SET open_task_count = load.open_task_count + %(sign)s * tasks.count
+                FROM ({open_tasks}) tasks
+                WHERE load.team_id = tasks.team_id AND load.user_id = tasks.user_id
+            """.format(table=self._table, open_tasks=self._OPEN_TASKS_QUERY.format(where="AND t.id IN %(task_ids)s")), {
+                'sign': sign,
+                'task_ids': tuple(ids),
+            })
+        self.invalidate_model(['open_task_count'])
+
+    @api.model
+    def _get_member_loads(self, teams):
+        """Return ``{team_id: {user_id: [open task count, weight]}}`` for the active members of the teams"""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT load.team_id, load.user_id, load.open_task_count, load.weight
+            FROM {table} load
+            JOIN res_users u ON u.id = load.user_id AND u.active = true
+            WHERE load.team_id IN %s
+        """.format(table=self._table), [tuple(teams.ids) or (0,)])
+        loads = {team_id: {} for team_id in teams.ids}
+        for team_id, user_id, count, weight in self.env.cr.fetchall():
+            loads[team_id][user_id] = [count, weight]
+        return loads
@@ -0,0 +1,131 @@
+import logging
+import threading
+from contextlib import nullcontext
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+
+class ProjectTeamReassignJob(models.Model):
+    """Background reassignment of the open tasks of a departing team member.
+
+    Jobs are queued by the reassignment wizard and run by a scheduled
+    action, one transaction per batch of tasks. They are regular records, so
+    that their state and progress outlive the wizard and the transient
+    records vacuum.
+    """
+    _name = 'project.team.reassign.job'
+    _description = 'Project Team Task Reassignment'
+    _order = 'id desc'
+    _rec_name = 'user_id'
+
+    team_id = fields.Many2one('project.team', string='Team', required=True, readonly=True, ondelete='cascade')
+    user_id = fields.Many2one('res.users', string='Departing Member', required=True, readonly=True, ondelete='cascade')
+    replacement_ids = fields.Many2many(
+        'res.users',
+        'project_team_reassign_job_replacement_rel',
+        'job_id',
+        'user_id',
+        string='Replacements',
+        readonly=True,
+        help='Members taking over the tasks, in round-robin'
+    )
+    remove_from_team = fields.Boolean(string='Remove from Team', readonly=True)
+    batch_size = fields.Integer(string='Batch Size', default=1000, required=True, readonly=True)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, default='queued', readonly=True)
+    progress_total = fields.Integer(string='Tasks to Reassign', readonly=True)
+    progress_done = fields.Integer(string='Reassigned Tasks', readonly=True)
+    progress = fields.Float(string='Progress', compute='_compute_progress')
+    error_message = fields.Text(string='Error', readonly=True)
+
+    @api.depends('progress_total', 'progress_done')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = 100.0 * job.progress_done / job.progress_total if job.progress_total else 0.0
+
+    def _get_form_action(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_retry(self):
+        """Queue a failed reassignment again, for the tasks still assigned to the member"""
+        self.ensure_one()
+        self.team_id._check_reassignment_replacements(self.user_id.id, self.replacement_ids.ids)
+        self.write({
+            'state': 'queued',
+            'progress_total': len(self.team_id._get_member_open_task_ids(self.user_id.id)),
+            'progress_done': 0,
+            'error_message': False,
+        })
+        self.env.ref('project_team_rules.ir_cron_reassign_member_tasks')._trigger()
+        return self._get_form_action()
+
+    def action_refresh(self):
+        """Reopen the job to show the current progress"""
+        return self._get_form_action()
+
+    @api.model
+    def _cron_reassign_tasks(self):
+        """Run the queued reassignments, and resume those interrupted by a server restart"""
+        # Each batch gets its own transaction, except in tests
+        commit = not getattr(threading.current_thread(), 'testing', False)
+        for job in self.search([('state', 'in', ('queued', 'running'))], order='id'):
+            job._run_reassignment(commit=commit)
+
+    def _run_reassignment(self, commit=True):
+        """Reassign the tasks in batches, committed one by one with ``commit``.
+
+        Every committed batch is a complete reassignment of its tasks: when a
+        later step fails, the job is marked as failed with the error and can
+        be retried for the remaining open tasks.
+        """
+        self.ensure_one()
+        self.state = 'running'
+        if commit:
+            self.env.cr.commit()
+
+        def progress(done):
+            self.progress_done = done
+
+        try:
+            # Without commits, the savepoint undoes the whole reassignment
+            with nullcontext() if commit else self.env.cr.savepoint():
+                count = self.team_id._reassign_member_tasks(
+                    self.user_id.id, self.replacement_ids.ids,
+                    batch_size=max(self.batch_size, 1), commit=commit, progress=progress,
+                )
+                if self.remove_from_team:
+                    self.team_id.member_ids = [(3, self.user_id.id)]
+                self.state = 'done'
+        except Exception as e:
+            if commit:
+                self.env.cr.rollback()
+            _logger.exception("Reassignment of the tasks of user #%s in team %s failed", self.user_id.id, self.team_id.name)
+            self.write({'state': 'failed', 'error_message': str(e)})
+            self._notify_reassignment(_('Task Reassignment Failed'), str(e), 'danger')
+        else:
+            self._notify_reassignment(
+                _('Tasks Reassigned'), _('%s open tasks of %s were reassigned.', count, self.user_id.name), 'success'
+            )
+        if commit:
+            self.env.cr.commit()
+
+    def _notify_reassignment(self, title, message, notification_type):
+        self.env['bus.bus']._sendone(self.create_uid.partner_id, 'simple_notification', {
+            'title': title,
+            'message': message,
+            'type': notification_type,
+            'sticky': notification_type == 'danger',
+        })
@@ -0,0 +1,99 @@
+from odoo import models, fields, api
+from odoo.tools import split_every
+
+
+class ProjectTeamTaskMetric(models.Model):
+    """Open task counters of a team, kept apart from the team record.
+
+    There is one row per team. Counts are the active tasks in a to do or in
+    progress stage of the team's active projects. They are recomputed
+    together with the team metrics and changed incrementally by task create,
+    write and unlink, so task transactions update this row and never the
+    ``project_team`` row edited by the team managers. The round robin
+    position of the auto-assignment is stored here for the same reason.
+    """
+    _name = 'project.team.task.metric'
+    _description = 'Project Team Task Metric'
+    _log_access = False
+    _rec_name = 'team_id'
+
+    team_id = fields.Many2one('project.team', string='Team', required=True, readonly=True, ondelete='cascade')
+    open_task_count = fields.Integer(string='Open Tasks', readonly=True)
+    overdue_task_count = fields.Integer(string='Overdue Tasks', readonly=True)
+    last_assigned_user_id = fields.Many2one(
+        'res.users', string='Last Auto-assigned Member', readonly=True, ondelete='set null'
+    )
+
+    _sql_constraints = [
+        ('team_uniq', 'unique(team_id)', 'A team has a single task metric.'),
+    ]
+
+    # Task fields whose value decides whether and where a task is counted
+    _TASK_FIELDS = ['project_id', 'stage_id', 'stage_category', 'active', 'date_deadline']
+
+    # Open task counts per team: active tasks of the active projects of the
+    # team, in a to do or in progress stage (or without stage)
+    _OPEN_TASKS_QUERY = """
+        SELECT p.team_id, COUNT(*) AS open_count,
+               COUNT(*) FILTER (WHERE t.date_deadline < %(today)s) AS overdue_count
+        FROM project_task t
+        JOIN project_project p ON p.id = t.project_id
+        WHERE t.active = true AND p.active = true AND p.team_id IS NOT NULL
+          AND COALESCE(t.stage_category, 'todo') IN ('todo', 'in_progress') {where}
+        GROUP BY p.team_id
+    """
+
+    @api.model
+    def _refresh(self, teams):
+        """Create the missing rows and recount the open tasks.
+
+        :param teams: teams to refresh, all teams if empty
+        """
+        self.env['project.project'].flush_model(['team_id', 'active'])
+        self.env['project.task'].flush_model(self._TASK_FIELDS)
+        self.flush_model()
+        cr = self.env.cr
+        where = "AND {column} IN %(team_ids)s" if teams else ""
+        params = {'team_ids': tuple(teams.ids), 'today': fields.Date.today()}
+        cr.execute("""
+            INSERT INTO {table} (team_id, open_task_count, overdue_task_count)
+            SELECT id, 0, 0 FROM project_team
+            WHERE true {team_where}
+            ON CONFLICT (team_id) DO NOTHING
+        """.format(table=self._table, team_where=where.format(column='id')), params)
+        cr.execute("""
+            UPDATE {table} metric
+            SET open_task_count = COALESCE(tasks.open_count, 0),
+                overdue_task_count = COALESCE(tasks.overdue_count, 0)
+            FROM {table} target
+            LEFT JOIN ({open_tasks}) tasks ON tasks.team_id = target.team_id
+            WHERE metric.id = target.id {team_where}
+        """.format(
+            table=self._table,
+            open_tasks=self._OPEN_TASKS_QUERY.format(where=where.format(column='p.team_id')),
+            team_where=where.format(column='target.team_id'),
+        ), params)
+        self.invalidate_model()
+        self.env['project.team'].invalidate_model(self.env['project.team']._TASK_METRIC_FIELDS)
+
+    @api.model
+    def _apply_tasks(self, task_ids, sign):
+        """Add (sign=1) or subtract (sign=-1) the current contribution of the tasks to their team counters"""
+        if not task_ids:
+            return
+        self.env['project.task'].flush_model(self._TASK_FIELDS)
+        cr = self.env.cr
+        for ids in split_every(cr.IN_MAX, task_ids):
+            cr.execute("""
+                UPDATE {table} metric
+                SET open_task_count = metric.open_task_count + %(sign)s * tasks.open_count,
+                    overdue_task_count = metric.overdue_task_count + %(sign)s * tasks.overdue_count
+                FROM ({open_tasks}) tasks
+                WHERE metric.team_id = tasks.team_id
+            """.format(table=self._table, open_tasks=self._OPEN_TASKS_QUERY.format(where="AND t.id IN %(task_ids)s")), {
+                'sign': sign,
+                'task_ids': tuple(ids),
+                'today': fields.Date.today(),
+            })
+        self.invalidate_model(['open_task_count', 'overdue_task_count'])
+        self.env['project.team'].invalidate_model(self.env['project.team']._TASK_METRIC_FIELDS)
@@ -2,28 +2,174 @@
 
 import {registry} from "@web/core/registry";
 import {useService} from "@web/core/utils/hooks";
-import {Component, useState, onWillStart} from "@odoo/owl";
+import {debounce} from "@web/core/utils/timing";
+import {Component, useState, onWillStart, onWillUnmount} from "@odoo/owl";
+
+const ASSIGNEE_PAGE_SIZE = 50;
+const FILTER_OPTION_PAGE_SIZE = 20;
+// Server methods searching the options of each filter dropdown
+const FILTER_OPTION_METHODS = {
+    users: "search_dashboard_assignees",
+    projects: "search_dashboard_projects",
+    teams: "search_dashboard_teams",
+};
+const DASHBOARD_CHANNEL = "project_team_rules_dashboard";
+const DELTA_NOTIFICATION = "project_team_rules/dashboard_delta";
+// Bootstrap color of the stage counts per stage category
+const STAGE_CATEGORY_COLORS = {
+    todo: "info",
+    in_progress: "warning",
+    done: "success",
+    cancelled: "secondary",
+};
 
 class TaskDashboard extends Component {
     setup() {
         this.rpc = useService("rpc");
         this.action = useService("action");
+        this.busService = useService("bus_service");
 
         this.state = useState({
             period: 'all',
             selectedUserId: false,
             selectedUserName: 'All Users',
+            selectedProjectId: false,
+            selectedProjectName: 'All Projects',
+            selectedTeamId: false,
+            selectedTeamName: 'All Teams',
             stats: {
+                period: {},
                 total_tasks: 0,
-                done_tasks: 0,
-                in_progress_tasks: 0,
-                todo_tasks: 0,
-                assignees: []
-            }
+                stages: [],
+            },
+            // Sections are fetched concurrently and rendered as they arrive
+            loading: {totals: true, stages: true, projects: true, assignees: true},
+            projects: [],
+            // Assignee table, loaded one page at a time
+            assignees: [],
+            assigneeTotal: 0,
+            onlyWithTasks: false,
+            // Filter dropdowns, searched on the server
+            filterOptions: {
+                users: {search: '', records: [], total: 0},
+                projects: {search: '', records: [], total: 0},
+                teams: {search: '', records: [], total: 0},
+            },
         });
+        this._searchFilterOptions = {};
+        for (const kind of Object.keys(FILTER_OPTION_METHODS)) {
+            this._searchFilterOptions[kind] = debounce(() => this.loadFilterOptions(kind), 300);
+        }
+        // In-flight section requests, aborted when a newer one replaces them
+        this._pendingSections = {};
+        // Changes too large to be sent as deltas reload the statistics, at
+        // most once per burst of notifications
+        this._reloadStatistics = debounce(() => this.loadStatistics(), 1000);
 
         onWillStart(async () => {
-            await this.loadStatistics();
+            await Promise.all(Object.keys(FILTER_OPTION_METHODS).map((kind) => this.loadFilterOptions(kind)));
+        });
+        // Not awaited: sections render progressively behind skeletons
+        this.loadStatistics();
+
+        // Counts are patched in place from the deltas pushed by the server
+        this._onBusNotification = this._onBusNotification.bind(this);
+        this.busService.addEventListener("notification", this._onBusNotification);
+        this.busService.addChannel(DASHBOARD_CHANNEL);
+        onWillUnmount(() => {
+            for (const request of Object.values(this._pendingSections)) {
+                request.abort(false);
+            }
+            this.busService.removeEventListener("notification", this._onBusNotification);
+            this.busService.deleteChannel(DASHBOARD_CHANNEL);
+        });
+    }
+
+    _onBusNotification({detail: notifications}) {
+        for (const {type, payload} of notifications) {
+            if (type === DELTA_NOTIFICATION) {
+                this._applyDelta(payload);
+            }
+        }
+    }
+
+    _applyDelta(payload) {
+        if (payload.reload) {
+            // Without team_ids, the changes may concern any project
+            if (!this.state.selectedTeamId || !payload.team_ids.length
+                    || payload.team_ids.includes(this.state.selectedTeamId)) {
+                this._reloadStatistics();
+            }
+            return;
+        }
+        if ((this.state.selectedProjectId && payload.project_id !== this.state.selectedProjectId)
+                || (this.state.selectedTeamId && !payload.team_ids.includes(this.state.selectedTeamId))) {
+            return;
+        }
+        const selectedUserId = this.state.selectedUserId;
+        const project = this.state.projects.find(p => p.id === payload.project_id);
+        for (const [assigneeId, stageId, createDate, delta] of payload.changes) {
+            if (!this._isInPeriod(createDate)) {
+                continue;
+            }
+            const stageName = stageId && payload.stages[stageId];
+            const category = stageId && payload.stage_categories[stageId];
+            // Totals count distinct tasks, or the tasks of the selected user
+            if (assigneeId === (selectedUserId || false)) {
+                this.state.stats.total_tasks += delta;
+                if (stageName) {
+                    this._patchStageCount(this.state.stats.stages, stageName, category, delta);
+                }
+                if (project) {
+                    project.total_tasks += delta;
+                    if (stageName) {
+                        this._patchStageCount(project.stages, stageName, category, delta);
+                    }
+                }
+            }
+            const assignee = assigneeId && this.state.assignees.find(a => a.id === assigneeId);
+            if (assignee) {
+                assignee.total_tasks += delta;
+                if (stageName) {
+                    this._patchStageCount(assignee.stages, stageName, category, delta);
+                }
+            }
+        }
+    }
+
+    _patchStageCount(stages, name, category, delta) {
+        const index = stages.findIndex(s => s.name === name && s.category === category);
+        if (index === -1) {
+            if (delta > 0) {
+                stages.push({name: name, count: delta, category: category});
+            }
+        } else if (stages[index].count + delta > 0) {
+            stages[index].count += delta;
+        } else {
+            stages.splice(index, 1);
+        }
+    }
+
+    stageColor(stage) {
+        return STAGE_CATEGORY_COLORS[stage.category] || "info";
+    }
+
+    _isInPeriod(createDate) {
+        // UTC datetime strings in the same format compare chronologically;
+        // tasks older than every period but 'all' have no creation date
+        const {start, end} = this._getPeriodBounds();
+        if (!createDate) {
+            return !start;
+        }
+        return (!start || createDate >= start) && (!end || createDate < end);
+    }
+
+    _callDashboard(method, args, kwargs = {}) {
+        return this.rpc(`/web/dataset/call_kw/project.task.dashboard/${method}`, {
+            model: "project.task.dashboard",
+            method: method,
+            args: args,
+            kwargs: kwargs
         });
     }
 
@@ -31,21 +177,124 @@ class TaskDashboard extends Component {
         // Use current state values if not provided
         period = period !== null ? period : this.state.period;
         assignee_id = assignee_id !== null ? assignee_id : this.state.selectedUserId;
+        this.state.period = period;
+        this.state.selectedUserId = assignee_id;
 
-        const result = await this.rpc("/web/dataset/call_kw/project.task.dashboard/get_task_statistics", {
-            model: "project.task.dashboard",
-            method: "get_task_statistics",
-            args: [period, assignee_id],
-            kwargs: {}
+        const args = [period, assignee_id];
+        const filters = this._getFilterKwargs();
+        await Promise.all([
+            this._loadSection("totals", "get_statistics_totals", args, filters, (result) => {
+                this.state.stats.period = result.period;
+                this.state.stats.total_tasks = result.total_tasks;
+            }),
+            this._loadSection("stages", "get_stage_statistics", args, filters, (result) => {
+                this.state.stats.stages = result.stages;
+            }),
+            this._loadSection("projects", "get_project_statistics", args, filters, (result) => {
+                this.state.projects = result.projects;
+            }),
+            this.loadAssignees(true),
+        ]);
+    }
+
+    _getFilterKwargs() {
+        return {
+            project_ids: this.state.selectedProjectId ? [this.state.selectedProjectId] : [],
+            team_ids: this.state.selectedTeamId ? [this.state.selectedTeamId] : [],
+        };
+    }
+
+    /**
+     * Fetch a section of the statistics, aborting the previous request of the
+     * section if it is still running: only the latest filters are applied.
+     * The loading state is reset whether the request succeeds or fails, so
+     * that a failed request does not block the section.
+     */
+    _loadSection(section, method, args, kwargs, apply) {
+        if (this._pendingSections[section]) {
+            this._pendingSections[section].abort(false);
+        }
+        this.state.loading[section] = true;
+        const request = this._callDashboard(method, args, kwargs);
+        this._pendingSections[section] = request;
+        const isLatest = () => this._pendingSections[section] === request;
+        return request.then(
+            (result) => {
+                if (isLatest()) {
+                    apply(result);
+                }
+            },
+            (error) => {
+                // Only the failures of a request replaced by a newer one are ignored
+                if (isLatest()) {
+                    throw error;
+                }
+            }
+        ).finally(() => {
+            if (isLatest()) {
+                delete this._pendingSections[section];
+                this.state.loading[section] = false;
+            }
+        });
+    }
+
+    loadAssignees(reset = false) {
+        if (!reset && this._pendingSections.assignees) {
+            return Promise.resolve();
+        }
+        const offset = reset ? 0 : this.state.assignees.length;
+        const kwargs = {
+            offset: offset,
+            limit: ASSIGNEE_PAGE_SIZE,
+            only_with_tasks: this.state.onlyWithTasks,
+            ...this._getFilterKwargs(),
+        };
+        const args = [this.state.period, this.state.selectedUserId];
+        return this._loadSection("assignees", "get_assignee_statistics", args, kwargs, (page) => {
+            this.state.assignees = reset ? page.assignees : this.state.assignees.concat(page.assignees);
+            this.state.assigneeTotal = page.total;
         });
+    }
 
-        this.state.stats = result;
-        this.state.period = period;
-        if (assignee_id !== null) {
-            this.state.selectedUserId = assignee_id;
+    async loadFilterOptions(kind, reset = true) {
+        const options = this.state.filterOptions[kind];
+        const offset = reset ? 0 : options.records.length;
+        const page = await this._callDashboard(FILTER_OPTION_METHODS[kind], [options.search], {
+            offset: offset,
+            limit: FILTER_OPTION_PAGE_SIZE,
+        });
+        options.records = reset ? page.records : options.records.concat(page.records);
+        options.total = page.total;
+    }
+
+    _isScrolledToBottom(ev) {
+        const el = ev.target;
+        return el.scrollTop + el.clientHeight >= el.scrollHeight - 40;
+    }
+
+    async onAssigneeScroll(ev) {
+        if (this._isScrolledToBottom(ev) && this.state.assignees.length < this.state.assigneeTotal) {
+            await this.loadAssignees();
         }
     }
 
+    async onFilterOptionsScroll(kind, ev) {
+        const options = this.state.filterOptions[kind];
+        if (this._isScrolledToBottom(ev) && options.records.length < options.total) {
+            await this.loadFilterOptions(kind, false);
+        }
+    }
+
+    onFilterSearchInput(kind, ev) {
+        this.state.filterOptions[kind].search = ev.target.value;
+        this._searchFilterOptions[kind]();
+    }
+
+    async onOnlyWithTasksChange(ev) {
+        this.state.onlyWithTasks = ev.target.checked;
+        await this.loadAssignees(true);
+    }
+
     async onPeriodClick(period) {
         await this.loadStatistics(period, this.state.selectedUserId);
     }
@@ -56,8 +305,20 @@ class TaskDashboard extends Component {
         await this.loadStatistics(this.state.period, userId);
     }
 
+    async onProjectFilterClick(projectId, projectName) {
+        this.state.selectedProjectId = projectId;
+        this.state.selectedProjectName = projectName;
+        await this.loadStatistics();
+    }
+
+    async onTeamFilterClick(teamId, teamName) {
+        this.state.selectedTeamId = teamId;
+        this.state.selectedTeamName = teamName;
+        await this.loadStatistics();
+    }
+
     async onAssigneeClick(assignee_id) {
-        const assignee = this.state.stats.assignees.find(a => a.id === assignee_id);
+        const assignee = this.state.assignees.find(a => a.id === assignee_id);
         if (assignee) {
             await this.onUserFilterClick(assignee_id, assignee.name);
         }
@@ -93,40 +354,47 @@ class TaskDashboard extends Component {
         });
     }
 
+    exportStatistics(fileFormat) {
+        const params = new URLSearchParams({period: this.state.period});
+        if (this.state.selectedUserId) {
+            params.set('assignee_id', this.state.selectedUserId);
+        }
+        if (this.state.selectedProjectId) {
+            params.set('project_ids', this.state.selectedProjectId);
+        }
+        if (this.state.selectedTeamId) {
+            params.set('team_ids', this.state.selectedTeamId);
+        }
+        window.location = `/project_team_rules/dashboard/export/${fileFormat}?${params.toString()}`;
+    }
+
+    _getPeriodBounds() {
+        // UTC bounds resolved by the server in the user's timezone, so that
+        // drill-downs list exactly the tasks that were counted
+        const period = this.state.stats.period || {};
+        return {start: period.start || null, end: period.end || null};
+    }
+
     _getDomain() {
         const domain = [];
-        const today = new Date();
-
-        switch (this.state.period) {
-            case 'this_week':
-                const weekStart = new Date(today);
-                weekStart.setDate(today.getDate() - today.getDay());
-                domain.push(['create_date', '>=', weekStart.toISOString().split('T')[0]]);
-                break;
-            case 'prev_week':
-                const prevWeekEnd = new Date(today);
-                prevWeekEnd.setDate(today.getDate() - today.getDay());
-                const prevWeekStart = new Date(prevWeekEnd);
-                prevWeekStart.setDate(prevWeekEnd.getDate() - 7);
-                domain.push(['create_date', '>=', prevWeekStart.toISOString().split('T')[0]]);
-                domain.push(['create_date', '<', prevWeekEnd.toISOString().split('T')[0]]);
-                break;
-            case 'this_month':
-                const monthStart = new Date(today.getFullYear(), today.getMonth(), 1);
-                domain.push(['create_date', '>=', monthStart.toISOString().split('T')[0]]);
-                break;
-            case 'prev_month':
-                const prevMonthEnd = new Date(today.getFullYear(), today.getMonth(), 1);
-                const prevMonthStart = new Date(today.getFullYear(), today.getMonth() - 1, 1);
-                domain.push(['create_date', '>=', prevMonthStart.toISOString().split('T')[0]]);
-                domain.push(['create_date', '<', prevMonthEnd.toISOString().split('T')[0]]);
-                break;
-        }
-
-        // Add user filter to domain
+        const {start, end} = this._getPeriodBounds();
+        if (start) {
+            domain.push(['create_date', '>=', start]);
+        }
+        if (end) {
+            domain.push(['create_date', '<', end]);
+        }
+
+        // Add user, project and team filters to domain
         if (this.state.selectedUserId) {
             domain.push(['user_ids', 'in', this.state.selectedUserId]);
         }
+        if (this.state.selectedProjectId) {
+            domain.push(['project_id', '=', this.state.selectedProjectId]);
+        }
+        if (this.state.selectedTeamId) {
+            domain.push(['project_id.team_id', 'child_of', this.state.selectedTeamId]);
+        }
 
         return domain;
     }
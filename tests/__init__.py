@@ -1,4 +1,6 @@
 from . import test_project_team
 from . import test_project_security
 from . import test_task_assignment
-from . import test_task_dashboard
\ No newline at end of file
+from . import test_task_dashboard
+from . import test_performance
+from . import test_benchmark
\ No newline at end of file
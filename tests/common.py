@@ -0,0 +1,139 @@
+import logging
+import os
+import time
+
+from odoo.tests import common
+
+_logger = logging.getLogger(__name__)
+
+BENCHMARK_SCALES = {
+    'small': {'teams': 5, 'members': 10, 'projects': 20, 'tasks': 2000, 'stages': 4},
+    'medium': {'teams': 20, 'members': 15, 'projects': 200, 'tasks': 50000, 'stages': 6},
+    'large': {'teams': 100, 'members': 20, 'projects': 1000, 'tasks': 500000, 'stages': 8},
+}
+
+
+def get_benchmark_scale():
+    """Return the dataset dimensions of the benchmarks.
+
+    ``PROJECT_TEAM_RULES_BENCH_SCALE`` selects one of ``BENCHMARK_SCALES``
+    (default ``small``) and ``PROJECT_TEAM_RULES_BENCH_<DIMENSION>``, e.g.
+    ``PROJECT_TEAM_RULES_BENCH_TASKS=100000``, overrides a single dimension.
+    """
+    scale = dict(BENCHMARK_SCALES[os.environ.get('PROJECT_TEAM_RULES_BENCH_SCALE', 'small')])
+    for dimension in scale:
+        value = os.environ.get('PROJECT_TEAM_RULES_BENCH_%s' % dimension.upper())
+        if value:
+            scale[dimension] = int(value)
+    return scale
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of the values"""
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class TeamRulesDatasetCase(common.TransactionCase):
+    """Builds a synthetic dataset of teams, members, projects and tasks.
+
+    Records are created in batches once per test class. Each team gets its
+    own members and projects, tasks are spread over the projects, stages
+    and team members in a deterministic way.
+    """
+
+    dataset_teams = 5
+    dataset_members = 10
+    dataset_projects = 20
+    dataset_tasks = 2000
+    dataset_stages = 4
+    # Spread the task creation dates over that many days (0: all created now)
+    dataset_days = 0
+
+    @classmethod
+    def setUpClass(cls):
+        super(TeamRulesDatasetCase, cls).setUpClass()
+        cls.env = cls.env(context=dict(
+            cls.env.context,
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+            no_reset_password=True,
+        ))
+        cls._create_dataset()
+
+    @classmethod
+    def _create_dataset(cls):
+        started = time.time()
+        group_user = cls.env.ref('project.group_project_user')
+        cls.manager = cls.env['res.users'].create({
+            'name': 'Dataset Manager',
+            'login': 'dataset_manager',
+            'groups_id': [(6, 0, [cls.env.ref('project.group_project_manager').id])],
+        })
+        cls.stages = cls.env['project.task.type'].create([{
+            'name': 'Dataset Stage %s' % index,
+            'sequence': index,
+            'fold': index == cls.dataset_stages - 1,
+        } for index in range(cls.dataset_stages)])
+
+        cls.teams = cls.env['project.team']
+        cls.members = cls.env['res.users']
+        for team_index in range(cls.dataset_teams):
+            members = cls.env['res.users'].create([{
+                'name': 'Dataset Member %s-%s' % (team_index, index),
+                'login': 'dataset_member_%s_%s' % (team_index, index),
+                'groups_id': [(6, 0, [group_user.id])],
+            } for index in range(cls.dataset_members)])
+            cls.members |= members
+            cls.teams |= cls.env['project.team'].create({
+                'name': 'Dataset Team %s' % team_index,
+                'member_ids': [(6, 0, members.ids)],
+            })
+
+        cls.projects = cls.env['project.project'].create([{
+            'name': 'Dataset Project %s' % index,
+            'privacy_visibility': 'team',
+            'team_id': cls.teams[index % cls.dataset_teams].id,
+            'type_ids': [(6, 0, cls.stages.ids)],
+        } for index in range(cls.dataset_projects)])
+
+        task_vals = []
+        for index in range(cls.dataset_tasks):
+            project = cls.projects[index % cls.dataset_projects]
+            team_members = project.team_id.member_ids
+            task_vals.append({
+                'name': 'Dataset Task %s' % index,
+                'project_id': project.id,
+                'stage_id': cls.stages[index % cls.dataset_stages].id,
+                'user_ids': [(6, 0, [team_members[index % len(team_members)].id])],
+            })
+        cls.tasks = cls.env['project.task'].create(task_vals)
+        cls.env.flush_all()
+        if cls.dataset_days:
+            cls.env.cr.execute(
+                "UPDATE project_task SET create_date = now() at time zone 'UTC' - (id %% %s) * interval '1 day' "
+                "WHERE id IN %s",
+                [cls.dataset_days, tuple(cls.tasks.ids)]
+            )
+            cls.env['project.task'].invalidate_model(['create_date'])
+            cls.env['project.task.dashboard.stat']._rebuild()
+        cls.env.cr.execute("ANALYZE")
+        _logger.info(
+            "Created dataset of %s teams, %s members, %s projects and %s tasks in %.2fs",
+            len(cls.teams), len(cls.members), len(cls.projects), len(cls.tasks), time.time() - started,
+        )
+
+    def _measure(self, func, repeat=5):
+        """Call ``func`` ``repeat`` times and return (durations, query counts)"""
+        durations = []
+        query_counts = []
+        for _index in range(repeat):
+            self.env.invalidate_all()
+            queries_before = self.env.cr.sql_log_count
+            started = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - started)
+            query_counts.append(self.env.cr.sql_log_count - queries_before)
+        return durations, query_counts
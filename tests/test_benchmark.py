@@ -0,0 +1,158 @@
+import logging
+import os
+
+from odoo.tests import tagged
+
+from .common import TeamRulesDatasetCase, get_benchmark_scale, percentile
+
+_logger = logging.getLogger(__name__)
+
+SCALE = get_benchmark_scale()
+
+# Default limits per scenario: p95 wall time in milliseconds and maximum
+# number of queries of a run. Query limits do not depend on the scale.
+# Override with PROJECT_TEAM_RULES_BENCH_<SCENARIO>_P95_MS and
+# PROJECT_TEAM_RULES_BENCH_<SCENARIO>_QUERIES.
+THRESHOLDS = {
+    'dashboard_manager': {'p95_ms': 5000, 'queries': 15},
+    'dashboard_member': {'p95_ms': 5000, 'queries': 20},
+    'task_search_manager': {'p95_ms': 5000, 'queries': 5},
+    'task_search_member': {'p95_ms': 5000, 'queries': 5},
+    'project_reassignment': {'p95_ms': 5000, 'queries': 60},
+    'team_membership_edit': {'p95_ms': 5000, 'queries': 60},
+    'task_form_open': {'p95_ms': 2000, 'queries': 10},
+    'task_list_render': {'p95_ms': 2000, 'queries': 10},
+    'task_bulk_create_least_loaded': {'p95_ms': 10000, 'queries': 400},
+    'task_bulk_create_round_robin': {'p95_ms': 10000, 'queries': 400},
+    'task_bulk_create_weighted': {'p95_ms': 10000, 'queries': 400},
+}
+
+# Tasks created per run by the bulk creation scenarios
+BULK_CREATE_SIZE = int(os.environ.get('PROJECT_TEAM_RULES_BENCH_BULK_CREATE_SIZE', 200))
+
+# Fields read by the task form and list views around the team assignees
+TASK_FORM_FIELDS = ['name', 'project_id', 'stage_id', 'user_ids', 'project_team_member_ids', 'description']
+TASK_LIST_FIELDS = ['name', 'project_id', 'stage_id', 'user_ids', 'project_team_member_ids']
+
+
+@tagged('post_install', '-at_install', '-standard', 'project_team_rules_bench')
+class TestTeamRulesBenchmark(TeamRulesDatasetCase):
+    """Benchmarks of the team rules hot paths at a configurable scale.
+
+    Run with ``--test-tags=project_team_rules_bench``; each scenario logs its
+    p50/p95 wall time and query count and fails above its thresholds.
+    """
+
+    dataset_teams = SCALE['teams']
+    dataset_members = SCALE['members']
+    dataset_projects = SCALE['projects']
+    dataset_tasks = SCALE['tasks']
+    dataset_stages = SCALE['stages']
+    dataset_days = 365
+
+    repeat = int(os.environ.get('PROJECT_TEAM_RULES_BENCH_REPEAT', 10))
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestTeamRulesBenchmark, cls).setUpClass()
+        cls.results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        _logger.info("Benchmark results for %s:", SCALE)
+        for name, result in sorted(cls.results.items()):
+            _logger.info(
+                "  %-24s p50 %8.2fms  p95 %8.2fms  queries %s",
+                name, result['p50_ms'], result['p95_ms'], result['queries'],
+            )
+        super(TestTeamRulesBenchmark, cls).tearDownClass()
+
+    def _get_threshold(self, name, key):
+        value = os.environ.get('PROJECT_TEAM_RULES_BENCH_%s_%s' % (name.upper(), key.upper()))
+        return float(value) if value else THRESHOLDS[name][key]
+
+    def _benchmark(self, name, func):
+        durations, query_counts = self._measure(func, repeat=self.repeat)
+        result = self.results[name] = {
+            'p50_ms': percentile(durations, 50) * 1000,
+            'p95_ms': percentile(durations, 95) * 1000,
+            'queries': max(query_counts),
+        }
+        _logger.info(
+            "Benchmark %s: p50 %.2fms, p95 %.2fms, %s queries",
+            name, result['p50_ms'], result['p95_ms'], result['queries'],
+        )
+        self.assertLessEqual(
+            result['p95_ms'], self._get_threshold(name, 'p95_ms'),
+            "Benchmark %s is above its p95 threshold" % name,
+        )
+        self.assertLessEqual(
+            result['queries'], self._get_threshold(name, 'queries'),
+            "Benchmark %s runs more queries than its threshold" % name,
+        )
+
+    def test_01_dashboard_manager(self):
+        dashboard = self.env['project.task.dashboard'].with_user(self.manager)
+        self._benchmark('dashboard_manager', lambda: dashboard._compute_task_statistics('this_month', False))
+
+    def test_02_dashboard_member(self):
+        dashboard = self.env['project.task.dashboard'].with_user(self.members[0])
+        self._benchmark('dashboard_member', lambda: dashboard._compute_task_statistics('this_month', False))
+
+    def test_03_task_search_manager(self):
+        Task = self.env['project.task'].with_user(self.manager)
+        self._benchmark('task_search_manager', lambda: Task.search([], limit=80))
+
+    def test_04_task_search_member(self):
+        Task = self.env['project.task'].with_user(self.members[0])
+        self._benchmark('task_search_member', lambda: Task.search([], limit=80))
+
+    def test_05_project_reassignment(self):
+        project = self.projects[0]
+        teams = [project.team_id, self.teams[1] if project.team_id == self.teams[0] else self.teams[0]]
+        runs = iter(range(self.repeat))
+
+        def reassign():
+            project.write({'team_id': teams[(next(runs) + 1) % 2].id})
+            self.env.flush_all()
+        self._benchmark('project_reassignment', reassign)
+
+    def test_06_team_membership_edit(self):
+        team = self.teams[0]
+        newcomer = self.members.filtered(lambda m: m not in team.member_ids)[0]
+        runs = iter(range(self.repeat))
+
+        def edit_membership():
+            command = 4 if next(runs) % 2 == 0 else 3
+            team.write({'member_ids': [(command, newcomer.id)]})
+            self.env.flush_all()
+        self._benchmark('team_membership_edit', edit_membership)
+
+    def test_07_task_form_open(self):
+        task = self.tasks[0].with_user(self.members[0])
+        self._benchmark('task_form_open', lambda: task.read(TASK_FORM_FIELDS))
+
+    def test_08_task_list_render(self):
+        Task = self.env['project.task'].with_user(self.members[0])
+        self._benchmark('task_list_render', lambda: Task.search_read([], TASK_LIST_FIELDS, limit=80))
+
+    def _benchmark_bulk_create(self, strategy):
+        project = self.projects[0]
+        project.team_id.assignment_strategy = strategy
+        Task = self.env['project.task']
+        name = 'task_bulk_create_%s' % strategy
+        self._benchmark(name, lambda: Task.create([
+            {'name': 'Bulk Task %s' % index, 'project_id': project.id} for index in range(BULK_CREATE_SIZE)
+        ]))
+        _logger.info(
+            "Benchmark %s: %.0f tasks/s (p50)", name, BULK_CREATE_SIZE / (self.results[name]['p50_ms'] / 1000)
+        )
+
+    def test_09_task_bulk_create_least_loaded(self):
+        self._benchmark_bulk_create('least_loaded')
+
+    def test_10_task_bulk_create_round_robin(self):
+        self._benchmark_bulk_create('round_robin')
+
+    def test_11_task_bulk_create_weighted(self):
+        self._benchmark_bulk_create('weighted')
\ No newline at end of file
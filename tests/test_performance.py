@@ -0,0 +1,142 @@
+import logging
+
+from odoo.tests import tagged
+
+from .common import TeamRulesDatasetCase
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install', '-standard', 'project_team_rules_perf')
+class TestTeamRulesPerformance(TeamRulesDatasetCase):
+
+    dataset_projects = 200
+
+    def test_01_task_search_team_member_rules(self):
+        """Benchmark task searches of team members with the stored team access relation"""
+        member = self.members[0]
+        Task = self.env['project.task'].sudo()
+        legacy_domain = [('project_id.team_id.member_ids', 'in', member.id)]
+        stored_domain = [('project_id.team_member_ids', 'in', member.id)]
+
+        # Both domains select the same tasks
+        self.assertEqual(Task.search(legacy_domain), Task.search(stored_domain))
+
+        legacy, _counts = self._measure(lambda: Task.search(legacy_domain))
+        stored, _counts = self._measure(lambda: Task.search(stored_domain))
+        rules, counts = self._measure(lambda: self.env['project.task'].with_user(member).search([]))
+        _logger.info(
+            "project.task.search as team member: legacy rule path %.2fms, stored relation %.2fms, "
+            "with record rules %.2fms (%s queries)",
+            min(legacy) * 1000, min(stored) * 1000, min(rules) * 1000, max(counts),
+        )
+
+    def test_02_team_access_follows_membership(self):
+        """Test that the stored team access relation follows membership changes at scale"""
+        team = self.teams[0]
+        newcomer = self.members[-1]
+        team.member_ids = [(4, newcomer.id)]
+        self.assertEqual(
+            self.env['project.project'].search([('team_member_ids', 'in', newcomer.id)]),
+            self.env['project.project'].search([('team_id.member_ids', 'in', newcomer.id)]),
+        )
+
+    def test_03_mass_project_reassignment_followers(self):
+        """Benchmark reassigning every project to another team with batched follower sync"""
+        target_team = self.teams[0]
+        projects = self.projects.filtered(lambda p: p.team_id != target_team)
+        self.env.flush_all()
+
+        queries_before = self.env.cr.sql_log_count
+        projects.write({'team_id': target_team.id})
+        self.env.flush_all()
+        query_count = self.env.cr.sql_log_count - queries_before
+        _logger.info("Reassigned %s projects to a new team in %s queries", len(projects), query_count)
+
+        # The follower diff is applied per team, not per project
+        self.assertLess(query_count, len(projects))
+        expected_partners = target_team.member_ids.partner_id
+        for project in projects:
+            self.assertEqual(project.message_partner_ids & self.members.partner_id, expected_partners)
+
+    def test_04_bulk_project_import_followers(self):
+        """Test that importing thousands of team projects subscribes followers in bounded queries"""
+        def import_projects(prefix, with_team):
+            rows = [
+                ['%s %s' % (prefix, index), 'team', with_team and self.teams[index % len(self.teams)].name or '']
+                for index in range(2000)
+            ]
+            queries_before = self.env.cr.sql_log_count
+            result = self.env['project.project'].load(['name', 'privacy_visibility', 'team_id'], rows)
+            self.env.flush_all()
+            self.assertFalse(result['messages'])
+            return self.env['project.project'].browse(result['ids']), self.env.cr.sql_log_count - queries_before
+
+        _projects, baseline_count = import_projects('Imported Without Team', False)
+        projects, team_count = import_projects('Imported With Team', True)
+        _logger.info(
+            "Imported %s projects in %s queries without team, %s queries with team",
+            len(projects), baseline_count, team_count,
+        )
+
+        # The follower pass runs once per team, whatever the number of projects
+        self.assertLess(team_count - baseline_count, len(projects) / 20)
+        for project in projects[:len(self.teams)]:
+            self.assertEqual(
+                project.message_partner_ids & self.members.partner_id,
+                project.team_id.member_ids.partner_id,
+            )
+
+
+@tagged('post_install', '-at_install', '-standard', 'project_team_rules_perf')
+class TestTeamRulesQueryPlans(TeamRulesDatasetCase):
+    """Check that the dashboard queries use the module's indexes on a large dataset"""
+
+    dataset_teams = 50
+    dataset_members = 4
+    dataset_projects = 200
+    dataset_tasks = 10000
+    dataset_days = 730
+
+    def _get_seq_scans(self, query, params):
+        self.env.cr.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+        nodes = [self.env.cr.fetchone()[0][0]['Plan']]
+        seq_scans = set()
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                seq_scans.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return seq_scans
+
+    def assertNoSeqScan(self, query, params, tables):
+        seq_scans = self._get_seq_scans(query, params) & set(tables)
+        self.assertFalse(seq_scans, "Sequential scan on %s for query:\n%s" % (', '.join(seq_scans), query))
+
+    def test_01_dashboard_period_query_plan(self):
+        """Test that the managers' period statistics use the creation date index"""
+        dashboard = self.env['project.task.dashboard'].with_user(self.manager)
+        for period in ('prev_week', 'this_week'):
+            query, params = dashboard._get_stage_matrix_query(dashboard._get_period_domain(period))
+            self.assertNoSeqScan(query, params, ['project_task'])
+
+    def test_02_dashboard_team_scope_query_plan(self):
+        """Test that team scoped statistics use the project index"""
+        member = self.members[0]
+        dashboard = self.env['project.task.dashboard'].with_user(member)
+        team_projects = self.env['project.project'].search([('team_member_ids', 'in', member.id)])
+        domain = [('project_id', 'in', team_projects.ids)]
+        query, params = dashboard._get_stage_matrix_query(domain)
+        self.assertNoSeqScan(query, params, ['project_task'])
+
+    def test_03_dashboard_assignee_query_plan(self):
+        """Test that the assignee filter uses the assignee reverse index"""
+        dashboard = self.env['project.task.dashboard'].with_user(self.manager)
+        domain = [('user_ids', 'in', self.members[0].id)]
+        query, params = dashboard._get_stage_matrix_query(domain)
+        self.assertNoSeqScan(query, params, ['project_task', 'project_task_user_rel'])
+
+    def test_04_team_access_query_plan(self):
+        """Test that the team access relation is looked up by user"""
+        query = self.env['project.project'].sudo()._search([('team_member_ids', 'in', self.members[0].id)])
+        self.assertNoSeqScan(*query.select(), ['project_team_member_access_rel'])
@@ -125,12 +125,14 @@ class TestProjectSecurity(common.TransactionCase):
     
     def test_06_task_visibility_assigned_user(self):
         """Test that assigned users can see tasks even if not team members"""
-        # Create task and assign to non-team member
+        # Create task assigned to a member who then leaves the team
+        self.team1.member_ids = [(4, self.user_other.id)]
         task = self.env['project.task'].create({
             'name': 'Assigned Task',
             'project_id': self.project_team_privacy.id,
             'user_ids': [(6, 0, [self.user_other.id])]
         })
+        self.team1.member_ids = [(3, self.user_other.id)]
         
         # Assigned user should see the task
         tasks = self.env['project.task'].with_user(self.user_other).search([])
@@ -147,4 +149,50 @@ class TestProjectSecurity(common.TransactionCase):
         
         # Check that new team members are followers
         follower_partners = self.project_team_privacy.message_partner_ids
-        self.assertIn(self.user_other.partner_id, follower_partners)
\ No newline at end of file
+        self.assertIn(self.user_other.partner_id, follower_partners)
+
+    def test_08_team_access_follows_membership(self):
+        """Test that team membership changes update project and task access"""
+        task = self.env['project.task'].create({
+            'name': 'Membership Task',
+            'project_id': self.project_team_privacy.id,
+        })
+        self.assertEqual(self.project_team_privacy.team_member_ids, self.user_team_member)
+
+        # Adding a member grants access to the team's projects and tasks
+        self.team1.member_ids = [(4, self.user_other.id)]
+        self.assertIn(self.project_team_privacy, self.env['project.project'].with_user(self.user_other).search([]))
+        self.assertIn(task, self.env['project.task'].with_user(self.user_other).search([]))
+
+        # Removing the member revokes it
+        self.team1.member_ids = [(3, self.user_other.id)]
+        self.assertNotIn(self.project_team_privacy, self.env['project.project'].with_user(self.user_other).search([]))
+        self.assertNotIn(task, self.env['project.task'].with_user(self.user_other).search([]))
+
+        # Changing the project team moves the access to the new team
+        self.project_team_privacy.team_id = self.team2
+        self.assertEqual(self.project_team_privacy.team_member_ids, self.user_other)
+        self.assertNotIn(self.project_team_privacy, self.env['project.project'].with_user(self.user_team_member).search([]))
+
+    def test_09_team_membership_syncs_followers(self):
+        """Test that team membership changes resync the followers of the team's projects"""
+        second_project = self.env['project.project'].create({
+            'name': 'Second Team Privacy Project',
+            'privacy_visibility': 'team',
+            'team_id': self.team1.id
+        })
+        projects = self.project_team_privacy | second_project
+
+        self.team1.member_ids = [(4, self.user_other.id)]
+        for project in projects:
+            self.assertIn(self.user_other.partner_id, project.message_partner_ids)
+
+        self.team1.member_ids = [(3, self.user_other.id)]
+        for project in projects:
+            self.assertNotIn(self.user_other.partner_id, project.message_partner_ids)
+            self.assertIn(self.user_team_member.partner_id, project.message_partner_ids)
+
+        # Members of the former team stop following a reassigned project
+        self.project_team_privacy.team_id = self.team2
+        self.assertNotIn(self.user_team_member.partner_id, self.project_team_privacy.message_partner_ids)
+        self.assertIn(self.user_other.partner_id, self.project_team_privacy.message_partner_ids)
@@ -1,5 +1,9 @@
+import json
+
+from odoo import fields
 from odoo.tests import common, tagged
-from odoo.exceptions import ValidationError, AccessError
+from odoo.exceptions import ValidationError, AccessError, UserError
+from odoo.addons.bus.models.bus import channel_with_db, json_dump
 
 
 @tagged('post_install', '-at_install')
@@ -96,4 +100,218 @@ class TestProjectTeam(common.TransactionCase):
             'team_id': self.project_team.id
         })
         
-        self.assertEqual(len(self.project_team.project_ids), 2)
\ No newline at end of file
+        self.assertEqual(len(self.project_team.project_ids), 2)
+
+    def _create_member_tasks(self):
+        project = self.env['project.project'].create({
+            'name': 'Reassignment Project',
+            'privacy_visibility': 'team',
+            'team_id': self.project_team.id
+        })
+        stage_open = self.env['project.task.type'].create({'name': 'Open', 'fold': False})
+        stage_done = self.env['project.task.type'].create({'name': 'Closed', 'fold': True})
+        open_tasks = self.env['project.task'].create([{
+            'name': 'Open Task %s' % index,
+            'project_id': project.id,
+            'stage_id': stage_open.id,
+            'user_ids': [(6, 0, [self.user_member1.id])]
+        } for index in range(4)])
+        done_task = self.env['project.task'].create({
+            'name': 'Done Task',
+            'project_id': project.id,
+            'stage_id': stage_done.id,
+            'user_ids': [(6, 0, [self.user_member1.id])]
+        })
+        return open_tasks, done_task
+
+    def test_05_reassign_member_tasks_to_replacement(self):
+        """Test reassigning the open tasks of a departing member to a replacement"""
+        open_tasks, done_task = self._create_member_tasks()
+
+        wizard = self.env['project.team.reassign.wizard'].create({
+            'team_id': self.project_team.id,
+            'user_id': self.user_member1.id,
+            'strategy': 'replacement',
+            'replacement_user_id': self.user_member2.id,
+            'batch_size': 3,
+        })
+        self.assertEqual(wizard.open_task_count, 4)
+        action = wizard.action_reassign()
+        job = self.env['project.team.reassign.job'].browse(action['res_id'])
+        self.assertEqual((job.state, job.progress_total), ('queued', 4))
+        self.assertEqual(job.replacement_ids, self.user_member2)
+
+        # The job outlives the wizard; the scheduled action runs it and reports its progress
+        wizard.unlink()
+        job._cron_reassign_tasks()
+        self.assertEqual((job.state, job.progress_done, job.progress), ('done', 4, 100.0))
+        for task in open_tasks:
+            self.assertEqual(task.user_ids, self.user_member2)
+            self.assertIn(self.user_member2.partner_id, task.message_partner_ids)
+        # Closed tasks keep their history
+        self.assertEqual(done_task.user_ids, self.user_member1)
+        self.assertNotIn(self.user_member1, self.project_team.member_ids)
+
+    def test_06_reassign_member_tasks_round_robin(self):
+        """Test spreading the open tasks of a departing member over the remaining members"""
+        open_tasks, done_task = self._create_member_tasks()
+        self.project_team.member_ids = [(4, self.user_manager.id)]
+        self.env.cr.execute("UPDATE project_task SET date_assign = NULL WHERE id IN %s", [tuple(open_tasks.ids)])
+        open_tasks.invalidate_recordset(['date_assign'])
+        self.env.cr.precommit.run()
+        Bus = self.env['bus.bus'].sudo()
+        Bus.search([]).unlink()
+
+        count = self.project_team._reassign_member_tasks(
+            self.user_member1.id, (self.project_team.member_ids - self.user_member1).ids, batch_size=3
+        )
+        self.assertEqual(count, 4)
+        assignees = open_tasks.mapped('user_ids')
+        self.assertEqual(assignees, self.user_member2 | self.user_manager)
+        for task in open_tasks:
+            self.assertEqual(len(task.user_ids), 1)
+            self.assertTrue(task.date_assign)
+        self.assertEqual(self.env['project.task.stage.personal'].search_count([
+            ('task_id', 'in', open_tasks.ids), ('user_id', 'in', assignees.ids),
+        ]), 4)
+
+        # The member loads and the open dashboards follow, as with an ORM assignment
+        self.assertEqual(
+            {load.user_id: load.open_task_count for load in self.project_team.member_load_ids},
+            {self.user_member1: 0, self.user_member2: 2, self.user_manager: 2}
+        )
+        self.env.cr.precommit.run()
+        notification = Bus.search([
+            ('channel', '=', json_dump(channel_with_db(self.env.cr.dbname, self.project_team)))
+        ])
+        changes = json.loads(notification.message)['payload']['changes']
+        deltas = {}
+        for assignee_id, _stage_id, _bucket, delta in changes:
+            deltas[assignee_id] = deltas.get(assignee_id, 0) + delta
+        self.assertEqual(deltas, {self.user_member1.id: -4, self.user_member2.id: 2, self.user_manager.id: 2})
+
+        # Replacements must belong to the team
+        with self.assertRaises(UserError):
+            self.project_team._reassign_member_tasks(self.user_member2.id, self.user_non_member.ids)
+
+    def test_07_team_hierarchy_visibility(self):
+        """Test that members of a parent team see and can be assigned to the sub-team projects"""
+        department = self.env['project.team'].create({
+            'name': 'Department',
+            'member_ids': [(6, 0, [self.user_non_member.id])]
+        })
+        project = self.env['project.project'].create({
+            'name': 'Sub-team Project',
+            'privacy_visibility': 'team',
+            'team_id': self.project_team.id
+        })
+        task = self.env['project.task'].create({'name': 'Sub-team Task', 'project_id': project.id})
+        Project = self.env['project.project'].with_user(self.user_non_member)
+        self.assertFalse(Project.search([('id', '=', project.id)]))
+
+        self.project_team.parent_id = department
+        self.assertEqual(self.project_team.effective_member_ids, self.project_team.member_ids | self.user_non_member)
+        self.assertEqual(Project.search([('id', '=', project.id)]), project)
+        self.assertIn(self.user_non_member, task.project_team_member_ids)
+        task.user_ids = [(4, self.user_non_member.id)]
+
+        # Members of the department reach the projects of nested sub-teams too
+        division = self.env['project.team'].create({
+            'name': 'Division',
+            'member_ids': [(6, 0, [self.user_manager.id])]
+        })
+        department.parent_id = division
+        self.assertIn(self.user_manager, project.team_member_ids)
+        self.assertEqual(
+            self.env['project.team'].search([('id', 'child_of', division.id)]),
+            division | department | self.project_team
+        )
+
+        department.member_ids = [(3, self.user_non_member.id), (4, self.user_manager.id)]
+        self.assertNotIn(self.user_non_member, project.team_member_ids)
+        self.assertNotIn(self.user_non_member, task.project_team_member_ids)
+        self.assertFalse(Project.search([('id', '=', project.id)]))
+
+        with self.assertRaises(ValidationError):
+            division.parent_id = self.project_team
+
+    def _get_metrics(self, team):
+        return {name: team[name] for name in team._METRIC_FIELDS + team._TASK_METRIC_FIELDS}
+
+    def test_08_team_metrics(self):
+        """Test that the team metrics follow membership, project and task changes"""
+        team = self.project_team
+        project = self.env['project.project'].create({
+            'name': 'Metrics Project',
+            'privacy_visibility': 'team',
+            'team_id': team.id
+        })
+        done_stage = self.env['project.task.type'].create({'name': 'Metrics Done', 'fold': True})
+        yesterday = fields.Date.subtract(fields.Date.today(), days=1)
+        tasks = self.env['project.task'].create([
+            {'name': 'Open Task', 'project_id': project.id},
+            {'name': 'Overdue Task', 'project_id': project.id, 'date_deadline': yesterday},
+            {'name': 'Done Task', 'project_id': project.id, 'stage_id': done_stage.id},
+        ])
+        self.assertEqual(self._get_metrics(team), {
+            'member_count': 2,
+            'project_count': 1,
+            'open_task_count': 2,
+            'overdue_task_count': 1,
+            'load_per_member': 1.0,
+        })
+
+        team.member_ids = [(4, self.user_manager.id)]
+        tasks[1].stage_id = done_stage
+        tasks[2].date_deadline = yesterday
+        self.assertEqual(self._get_metrics(team), {
+            'member_count': 3,
+            'project_count': 1,
+            'open_task_count': 1,
+            'overdue_task_count': 0,
+            'load_per_member': round(1 / 3, 2),
+        })
+
+        other_team = self.env['project.team'].create({
+            'name': 'Metrics Other Team',
+            'member_ids': [(6, 0, [self.user_non_member.id])]
+        })
+        tasks[0].copy({'name': 'Copied Task'})
+        project.team_id = other_team
+        self.assertEqual((team.project_count, team.open_task_count), (0, 0))
+        self.assertEqual((other_team.project_count, other_team.open_task_count), (1, 2))
+
+        tasks[0].unlink()
+        self.assertEqual(other_team.open_task_count, 1)
+        # The incremental updates match a full refresh
+        metrics = self._get_metrics(other_team)
+        self.env['project.team']._cron_refresh_metrics()
+        self.assertEqual(self._get_metrics(other_team), metrics)
+
+    def test_09_reassign_member_tasks_failure(self):
+        """Test that a failed background reassignment is reported on its job and undone"""
+        open_tasks, _done_task = self._create_member_tasks()
+        wizard = self.env['project.team.reassign.wizard'].create({
+            'team_id': self.project_team.id,
+            'user_id': self.user_member1.id,
+            'strategy': 'replacement',
+            'replacement_user_id': self.user_member2.id,
+        })
+        job = self.env['project.team.reassign.job'].browse(wizard.action_reassign()['res_id'])
+
+        # The replacement left the team in between
+        self.project_team.member_ids = [(3, self.user_member2.id)]
+        job._cron_reassign_tasks()
+        self.assertEqual(job.state, 'failed')
+        self.assertTrue(job.error_message)
+        for task in open_tasks:
+            self.assertEqual(task.user_ids, self.user_member1)
+        self.assertIn(self.user_member1, self.project_team.member_ids)
+
+        # Once the replacement is back, the job can be retried
+        self.project_team.member_ids = [(4, self.user_member2.id)]
+        job.action_retry()
+        self.assertEqual((job.state, job.error_message), ('queued', False))
+        job._cron_reassign_tasks()
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(open_tasks.user_ids, self.user_member2)
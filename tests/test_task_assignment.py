@@ -1,4 +1,4 @@
-from odoo.tests import common, tagged
+from odoo.tests import common, tagged, Form
 from odoo.exceptions import ValidationError
 
 
@@ -92,11 +92,16 @@ class TestTaskAssignment(common.TransactionCase):
         
         self.assertEqual(len(task.user_ids), 2)
         
-        # Change to project2 (different team)
-        task.project_id = self.project2
-        task._onchange_project_id_team_filter()
+        # Moving the task alone is rejected, as its assignees are not in team2
+        with self.assertRaises(ValidationError):
+            task.project_id = self.project2
+
+        # Change to project2 (different team) from the form
+        with Form(task) as task_form:
+            task_form.project_id = self.project2
         
         # Previous assignees should be removed as they're not in team2
+        self.assertEqual(task.project_id, self.project2)
         self.assertEqual(len(task.user_ids), 0)
     
     def test_04_task_project_change_keeps_valid_assignees(self):
@@ -151,4 +156,151 @@ class TestTaskAssignment(common.TransactionCase):
         })
         
         # Non-member can be assigned when privacy is not 'team'
-        self.assertIn(self.user_non_member, task.user_ids)
\ No newline at end of file
+        self.assertIn(self.user_non_member, task.user_ids)
+
+    def test_07_non_member_assignment_rejected(self):
+        """Test that assigning a non-member to a team project task is rejected on write"""
+        task = self.env['project.task'].create({
+            'name': 'Constrained Task',
+            'project_id': self.project1.id,
+            'user_ids': [(6, 0, [self.user_member1.id])]
+        })
+        with self.assertRaises(ValidationError):
+            task.write({'user_ids': [(4, self.user_non_member.id)]})
+
+        with self.assertRaises(ValidationError):
+            self.env['project.task'].create({
+                'name': 'Constrained Task 2',
+                'project_id': self.project1.id,
+                'user_ids': [(6, 0, [self.user_non_member.id])]
+            })
+
+        # Moving the task to another team's project checks its assignees too
+        with self.assertRaises(ValidationError):
+            task.write({'project_id': self.project2.id})
+
+        # The check cannot be skipped from the context of an RPC call
+        with self.assertRaises(ValidationError):
+            task.with_context(defer_team_assignee_check=True).write({'user_ids': [(4, self.user_non_member.id)]})
+
+    def test_08_bulk_assignment_reports_all_violations(self):
+        """Test that a deferred bulk reassignment reports every violation at once"""
+        tasks = self.env['project.task'].create([{
+            'name': 'Bulk Task %s' % index,
+            'project_id': self.project1.id,
+            'user_ids': [(6, 0, [self.user_member1.id])]
+        } for index in range(3)])
+
+        with self.assertRaises(ValidationError) as error:
+            with self.env['project.task']._defer_team_assignee_check():
+                tasks[0].write({'user_ids': [(6, 0, [self.user_non_member.id])]})
+                tasks[1].write({'user_ids': [(6, 0, [self.user_member2.id])]})
+                tasks[2].write({'user_ids': [(4, self.user_non_member.id)]})
+
+                self.assertEqual(tasks._get_team_assignee_violations(), {
+                    tasks[0].id: [self.user_non_member.id],
+                    tasks[2].id: [self.user_non_member.id],
+                })
+                # One query checks all the tasks and assignees
+                self.env.flush_all()
+                with self.assertQueryCount(1):
+                    tasks._get_team_assignee_violations()
+        self.assertIn(tasks[0].name, str(error.exception))
+        self.assertIn(tasks[2].name, str(error.exception))
+        self.assertNotIn(tasks[1].name, str(error.exception))
+
+    def test_09_stored_project_team_members(self):
+        """Test that the stored team members of tasks follow team and project changes"""
+        tasks = self.env['project.task'].create([{
+            'name': 'Stored Members Task %s' % index,
+            'project_id': self.project1.id,
+        } for index in range(2)])
+        Task = self.env['project.task']
+        self.assertEqual(tasks[0].project_team_member_ids, self.user_member1 | self.user_member2)
+
+        self.team1.write({'member_ids': [(4, self.user_non_member.id)]})
+        self.assertEqual(
+            Task.search([('project_team_member_ids', 'in', self.user_non_member.id)]) & tasks, tasks
+        )
+
+        self.team1.write({'member_ids': [(3, self.user_member2.id)]})
+        self.assertEqual(tasks[1].project_team_member_ids, self.user_member1 | self.user_non_member)
+
+        self.project1.write({'team_id': self.team2.id})
+        self.assertEqual(tasks.project_team_member_ids, self.user_non_member)
+
+        tasks[0].write({'project_id': False})
+        self.assertFalse(tasks[0].project_team_member_ids)
+        self.assertEqual(tasks[1].project_team_member_ids, self.user_non_member)
+
+    def test_10_auto_assignment_strategies(self):
+        """Test that new tasks without assignee are spread over the team members"""
+        Task = self.env['project.task']
+        member1, member2 = self.user_member1, self.user_member2
+        self.team1.assignment_strategy = 'least_loaded'
+        Task.create({'name': 'Busy Task', 'project_id': self.project1.id, 'user_ids': [(6, 0, member1.ids)]})
+        tasks = Task.create([{'name': 'Least Loaded %s' % index, 'project_id': self.project1.id} for index in range(3)])
+        self.assertEqual([task.user_ids for task in tasks], [member2, member1, member2])
+        self.assertEqual(
+            {load.user_id: load.open_task_count for load in self.team1.member_load_ids},
+            {member1: 2, member2: 2}
+        )
+
+        self.team1.assignment_strategy = 'round_robin'
+        tasks = Task.create([{'name': 'Round Robin %s' % index, 'project_id': self.project1.id} for index in range(3)])
+        self.assertEqual([task.user_ids for task in tasks], [member1, member2, member1])
+        task = Task.with_context(default_project_id=self.project1.id).create({'name': 'Round Robin Next'})
+        self.assertEqual(task.user_ids, member2)
+
+        self.team1.assignment_strategy = 'weighted'
+        self.team1.member_load_ids.filtered(lambda load: load.user_id == member1).weight = 3
+        self.team1.member_load_ids.filtered(lambda load: load.user_id == member2).weight = 1
+        loads = self.env['project.team.member.load']._get_member_loads(self.team1)[self.team1.id]
+        self.assertEqual(loads, {member1.id: [4, 3.0], member2.id: [4, 1.0]})
+        tasks = Task.create([{'name': 'Weighted %s' % index, 'project_id': self.project1.id} for index in range(4)])
+        self.assertEqual([task.user_ids for task in tasks], [member1, member1, member1, member1])
+
+        # Explicit assignees are kept and auto-assignment can be disabled
+        task = Task.create({'name': 'Explicit', 'project_id': self.project1.id, 'user_ids': [(6, 0, member2.ids)]})
+        self.assertEqual(task.user_ids, member2)
+        task = Task.with_context(project_team_no_auto_assign=True).create({
+            'name': 'Manual', 'project_id': self.project1.id
+        })
+        self.assertFalse(task.user_ids)
+
+        # Closing a task lowers its assignee's load
+        folded = self.env['project.task.type'].create({'name': 'Auto Done', 'fold': True})
+        tasks.write({'stage_id': folded.id})
+        self.assertEqual(
+            {load.user_id: load.open_task_count for load in self.team1.member_load_ids},
+            {member1: 4, member2: 5}
+        )
+
+    def test_11_user_team_scope(self):
+        """Test that the cached team scope of a user follows team and project changes"""
+        Team = self.env['project.team']
+        self.assertEqual(
+            Team._get_user_team_scope(self.user_member1.id),
+            (frozenset(self.team1.ids), frozenset(self.project1.ids), frozenset((self.user_member1 | self.user_member2).ids))
+        )
+
+        # Cached: no query on the second call
+        with self.assertQueryCount(0):
+            Team._get_user_team_scope(self.user_member1.id)
+
+        self.team1.write({'member_ids': [(4, self.user_non_member.id)]})
+        team_ids, project_ids, member_ids = Team._get_user_team_scope(self.user_non_member.id)
+        self.assertEqual(team_ids, frozenset((self.team1 | self.team2).ids))
+        self.assertEqual(project_ids, frozenset((self.project1 | self.project2).ids))
+
+        self.project2.write({'team_id': self.team1.id})
+        self.assertEqual(Team._get_user_team_scope(self.user_member2.id)[1], frozenset((self.project1 | self.project2).ids))
+
+        # The onchange relies on the same scope
+        task = self.env['project.task'].new({
+            'project_id': self.project1.id,
+            'user_ids': [(6, 0, [self.user_member1.id])],
+        })
+        self.team1.write({'member_ids': [(3, self.user_member1.id)]})
+        task._onchange_project_id_team_filter()
+        self.assertFalse(task.user_ids)
\ No newline at end of file
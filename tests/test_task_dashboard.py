@@ -1,4 +1,11 @@
+import json
+from unittest.mock import patch
+
+from odoo import fields
 from odoo.tests import common, tagged
+from odoo.exceptions import AccessError
+from odoo.addons.bus.models.bus import channel_with_db, json_dump
+from odoo.addons.project_team_rules.tools import replica
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
@@ -48,7 +55,8 @@ class TestTaskDashboard(common.TransactionCase):
         self.stage_todo = self.env['project.task.type'].create({
             'name': 'To Do',
             'sequence': 1,
-            'fold': False
+            'fold': False,
+            'category': 'todo'
         })
         
         self.stage_progress = self.env['project.task.type'].create({
@@ -298,4 +306,786 @@ class TestTaskDashboard(common.TransactionCase):
         stage_dict = {s['name']: s['count'] for s in user1_stat['stages']}
         self.assertEqual(stage_dict.get('To Do', 0), 2)
         self.assertEqual(stage_dict.get('In Progress', 0), 1)
-        self.assertEqual(stage_dict.get('Done', 0), 1)
\ No newline at end of file
+        self.assertEqual(stage_dict.get('Done', 0), 1)
+
+    def _get_stat_rows(self):
+        Stat = self.env['project.task.dashboard.stat']
+        rows = Stat.search([('project_id', '=', self.project.id)])
+        return sorted(
+            (r.assignee_id.id, r.stage_id.id, r.day, r.task_count) for r in rows
+        )
+
+    def test_07_dashboard_stat_incremental(self):
+        """Test that the statistics table follows task changes and matches a full rebuild"""
+        task1 = self.env['project.task'].create({
+            'name': 'Stat Task 1',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id, self.user2.id])],
+            'stage_id': self.stage_todo.id
+        })
+        task2 = self.env['project.task'].create({
+            'name': 'Stat Task 2',
+            'project_id': self.project.id,
+            'stage_id': self.stage_todo.id
+        })
+        task3 = self.env['project.task'].create({
+            'name': 'Stat Task 3',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_progress.id
+        })
+
+        # Move, reassign, archive and delete tasks
+        task1.stage_id = self.stage_done
+        task2.user_ids = [(4, self.user2.id)]
+        task3.active = False
+        task2.unlink()
+
+        incremental = self._get_stat_rows()
+        self.env['project.task.dashboard.stat']._rebuild()
+        self.assertEqual(incremental, self._get_stat_rows())
+
+        counts = {(assignee, stage): count for assignee, stage, day, count in incremental}
+        self.assertEqual(counts, {
+            (self.user1.id, self.stage_done.id): 1,
+            (self.user2.id, self.stage_done.id): 1,
+        })
+
+    def test_08_dashboard_view_reads_stat_table(self):
+        """Test that the dashboard SQL view aggregates the statistics table"""
+        self.env['project.task'].create({
+            'name': 'View Done Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_done.id
+        })
+        self.env['project.task'].create({
+            'name': 'View Progress Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_progress.id
+        })
+        self.env['project.task'].create({
+            'name': 'View Unassigned Task',
+            'project_id': self.project.id,
+            'stage_id': self.stage_todo.id
+        })
+        # Open tasks nobody is assigned to are still to do
+        unassigned_progress = self.env['project.task'].create({
+            'name': 'View Unassigned Progress Task',
+            'project_id': self.project.id,
+            'stage_id': self.stage_progress.id
+        })
+
+        Dashboard = self.env['project.task.dashboard']
+        lines = Dashboard.search([('project_id', '=', self.project.id)])
+        user1_line = lines.filtered(lambda l: l.assignee_id == self.user1)
+        unassigned_line = lines.filtered(lambda l: not l.assignee_id)
+        self.assertEqual(user1_line.task_count, 2)
+        self.assertEqual(user1_line.done_count, 1)
+        self.assertEqual(user1_line.in_progress_count, 1)
+        self.assertEqual((unassigned_line.todo_count, unassigned_line.in_progress_count), (2, 0))
+
+        # The view follows the category changes of the stages
+        self.stage_progress.category = 'todo'
+        Dashboard.invalidate_model()
+        lines = Dashboard.search([('project_id', '=', self.project.id)])
+        user1_line = lines.filtered(lambda l: l.assignee_id == self.user1)
+        self.assertEqual((user1_line.todo_count, user1_line.in_progress_count), (1, 0))
+        self.stage_progress.fold = True
+        Dashboard.invalidate_model()
+        unassigned_line = Dashboard.search([('project_id', '=', self.project.id), ('assignee_id', '=', False)])
+        self.assertEqual((unassigned_line.todo_count, unassigned_line.done_count), (1, 1))
+        self.assertEqual(unassigned_progress.stage_category, 'done')
+
+    def test_09_stage_matrix_single_query(self):
+        """Test that stage totals and the assignee x stage matrix come from one query"""
+        self._create_tasks_with_dates()
+        self.env['project.task'].create({
+            'name': 'Shared Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id, self.user2.id])],
+            'stage_id': self.stage_progress.id
+        })
+        domain = [('project_id', '=', self.project.id)]
+        dashboard = self.env['project.task.dashboard'].with_user(self.user_manager)
+
+        # Same figures as the former read_group based computation
+        stage_counts, user_stage_counts, project_stage_counts = dashboard._read_stage_matrix(domain)
+        Task = self.env['project.task'].with_user(self.user_manager)
+        for group in Task.read_group(domain, ['stage_id'], ['stage_id']):
+            stage_id = group['stage_id'] and group['stage_id'][0]
+            self.assertEqual(stage_counts[stage_id], group['stage_id_count'])
+        groups = Task.read_group(
+            domain + [('user_ids', '!=', False)],
+            ['user_ids', 'stage_id'],
+            ['user_ids', 'stage_id'],
+            lazy=False
+        )
+        expected = {}
+        for group in groups:
+            expected[(group['user_ids'][0], group['stage_id'][0])] = group['__count']
+        self.assertEqual(user_stage_counts, expected)
+        self.assertEqual(project_stage_counts, {
+            (self.project.id, stage_id): count for stage_id, count in stage_counts.items()
+        })
+
+        # Single round-trip once the access caches are warm
+        self.env.flush_all()
+        with self.assertQueryCount(default=1):
+            dashboard._read_stage_matrix(domain)
+
+    def _reset_statistics_cache(self):
+        """Forget pending invalidations so that results of this transaction get cached"""
+        self.env.cr.postcommit.data.pop('project_team_rules.statistics_invalidation', None)
+        cache = self.env['project.task.dashboard']._get_statistics_cache()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        return cache
+
+    def test_10_statistics_cache(self):
+        """Test that statistics are cached per scope and invalidated by task changes"""
+        self.env['project.task'].create({
+            'name': 'Cached Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        })
+        cache = self._reset_statistics_cache()
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+
+        stats = dashboard.get_task_statistics('all', False)
+        info = cache.info()
+        self.assertEqual((info['size'], info['hits'], info['misses']), (1, 0, 1))
+
+        self.assertEqual(dashboard.get_task_statistics('all', False), stats)
+        self.assertEqual(cache.info()['hits'], 1)
+
+        # A task change in the user's team project drops the entry
+        self.env['project.task'].create({
+            'name': 'Second Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        })
+        self.assertEqual(cache.info()['size'], 0)
+        self.assertEqual(dashboard.get_task_statistics('all', False)['total_tasks'], 2)
+
+    def test_11_statistics_cache_scoped_invalidation(self):
+        """Test that changes outside a user's team keep their cached statistics"""
+        other_team = self.env['project.team'].create({
+            'name': 'Unrelated Team',
+            'member_ids': [(6, 0, [self.user_manager.id])]
+        })
+        other_project = self.env['project.project'].create({
+            'name': 'Unrelated Project',
+            'privacy_visibility': 'team',
+            'team_id': other_team.id
+        })
+        cache = self._reset_statistics_cache()
+        self.env['project.task.dashboard'].with_user(self.user1).get_task_statistics('all', False)
+        self.env['project.task.dashboard'].with_user(self.user_manager).get_task_statistics('all', False)
+        self.assertEqual(cache.info()['size'], 2)
+
+        # Only the manager's entry covers the unrelated project
+        self.env['project.task'].create({
+            'name': 'Unrelated Task',
+            'project_id': other_project.id,
+        })
+        self.assertEqual(cache.info()['size'], 1)
+
+        # Stage changes affect every entry
+        self.stage_todo.name = 'Backlog'
+        self.assertEqual(cache.info()['size'], 0)
+
+    def test_12_statistics_cache_info_admin_only(self):
+        """Test that only administrators can read the cache counters"""
+        with self.assertRaises(AccessError):
+            self.env['project.task.dashboard'].with_user(self.user_manager).get_statistics_cache_info()
+        info = self.env['project.task.dashboard'].with_user(self.env.ref('base.user_admin')).get_statistics_cache_info()
+        self.assertIn('hits', info)
+        self.assertIn('misses', info)
+
+    def test_13_task_history_snapshots(self):
+        """Test that closed weeks are served from snapshots and the current week live"""
+        Snapshot = self.env['project.task.dashboard.snapshot']
+        today = fields.Date.today()
+        this_week = Snapshot._get_period_start('week', today)
+        last_week = this_week - timedelta(weeks=1)
+        Snapshot.search([]).unlink()
+
+        old_task = self.env['project.task'].create({
+            'name': 'Last Week Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        })
+        old_task.create_date = datetime.combine(last_week, datetime.min.time()) + timedelta(hours=12)
+        self.env['project.task'].create({
+            'name': 'Current Week Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user2.id])],
+            'stage_id': self.stage_progress.id
+        })
+        Snapshot._cron_snapshot_closed_periods()
+
+        # Snapshots keep the stage the task had when the week was closed
+        old_task.stage_id = self.stage_done
+        history = self.env['project.task.dashboard'].with_user(self.user1).get_task_history('week', 2)
+        self.assertEqual([p['start'] for p in history['periods']],
+                         [fields.Date.to_string(last_week), fields.Date.to_string(this_week)])
+        last_period, current_period = history['periods']
+        self.assertEqual(last_period['stages'], [{'name': 'To Do', 'count': 1, 'category': 'todo'}])
+        self.assertEqual(current_period['stages'], [{'name': 'In Progress', 'count': 1, 'category': 'in_progress'}])
+
+        # Assignee filter applies to snapshots and to the live period
+        history = self.env['project.task.dashboard'].with_user(self.user1).get_task_history(
+            'week', 2, self.user2.id
+        )
+        self.assertEqual([p['total_tasks'] for p in history['periods']], [0, 1])
+
+        # Running the job again does not duplicate the closed weeks
+        Snapshot._cron_snapshot_closed_periods()
+        self.assertEqual(Snapshot.search_count([
+            ('granularity', '=', 'week'), ('tz', '=', 'UTC'),
+            ('project_id', '=', self.project.id), ('assignee_id', '=', False)
+        ]), 1)
+
+    def test_14_statistics_instrumentation(self):
+        """Test that phase timings and query counts are returned in debug mode only"""
+        self.env['project.task'].create({
+            'name': 'Measured Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        })
+        cache = self._reset_statistics_cache()
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+        self.assertNotIn('_perf', dashboard.get_task_statistics('all', False))
+        cache.clear()
+
+        stats = dashboard.with_context(project_team_rules_perf=True).get_task_statistics('all', False)
+        perf = stats['_perf']
+        self.assertEqual(perf['operation'], 'project.task.dashboard.get_task_statistics')
+        self.assertEqual(
+            [phase['name'] for phase in perf['phases']],
+            ['cache_lookup', 'team_scope', 'record_rules', 'stage_matrix', 'stages', 'users', 'assignees']
+        )
+        self.assertEqual(perf['phases'][0]['hit'], False)
+        self.assertGreaterEqual(perf['queries'], sum(phase['queries'] for phase in perf['phases']))
+        self.assertEqual(perf['phases'][1]['rows'], 1)
+
+        # Cache hits are measured too, cached payloads carry no timings
+        stats = dashboard.with_context(project_team_rules_perf=True).get_task_statistics('all', False)
+        self.assertEqual([phase['name'] for phase in stats['_perf']['phases']], ['cache_lookup'])
+        self.assertTrue(stats['_perf']['phases'][0]['hit'])
+        self.assertNotIn('_perf', dashboard.get_task_statistics('all', False))
+
+        # The sections of the dashboard are measured the same way
+        self.assertNotIn('_perf', dashboard.get_stage_statistics('all', False))
+        cache.clear()
+        stages = dashboard.with_context(project_team_rules_perf=True).get_stage_statistics('all', False)
+        self.assertEqual(stages['_perf']['operation'], 'project.task.dashboard.stages')
+        self.assertEqual([phase['name'] for phase in stages['_perf']['phases']], ['cache_lookup', 'team_scope', 'query'])
+        self.assertEqual(stages['_perf']['phases'][0]['hit'], False)
+        page = dashboard.with_context(project_team_rules_perf=True).get_assignee_statistics('all', False)
+        self.assertEqual(page['_perf']['operation'], 'project.task.dashboard.get_assignee_statistics')
+        self.assertEqual(
+            [phase['name'] for phase in page['_perf']['phases']], ['cache_lookup', 'team_scope', 'query', 'users']
+        )
+        self.assertNotIn('_perf', dashboard.get_stage_statistics('all', False))
+
+    def test_15_paginated_assignee_statistics(self):
+        """Test that assignees are paged, searched and filtered on the server"""
+        self.env['project.task'].create({
+            'name': 'User 1 Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        })
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+
+        # The summary can skip the assignee list, the default payload keeps it
+        self.assertEqual(dashboard.get_task_statistics('all', False, include_assignees=False)['assignees'], [])
+        self.assertEqual(len(dashboard.get_task_statistics('all', False)['assignees']), 2)
+
+        first_page = dashboard.get_assignee_statistics('all', False, limit=1)
+        self.assertEqual(first_page['total'], 2)
+        self.assertEqual(first_page['assignees'], [{
+            'id': self.user1.id,
+            'name': 'User 1',
+            'total_tasks': 1,
+            'stages': [{'name': 'To Do', 'count': 1, 'category': 'todo'}]
+        }])
+        second_page = dashboard.get_assignee_statistics('all', False, offset=1, limit=1)
+        self.assertEqual([a['id'] for a in second_page['assignees']], [self.user2.id])
+        self.assertEqual(second_page['assignees'][0]['stages'], [])
+
+        page = dashboard.get_assignee_statistics('all', False, only_with_tasks=True)
+        self.assertEqual((page['total'], [a['id'] for a in page['assignees']]), (1, [self.user1.id]))
+        page = dashboard.get_assignee_statistics('all', False, search='User 2')
+        self.assertEqual([a['id'] for a in page['assignees']], [self.user2.id])
+
+        # The pages share one aggregation of the assignee x stage counts
+        self._reset_statistics_cache()
+        dashboard.get_assignee_statistics('all', False, limit=1)
+        with patch.object(type(dashboard), '_fetch_statistics_rows') as fetch:
+            page = dashboard.get_assignee_statistics('all', False, offset=1, limit=1)
+        fetch.assert_not_called()
+        self.assertEqual([a['id'] for a in page['assignees']], [self.user2.id])
+
+        # The filter dropdown only offers the members of the user's teams
+        options = dashboard.search_dashboard_assignees('User', limit=10)
+        self.assertEqual(options['total'], 2)
+        self.assertEqual([o['id'] for o in options['records']], [self.user1.id, self.user2.id])
+        self.assertNotIn(self.user_manager.id, [o['id'] for o in dashboard.search_dashboard_assignees(limit=10)['records']])
+
+    def test_16_export_rows(self):
+        """Test that the export streams the team scoped assignee x project x stage counts"""
+        other_project = self.env['project.project'].create({
+            'name': 'Other Project',
+            'privacy_visibility': 'team',
+            'team_id': self.env['project.team'].create({
+                'name': 'Other Team',
+                'member_ids': [(6, 0, [self.user_manager.id])]
+            }).id
+        })
+        self.env['project.task'].create([{
+            'name': 'Shared Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id, self.user2.id])],
+            'stage_id': self.stage_todo.id
+        }, {
+            'name': 'User 1 Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        }, {
+            'name': 'Unassigned Task',
+            'project_id': self.project.id,
+            'stage_id': self.stage_done.id
+        }, {
+            'name': 'Other Team Task',
+            'project_id': other_project.id,
+            'user_ids': [(6, 0, [self.user_manager.id])],
+            'stage_id': self.stage_todo.id
+        }])
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+
+        rows = list(dashboard._iter_statistics_rows('all', False, batch_size=1))
+        self.assertEqual(rows, [
+            ('Unassigned', 'Dashboard Project', 'Done', 1),
+            ('User 1', 'Dashboard Project', 'To Do', 2),
+            ('User 2', 'Dashboard Project', 'To Do', 1),
+        ])
+        rows = list(dashboard._iter_statistics_rows('all', self.user2.id))
+        self.assertEqual(rows, [('User 2', 'Dashboard Project', 'To Do', 1)])
+
+        # Managers export every project
+        rows = list(dashboard.with_user(self.user_manager)._iter_statistics_rows('all', False))
+        self.assertIn((self.user_manager.name, 'Other Project', 'To Do', 1), rows)
+
+        # The assignee filter leaves out the other assignees of the tasks
+        stats = dashboard.get_task_statistics('all', self.user2.id)
+        self.assertEqual(
+            [(a['name'], a['total_tasks']) for a in stats['assignees'] if a['total_tasks']],
+            [('User 2', 1)]
+        )
+        self.assertEqual(stats['total_tasks'], 1)
+
+    def test_17_statistics_deltas_published(self):
+        """Test that task changes push summed count deltas to the team and to managers"""
+        task = self.env['project.task'].create({
+            'name': 'Live Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_todo.id
+        })
+        self.env.cr.precommit.run()
+        Bus = self.env['bus.bus'].sudo()
+        Bus.search([]).unlink()
+
+        task.write({'stage_id': self.stage_done.id})
+        task.write({'user_ids': [(4, self.user2.id)]})
+        self.env.cr.precommit.run()
+
+        create_date = fields.Datetime.to_string(task.create_date.replace(
+            minute=task.create_date.minute - task.create_date.minute % 15, second=0
+        ))
+        expected = sorted([
+            [False, self.stage_todo.id, create_date, -1],
+            [self.user1.id, self.stage_todo.id, create_date, -1],
+            [False, self.stage_done.id, create_date, 1],
+            [self.user1.id, self.stage_done.id, create_date, 1],
+            [self.user2.id, self.stage_done.id, create_date, 1],
+        ], key=str)
+        for target in (self.team, self.env.ref('project.group_project_manager')):
+            notification = Bus.search([('channel', '=', json_dump(channel_with_db(self.env.cr.dbname, target)))])
+            self.assertEqual(len(notification), 1, "Changes of a transaction are sent in one message")
+            message = json.loads(notification.message)
+            self.assertEqual(message['type'], 'project_team_rules/dashboard_delta')
+            self.assertEqual(message['payload']['project_id'], self.project.id)
+            self.assertEqual(sorted(message['payload']['changes'], key=str), expected)
+            self.assertEqual(message['payload']['stages'], {
+                str(self.stage_todo.id): 'To Do', str(self.stage_done.id): 'Done'
+            })
+            self.assertEqual(message['payload']['stage_categories'], {
+                str(self.stage_todo.id): 'todo', str(self.stage_done.id): 'done'
+            })
+
+        # Tasks older than the previous month share one bucket
+        Bus.search([]).unlink()
+        task.create_date = fields.Datetime.now() - relativedelta(months=3)
+        other_task = self.env['project.task'].create({
+            'name': 'Old Live Task',
+            'project_id': self.project.id,
+            'user_ids': [(6, 0, [self.user1.id, self.user2.id])],
+            'stage_id': self.stage_done.id
+        })
+        other_task.create_date = fields.Datetime.now() - relativedelta(months=4)
+        self.env.cr.precommit.run()
+        Bus.search([]).unlink()
+        (task | other_task).write({'stage_id': self.stage_progress.id})
+        self.env.cr.precommit.run()
+        notification = Bus.search([('channel', '=', json_dump(channel_with_db(self.env.cr.dbname, self.team)))])
+        changes = json.loads(notification.message)['payload']['changes']
+        self.assertIn([False, self.stage_progress.id, False, 2], changes)
+        self.assertEqual(len(changes), 6)
+
+        # Large changes are replaced by a reload notification
+        Bus.search([]).unlink()
+        with patch('odoo.addons.project_team_rules.models.project_task_dashboard.STATISTICS_DELTA_RELOAD_THRESHOLD', 2):
+            (task | other_task).write({'stage_id': self.stage_todo.id})
+            self.env.cr.precommit.run()
+        for target in (self.team, self.env.ref('project.group_project_manager')):
+            notification = Bus.search([('channel', '=', json_dump(channel_with_db(self.env.cr.dbname, target)))])
+            self.assertEqual(len(notification), 1)
+            self.assertTrue(json.loads(notification.message)['payload']['reload'])
+
+    def test_18_period_bounds_timezones(self):
+        """Test that periods are resolved on week and month edges in the user's timezone"""
+        dashboard = self.env['project.task.dashboard']
+
+        # Monday 00:30 UTC is still Sunday in New York: the week and the month
+        # are the previous ones, across the end of daylight saving time
+        new_york = dashboard.with_context(tz='America/New_York')
+        now = datetime(2024, 1, 1, 0, 30)
+        self.assertEqual(new_york._get_period_bounds('this_week', now),
+                         (datetime(2023, 12, 25, 5, 0), datetime(2024, 1, 1, 5, 0)))
+        self.assertEqual(new_york._get_period_bounds('prev_week', now),
+                         (datetime(2023, 12, 18, 5, 0), datetime(2023, 12, 25, 5, 0)))
+        self.assertEqual(new_york._get_period_bounds('this_month', now),
+                         (datetime(2023, 12, 1, 5, 0), datetime(2024, 1, 1, 5, 0)))
+        self.assertEqual(new_york._get_period_bounds('prev_month', now),
+                         (datetime(2023, 11, 1, 4, 0), datetime(2023, 12, 1, 5, 0)))
+
+        # Leap day evening in UTC is already March 1st in Kolkata (UTC+5:30)
+        kolkata = dashboard.with_context(tz='Asia/Kolkata')
+        now = datetime(2024, 2, 29, 20, 0)
+        self.assertEqual(kolkata._get_period_bounds('this_month', now),
+                         (datetime(2024, 2, 29, 18, 30), datetime(2024, 3, 31, 18, 30)))
+        self.assertEqual(kolkata._get_period_bounds('prev_month', now),
+                         (datetime(2024, 1, 31, 18, 30), datetime(2024, 2, 29, 18, 30)))
+        self.assertEqual(kolkata._get_period_bounds('this_week', now),
+                         (datetime(2024, 2, 25, 18, 30), datetime(2024, 3, 3, 18, 30)))
+        self.assertEqual(dashboard.with_context(tz='UTC')._get_period_bounds('this_week', now),
+                         (datetime(2024, 2, 26, 0, 0), datetime(2024, 3, 4, 0, 0)))
+        self.assertEqual(kolkata._get_period_bounds('all', now), (None, None))
+
+        # Without timezone in the context, the user's one applies
+        self.user1.tz = 'Asia/Kolkata'
+        self.assertEqual(dashboard.with_user(self.user1)._get_period_bounds('this_month', now),
+                         (datetime(2024, 2, 29, 18, 30), datetime(2024, 3, 31, 18, 30)))
+
+    def test_19_period_bounds_in_payload(self):
+        """Test that the statistics count the tasks within the bounds they return"""
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1).with_context(tz='Pacific/Kiritimati')
+        start, end = dashboard._get_period_bounds('this_week')
+        inside = self.env['project.task'].create({
+            'name': 'Inside Task',
+            'project_id': self.project.id,
+            'stage_id': self.stage_todo.id
+        })
+        outside = self.env['project.task'].create({
+            'name': 'Outside Task',
+            'project_id': self.project.id,
+            'stage_id': self.stage_todo.id
+        })
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE project_task SET create_date = %s WHERE id = %s", [start, inside.id])
+        self.env.cr.execute("UPDATE project_task SET create_date = %s WHERE id = %s",
+                            [start - timedelta(seconds=1), outside.id])
+        self.env['project.task.dashboard.stat']._rebuild()
+        self.env['project.task'].invalidate_model(['create_date'])
+
+        stats = dashboard.get_task_statistics('this_week', False)
+        self.assertEqual(stats['period'], {
+            'name': 'this_week',
+            'start': fields.Datetime.to_string(start),
+            'end': fields.Datetime.to_string(end),
+        })
+        self.assertEqual(stats['total_tasks'], 1)
+        self.assertEqual(
+            self.env['project.task'].search_count([
+                ('project_id', '=', self.project.id),
+                ('create_date', '>=', stats['period']['start']),
+                ('create_date', '<', stats['period']['end']),
+            ]), 1
+        )
+        self.assertEqual(dashboard.get_task_statistics('all', False)['period'],
+                         {'name': 'all', 'start': False, 'end': False})
+
+    def test_20_statistics_sections(self):
+        """Test that the section endpoints match the full statistics payload"""
+        self._create_tasks_with_dates()
+        other_project = self.env['project.project'].create({
+            'name': 'Another Dashboard Project',
+            'privacy_visibility': 'team',
+            'team_id': self.team.id
+        })
+        self.env['project.task'].create({
+            'name': 'Another Project Task',
+            'project_id': other_project.id,
+            'user_ids': [(6, 0, [self.user1.id, self.user2.id])],
+            'stage_id': self.stage_done.id
+        })
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+
+        for period in ('all', 'this_week', 'prev_month'):
+            for assignee_id in (False, self.user1.id):
+                stats = dashboard.get_task_statistics(period, assignee_id)
+                totals = dashboard.get_statistics_totals(period, assignee_id)
+                self.assertEqual(totals, {'period': stats['period'], 'total_tasks': stats['total_tasks']})
+                self.assertEqual(dashboard.get_stage_statistics(period, assignee_id), {'stages': stats['stages']})
+                projects = dashboard.get_project_statistics(period, assignee_id)['projects']
+                self.assertEqual(sum(p['total_tasks'] for p in projects), stats['total_tasks'])
+
+        projects = dashboard.get_project_statistics('all', False)['projects']
+        self.assertEqual([p['name'] for p in projects], ['Another Dashboard Project', 'Dashboard Project'])
+        self.assertEqual(projects[0]['stages'], [{'name': 'Done', 'count': 1, 'category': 'done'}])
+        self.assertEqual(projects[1]['total_tasks'], 4)
+
+    def test_21_project_and_team_filters(self):
+        """Test the project and team filters and the per-project breakdown of the statistics"""
+        self._create_tasks_with_dates()
+        other_team = self.env['project.team'].create({
+            'name': 'Second Dashboard Team',
+            'member_ids': [(6, 0, [self.user1.id])]
+        })
+        other_project = self.env['project.project'].create({
+            'name': 'Second Dashboard Project',
+            'privacy_visibility': 'team',
+            'team_id': other_team.id
+        })
+        self.env['project.task'].create([{
+            'name': 'Second Project Task %s' % index,
+            'project_id': other_project.id,
+            'user_ids': [(6, 0, [self.user1.id])],
+            'stage_id': self.stage_done.id
+        } for index in range(2)])
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+
+        stats = dashboard.get_task_statistics('all', False)
+        self.assertEqual(stats['total_tasks'], 6)
+        self.assertEqual(
+            [(p['name'], p['total_tasks']) for p in stats['projects']],
+            [('Dashboard Project', 4), ('Second Dashboard Project', 2)]
+        )
+        self.assertEqual(stats['projects'][1]['stages'], [{'name': 'Done', 'count': 2, 'category': 'done'}])
+        self.assertEqual(stats['projects'], dashboard.get_project_statistics('all', False)['projects'])
+
+        for filters in ({'project_ids': [other_project.id]}, {'team_ids': [other_team.id]}):
+            stats = dashboard.get_task_statistics('all', False, **filters)
+            self.assertEqual(stats['total_tasks'], 2)
+            self.assertEqual([p['id'] for p in stats['projects']], [other_project.id])
+            self.assertEqual(dashboard.get_statistics_totals('all', False, **filters)['total_tasks'], 2)
+            self.assertEqual(dashboard.get_stage_statistics('all', False, **filters)['stages'],
+                             [{'name': 'Done', 'count': 2, 'category': 'done'}])
+            page = dashboard.get_assignee_statistics('all', False, only_with_tasks=True, **filters)
+            self.assertEqual([(a['id'], a['total_tasks']) for a in page['assignees']], [(self.user1.id, 2)])
+            rows = list(dashboard._iter_statistics_rows('all', False, **filters))
+            self.assertEqual(rows, [('User 1', 'Second Dashboard Project', 'Done', 2)])
+
+        # Filter options are limited to the user's scope
+        self.assertEqual(
+            [o['name'] for o in dashboard.search_dashboard_teams('Dashboard')['records']],
+            ['Dashboard Team', 'Second Dashboard Team']
+        )
+        self.env['project.team'].create({
+            'name': 'Foreign Dashboard Team',
+            'member_ids': [(6, 0, [self.user_manager.id])]
+        })
+        self.assertEqual(dashboard.search_dashboard_teams('Dashboard')['total'], 2)
+        self.assertEqual(
+            [o['id'] for o in dashboard.search_dashboard_projects('Dashboard')['records']],
+            [self.project.id, other_project.id]
+        )
+
+    def test_22_replica_routing(self):
+        """Test that aggregations run on the configured read replica with a fallback to the primary"""
+        tasks = self.env['project.task'].create([
+            {'name': 'Replica Task %s' % index, 'project_id': self.project.id, 'stage_id': self.stage_todo.id}
+            for index in range(2)
+        ])
+        dashboard = self.env['project.task.dashboard']
+        domain = [('id', 'in', tasks.ids)]
+        ICP = self.env['ir.config_parameter'].sudo()
+        self.addCleanup(replica._unavailable_until.clear)
+
+        with replica.replica_cursor(self.env) as cr:
+            self.assertIsNone(cr)
+
+        # A second connection to the test database stands for the replica:
+        # it only sees committed data, hence not the tasks of the test
+        ICP.set_param(replica.REPLICA_URI_PARAM, self.env.cr.dbname)
+        with replica.replica_cursor(self.env) as cr:
+            self.assertIsNot(cr, self.env.cr)
+            cr.execute("SHOW transaction_read_only")
+            self.assertEqual(cr.fetchone()[0], 'on')
+
+        # The transaction changed tasks: the primary is used
+        self.assertFalse(dashboard._can_use_replica())
+        self.assertEqual(dashboard._read_task_counts(domain, ['stage_id']), {(self.stage_todo.id,): 2})
+        self.assertEqual(dashboard._read_task_counts(domain, []), {(): 2})
+        with patch.object(type(dashboard), '_can_use_replica', return_value=True):
+            self.assertEqual(dashboard._read_task_counts(domain, ['stage_id']), {})
+            self.assertEqual(dashboard._read_task_counts(domain, []), {(): 0})
+
+            # Above the lag tolerance, or when unreachable, the primary is used
+            ICP.set_param(replica.REPLICA_MAX_LAG_PARAM, '-1')
+            self.assertEqual(dashboard._read_task_counts(domain, ['stage_id']), {(self.stage_todo.id,): 2})
+            ICP.set_param(replica.REPLICA_MAX_LAG_PARAM, '30')
+            ICP.set_param(replica.REPLICA_URI_PARAM, 'postgresql://127.0.0.1:1/project_team_rules_replica')
+            self.assertEqual(dashboard._read_task_counts(domain, ['stage_id']), {(self.stage_todo.id,): 2})
+            self.assertIn('postgresql://127.0.0.1:1/project_team_rules_replica', replica._unavailable_until)
+
+    def test_23_stage_categories(self):
+        """Test that stages are classified by category, defaulting from their folding"""
+        self.assertEqual(self.stage_progress.category, 'in_progress')
+        self.assertEqual(self.stage_done.category, 'done')
+        stage_cancelled = self.env['project.task.type'].create({
+            'name': 'Cancelled', 'sequence': 4, 'fold': True, 'category': 'cancelled'
+        })
+        self.project.type_ids = [(4, stage_cancelled.id)]
+
+        tasks = self.env['project.task'].create([
+            {'name': 'Category Task 1', 'project_id': self.project.id, 'stage_id': self.stage_progress.id},
+            {'name': 'Category Task 2', 'project_id': self.project.id, 'stage_id': stage_cancelled.id},
+        ])
+        self.assertEqual(tasks.mapped('stage_category'), ['in_progress', 'cancelled'])
+        self.assertEqual(self.team.open_task_count, 1)
+
+        # Unfolding keeps an open category, folding a stage makes it done
+        stage_cancelled.fold = False
+        self.assertEqual(stage_cancelled.category, 'in_progress')
+        self.assertEqual(tasks[1].stage_category, 'in_progress')
+        self.assertEqual(self.team.open_task_count, 2)
+        self.stage_progress.category = 'todo'
+        self.stage_progress.fold = True
+        self.assertEqual(self.stage_progress.category, 'done')
+        self.assertEqual(tasks[0].stage_category, 'done')
+        self.assertEqual(self.team.open_task_count, 1)
+
+        stats = self.env['project.task.dashboard'].with_user(self.user_manager).get_task_statistics('all', False)
+        self.assertEqual(
+            [(stage['name'], stage['category']) for stage in stats['stages']],
+            [('In Progress', 'done'), ('Cancelled', 'in_progress')]
+        )
+
+        # Stages of the same name are only merged within a category
+        other_cancelled = self.env['project.task.type'].create({
+            'name': 'Cancelled', 'sequence': 5, 'fold': True, 'category': 'cancelled'
+        })
+        self.project.type_ids = [(4, other_cancelled.id)]
+        self.env['project.task'].create({
+            'name': 'Category Task 3', 'project_id': self.project.id, 'stage_id': other_cancelled.id,
+        })
+        stats = self.env['project.task.dashboard'].with_user(self.user_manager).get_task_statistics('all', False)
+        self.assertEqual(
+            [(stage['name'], stage['category'], stage['count']) for stage in stats['stages']],
+            [('In Progress', 'done', 1), ('Cancelled', 'in_progress', 1), ('Cancelled', 'cancelled', 1)]
+        )
+        self.assertEqual(
+            self.env['project.task'].search([('stage_category', '=', 'done'), ('project_id', '=', self.project.id)]),
+            tasks[0]
+        )
+
+    def test_24_statistics_cache_invalidated_by_other_workers(self):
+        """Test that the invalidations logged by other workers drop the cached statistics"""
+        cache = self._reset_statistics_cache()
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+        dashboard.get_task_statistics('all', False)
+        dashboard.with_user(self.user_manager).get_task_statistics('all', False)
+        self.assertEqual(cache.info()['size'], 2)
+
+        # A change committed by another worker is read from the log on lookup
+        other_project = self.env['project.project'].create({'name': 'Other Worker Project'})
+        self.env.cr.execute("""
+            INSERT INTO project_task_dashboard_invalidation (txid, project_ids, user_ids)
+            VALUES (txid_current(), %s, '{}')
+        """, [[other_project.id]])
+        dashboard.get_task_statistics('all', False)
+        info = cache.info()
+        self.assertEqual((info['size'], info['hits']), (1, 1))
+
+        # Each logged invalidation is applied once
+        dashboard.with_user(self.user_manager).get_task_statistics('all', False)
+        self.assertEqual(cache.info()['size'], 2)
+        dashboard.with_user(self.user_manager).get_task_statistics('all', False)
+        self.assertEqual(cache.info()['hits'], 2)
+
+        # Invalidations are logged with the transaction
+        self.env['project.task'].create({'name': 'Logged Task', 'project_id': self.project.id})
+        self.env.cr.precommit.run()
+        self.env.cr.execute("""
+            SELECT project_ids FROM project_task_dashboard_invalidation
+            WHERE txid = txid_current() ORDER BY id DESC LIMIT 1
+        """)
+        self.assertIn(self.project.id, self.env.cr.fetchone()[0])
+
+    def test_25_task_history_in_user_timezone(self):
+        """Test that history periods follow the user's timezone and are counted live until recorded"""
+        Snapshot = self.env['project.task.dashboard.snapshot']
+        Snapshot.search([]).unlink()
+        tz = 'Pacific/Kiritimati'
+        self.user1.tz = tz
+        this_week = Snapshot._get_period_start('week', Snapshot._get_today(tz))
+        last_week = this_week - timedelta(weeks=1)
+        task = self.env['project.task'].create({
+            'name': 'Local Week Task',
+            'project_id': self.project.id,
+            'stage_id': self.stage_todo.id,
+        })
+        # Two hours into last week in UTC+14, still the week before in UTC
+        task.create_date = Snapshot._to_utc(last_week, tz) + timedelta(hours=2)
+
+        # Closed periods not recorded yet are counted from the tasks, without writing
+        dashboard = self.env['project.task.dashboard'].with_user(self.user1)
+        expected = [(fields.Date.to_string(last_week), 1), (fields.Date.to_string(this_week), 0)]
+        history = dashboard.get_task_history('week', 2)
+        self.assertEqual([(p['start'], p['total_tasks']) for p in history['periods']], expected)
+        self.assertFalse(Snapshot.search_count([]))
+
+        # The scheduled action records the periods of every user timezone
+        Snapshot._cron_snapshot_closed_periods()
+        self.assertEqual(Snapshot.search([
+            ('granularity', '=', 'week'), ('tz', '=', tz), ('project_id', '=', self.project.id)
+        ]).period_start, last_week)
+        history = dashboard.get_task_history('week', 2)
+        self.assertEqual([(p['start'], p['total_tasks']) for p in history['periods']], expected)
+        utc_snapshot = Snapshot.search([
+            ('granularity', '=', 'week'), ('tz', '=', 'UTC'), ('project_id', '=', self.project.id)
+        ])
+        self.assertEqual(utc_snapshot.period_start, last_week - timedelta(weeks=1))
+
+
+@tagged('post_install', '-at_install')
+class TestTaskDashboardExport(common.HttpCase):
+
+    def test_01_export_rejects_malformed_parameters(self):
+        """Test that malformed export parameters are answered with a 400 instead of a server error"""
+        self.authenticate('admin', 'admin')
+        url = '/project_team_rules/dashboard/export/csv'
+        self.assertEqual(self.url_open(url + '?period=all&assignee_id=2').status_code, 200)
+        for query in ('assignee_id=abc', 'project_ids=1,x', 'team_ids=-1', 'period=yesterday'):
+            self.assertEqual(self.url_open('%s?%s' % (url, query)).status_code, 400, query)
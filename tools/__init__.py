@@ -0,0 +1,4 @@
+from . import dashboard_cache
+from . import sql
+from . import perf
+from . import replica
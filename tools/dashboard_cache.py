@@ -0,0 +1,134 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class DashboardCache:
+    """Bounded LRU cache with a time-to-live for dashboard payloads.
+
+    Each entry remembers the user it was computed for and the projects it
+    covers (``None`` meaning every project), so that writes only drop the
+    entries they can affect. The cache lives in the worker process: the
+    changes made by other workers are applied from the invalidation log of
+    the database with ``sync``.
+    """
+
+    def __init__(self, max_size=256, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Oldest transaction still running at the last sync: invalidations
+        # of this transaction and of later ones may not have been read yet
+        self.log_xmin = None
+        self._applied = {}
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry['value'])
+
+    def set(self, key, value, uid, project_ids=None, xmin=None):
+        """Store a value computed by a transaction whose snapshot had ``xmin``
+        as oldest running transaction.
+
+        Values computed from a snapshot older than the last sync are not
+        stored, as invalidations newer than their snapshot may have been
+        applied already.
+        """
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            if xmin is not None and self.log_xmin is not None and xmin < self.log_xmin:
+                return
+            self._entries[key] = {
+                'value': copy.deepcopy(value),
+                'uid': uid,
+                'project_ids': None if project_ids is None else frozenset(project_ids),
+                'expires': time.monotonic() + self.ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, project_ids=(), user_ids=()):
+        """Drop the entries of the given users and those covering any of the given projects."""
+        project_ids = set(project_ids)
+        user_ids = set(user_ids)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry['uid'] in user_ids or (project_ids and (
+                    entry['project_ids'] is None or entry['project_ids'] & project_ids
+                ))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def sync(self, xmin, log_rows):
+        """Apply the invalidations read from the log of the database.
+
+        :param xmin: oldest transaction still running in the snapshot the
+            rows were read from
+        :param log_rows: ``(id, txid, project_ids, user_ids, clear)`` rows of
+            the transactions since ``log_xmin``; rows already applied are skipped
+        """
+        with self._lock:
+            for row_id, txid, project_ids, user_ids, clear in log_rows:
+                if row_id in self._applied:
+                    continue
+                self._applied[row_id] = txid
+                if clear:
+                    self.clear()
+                else:
+                    self.invalidate(project_ids, user_ids)
+            self.log_xmin = xmin if self.log_xmin is None else max(self.log_xmin, xmin)
+            self._applied = {
+                row_id: txid for row_id, txid in self._applied.items() if txid >= self.log_xmin
+            }
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def info(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_dashboard_cache(dbname):
+    """Return the statistics cache of the given database."""
+    with _caches_lock:
+        if dbname not in _caches:
+            _caches[dbname] = DashboardCache()
+        return _caches[dbname]
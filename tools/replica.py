@@ -0,0 +1,96 @@
+import logging
+import time
+from contextlib import contextmanager
+
+import psycopg2
+
+from odoo import sql_db
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# System parameters, overridden by the ``project_team_rules_replica_uri`` and
+# ``project_team_rules_replica_max_lag`` options of the server configuration
+REPLICA_URI_PARAM = 'project_team_rules.replica_uri'
+REPLICA_MAX_LAG_PARAM = 'project_team_rules.replica_max_lag'
+
+# Maximum replication lag in seconds above which the primary is used
+DEFAULT_MAX_LAG = 30.0
+# Seconds during which a replica that could not be used is not tried again
+RETRY_DELAY = 60.0
+
+# Replication lag in seconds, 0 when the replica has replayed all it received
+# or when it is not a standby at all (e.g. a separate database in tests)
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END
+"""
+
+_unavailable_until = {}
+
+
+def get_replica_settings(env):
+    """Return ``(uri, max_lag)`` of the configured replica, ``uri`` being None when disabled.
+
+    ``uri`` is a ``postgresql://`` URI or the name of a database of the
+    primary server.
+    """
+    ICP = env['ir.config_parameter'].sudo()
+    uri = config.get('project_team_rules_replica_uri') or ICP.get_param(REPLICA_URI_PARAM)
+    max_lag = config.get('project_team_rules_replica_max_lag') or ICP.get_param(REPLICA_MAX_LAG_PARAM)
+    try:
+        max_lag = float(max_lag) if max_lag not in (None, False, '') else DEFAULT_MAX_LAG
+    except ValueError:
+        _logger.warning("Invalid replica maximum lag %r, using %ss", max_lag, DEFAULT_MAX_LAG)
+        max_lag = DEFAULT_MAX_LAG
+    return uri or None, max_lag
+
+
+def _mark_unavailable(uri, reason):
+    _logger.warning("Read replica unavailable (%s), using the primary database for %ss", reason, RETRY_DELAY)
+    _unavailable_until[uri] = time.monotonic() + RETRY_DELAY
+
+
+def _open_replica_cursor(uri, max_lag):
+    if _unavailable_until.get(uri, 0) > time.monotonic():
+        return None
+    try:
+        cr = sql_db.db_connect(uri, allow_uri=True).cursor()
+    except (psycopg2.Error, sql_db.PoolError) as e:
+        _mark_unavailable(uri, e)
+        return None
+    try:
+        cr.execute("SET TRANSACTION READ ONLY")
+        cr.execute(LAG_QUERY)
+        lag = cr.fetchone()[0]
+    except psycopg2.Error as e:
+        cr.close()
+        _mark_unavailable(uri, e)
+        return None
+    if lag > max_lag:
+        # Lag is transient: try the replica again on the next call
+        _logger.info("Read replica is %.1fs behind (maximum %ss), using the primary database", lag, max_lag)
+        cr.close()
+        return None
+    return cr
+
+
+@contextmanager
+def replica_cursor(env):
+    """Yield a read-only cursor on the configured replica, or None.
+
+    None is yielded when no replica is configured, when it cannot be
+    reached (it is then not tried again for ``RETRY_DELAY`` seconds) or
+    when it lags behind the primary by more than the maximum lag; callers
+    then use the primary cursor.
+    """
+    uri, max_lag = get_replica_settings(env)
+    cr = _open_replica_cursor(uri, max_lag) if uri else None
+    try:
+        yield cr
+    finally:
+        if cr is not None:
+            cr.close()
@@ -0,0 +1,31 @@
+def index_covers_columns(cr, tablename, columns):
+    """Return whether an index of the table starts with the given columns, in order"""
+    cr.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        WHERE t.relname = %s
+          AND i.indpred IS NULL
+          AND ARRAY(
+              SELECT a.attname::text
+              FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, position)
+              JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+              ORDER BY k.position
+              LIMIT %s
+          ) = %s::text[]
+        LIMIT 1
+    """, [tablename, len(columns), list(columns)])
+    return bool(cr.rowcount)
+
+
+def create_index_unless_covered(cr, indexname, tablename, columns):
+    """Create the index unless the table already has one starting with the same columns.
+
+    Many2many tables created by the ORM already come with both the primary key
+    and the reverse index; this avoids duplicating them.
+    """
+    if index_covers_columns(cr, tablename, columns):
+        return
+    cr.execute('CREATE INDEX IF NOT EXISTS "%s" ON "%s" (%s)' % (
+        indexname, tablename, ', '.join('"%s"' % column for column in columns)
+    ))
@@ -0,0 +1 @@
+from . import project_team_reassign_wizard
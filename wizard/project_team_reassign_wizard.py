@@ -0,0 +1,64 @@
+from odoo import models, fields, api
+
+
+class ProjectTeamReassignWizard(models.TransientModel):
+    _name = 'project.team.reassign.wizard'
+    _description = 'Reassign Tasks of a Team Member'
+
+    team_id = fields.Many2one('project.team', string='Team', required=True, ondelete='cascade')
+    team_member_ids = fields.Many2many(related='team_id.member_ids')
+    user_id = fields.Many2one(
+        'res.users',
+        string='Departing Member',
+        required=True,
+        domain="[('id', 'in', team_member_ids)]"
+    )
+    strategy = fields.Selection([
+        ('replacement', 'Replacement Member'),
+        ('round_robin', 'Round-robin over Remaining Members'),
+    ], string='Reassign To', required=True, default='replacement')
+    replacement_user_id = fields.Many2one(
+        'res.users',
+        string='Replacement',
+        domain="[('id', 'in', team_member_ids), ('id', '!=', user_id)]"
+    )
+    remove_from_team = fields.Boolean(
+        string='Remove from Team',
+        default=True,
+        help='Remove the departing member from the team once their tasks are reassigned'
+    )
+    batch_size = fields.Integer(string='Batch Size', default=1000, required=True)
+    open_task_count = fields.Integer(string='Open Tasks', compute='_compute_open_task_count')
+
+    @api.depends('team_id', 'user_id')
+    def _compute_open_task_count(self):
+        for wizard in self:
+            if wizard.team_id and wizard.user_id:
+                wizard.open_task_count = len(wizard.team_id._get_member_open_task_ids(wizard.user_id.id))
+            else:
+                wizard.open_task_count = 0
+
+    def _get_replacement_ids(self):
+        self.ensure_one()
+        if self.strategy == 'replacement':
+            return self.replacement_user_id.ids
+        return (self.team_id.member_ids - self.user_id).ids
+
+    def action_reassign(self):
+        """Queue the reassignment as a project.team.reassign.job, run in the background.
+
+        The replacements are checked right away. The job shows the progress
+        and the user is notified when the reassignment is over.
+        """
+        self.ensure_one()
+        replacement_ids = self.team_id._check_reassignment_replacements(self.user_id.id, self._get_replacement_ids())
+        job = self.env['project.team.reassign.job'].create({
+            'team_id': self.team_id.id,
+            'user_id': self.user_id.id,
+            'replacement_ids': [(6, 0, replacement_ids)],
+            'remove_from_team': self.remove_from_team,
+            'batch_size': self.batch_size,
+            'progress_total': self.open_task_count,
+        })
+        self.env.ref('project_team_rules.ir_cron_reassign_member_tasks')._trigger()
+        return job._get_form_action()